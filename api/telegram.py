@@ -9,37 +9,44 @@ from telegram.ext import (
     ContextTypes
 )
 from main import MainBot
-import os
+from bot import clients, metrics, tracing
+from bot.logging_config import setup_logging, log_payload
+from bot.settings import get_settings
+from bot.update_filter import ACCEPT, INVALID, UpdateFilter
+from bot.drain import get_drain
+from bot.outbox import get_outbox
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 import logging
+import time
 
 # Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO if os.getenv('ENVIRONMENT') == 'production' else logging.DEBUG
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize components
 app = FastAPI(title="Telegram Bot API")
 bot = MainBot()
 application = None
+update_filter = UpdateFilter(max_age=get_settings().webhook_max_age)
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize bot application on startup"""
     global application
     try:
-        token = os.getenv("TELEGRAM_BOT_TOKEN")
+        token = get_settings().telegram_bot_token
         if not token:
             raise ValueError("TELEGRAM_BOT_TOKEN not found in environment variables")
             
         # Build application
-        application = Application.builder().token(token).build()
+        application = Application.builder().token(token).request(metrics.telegram_request()).build()
         
         # Add handlers
         application.add_handler(CommandHandler("start", bot.simple_bot.start))
         application.add_handler(CommandHandler("help", bot.simple_bot.help_command))
+        application.add_handler(CommandHandler("offers", bot.simple_bot.offers))
+        application.add_handler(CommandHandler("history", bot.simple_bot.history))
         
         # Add callback query handler for button clicks
         application.add_handler(CallbackQueryHandler(bot.handle_message))
@@ -52,7 +59,7 @@ async def startup_event():
         
         # Add error handler
         async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
-            logger.error(f"Exception while handling an update: {context.error}")
+            logger.error("Exception while handling an update: %s", context.error)
             if isinstance(update, Update):
                 if update.callback_query:
                     await update.callback_query.answer(
@@ -64,6 +71,7 @@ async def startup_event():
         # Initialize and start the application
         await application.initialize()
         await application.start()
+        await bot.start_background(application)
         logger.info("Bot application initialized successfully")
         
     except Exception as e:
@@ -75,11 +83,20 @@ async def shutdown_event():
     """Cleanup on shutdown"""
     global application
     try:
+        # Refuse new updates, give in-flight ones until the deadline, then let
+        # the outbox finish its batch within whatever time is left
+        drain = get_drain()
+        drain.start()
+        deadline = time.monotonic() + get_settings().drain_timeout
+        await drain.wait_idle(get_settings().drain_timeout)
         if application:
+            await bot.stop_background(application, timeout=max(1.0, deadline - time.monotonic()))
             logger.info("Shutting down bot application...")
             await application.stop()
             await application.shutdown()
             logger.info("Bot application shutdown complete")
+        await clients.close_clients()
+        tracing.shutdown()
     except Exception as e:
         logger.error(f"Error during shutdown: {str(e)}", exc_info=True)
 
@@ -87,41 +104,86 @@ async def shutdown_event():
 async def telegram_webhook(request: Request):
     """Handle incoming webhook requests from Telegram"""
     try:
-        # Log incoming request
-        logger.info("Received webhook request")
-        
         # Verify webhook secret if configured
-        webhook_secret = os.getenv("WEBHOOK_SECRET")
+        webhook_secret = get_settings().webhook_secret
         if webhook_secret:
             secret_header = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
-            logger.info(f"Webhook secret check - Expected: {webhook_secret}, Received: {secret_header}")
             if secret_header != webhook_secret:
                 logger.warning("Unauthorized webhook request - secret mismatch")
                 return Response(status_code=403, content="Unauthorized")
         
-        # Get update data
-        update_data = await request.json()
-        logger.info(f"Received update data: {update_data}")
+        # While draining, 503 makes Telegram deliver the update again later,
+        # after the restart or to another instance
+        drain = get_drain()
+        if drain.draining:
+            return Response(status_code=503, content="draining")
         
-        # Create Update object
-        update = Update.de_json(update_data, application.bot)
-        logger.info(f"Created Update object: {update}")
+        # Drop stale, duplicate and irrelevant updates before building an Update;
+        # they still get a 200 so Telegram does not deliver them again
+        verdict, update_data = update_filter.check(await request.body())
+        if verdict == INVALID:
+            return Response(status_code=400, content="invalid update")
+        if verdict != ACCEPT:
+            return Response(status_code=200, content="ok")
+        log_payload(logger, "Received update data: %s", update_data)
         
-        # Process all updates through the application
-        await application.process_update(update)
+        # Create Update object and process it through the application; a
+        # failed update is forgotten so Telegram's redelivery is not a duplicate
+        try:
+            update = Update.de_json(update_data, application.bot)
+            async with drain.track():
+                await application.process_update(update)
+        except Exception:
+            update_filter.forget(update_data['update_id'])
+            raise
         
-        logger.info("Update processed successfully")
+        logger.debug("Processed update %s", update.update_id)
         return Response(status_code=200, content="ok")
         
     except Exception as e:
-        logger.error(f"Error processing webhook: {str(e)}", exc_info=True)
+        logger.error("Error processing webhook: %s", e, exc_info=True)
         return Response(status_code=500, content=str(e))
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics for pipeline stages, token usage and Telegram calls"""
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    """Basic health check endpoint"""
-    return {"status": "healthy"}
+    """Health check; 503 while draining so load balancers stop routing here"""
+    status = get_drain().status()
+    status["outbox_pending"] = get_outbox().pending_count()
+    if status["status"] == "draining":
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+def _drain_allowed(request: Request) -> bool:
+    """Draining stops the bot, so it always needs the webhook secret"""
+    webhook_secret = get_settings().webhook_secret
+    if not webhook_secret:
+        logger.warning("Refused drain request - WEBHOOK_SECRET is not configured")
+        return False
+    return request.headers.get("X-Telegram-Bot-Api-Secret-Token") == webhook_secret
+
+@app.post("/drain")
+async def drain_endpoint(request: Request):
+    """Start draining ahead of a shutdown (e.g. from a pre-stop hook)"""
+    if not _drain_allowed(request):
+        return Response(status_code=403, content="Unauthorized")
+    drain = get_drain()
+    drain.start()
+    return drain.status()
+
+@app.delete("/drain")
+async def undrain_endpoint(request: Request):
+    """Accept updates again, e.g. when the shutdown that started the drain was called off"""
+    if not _drain_allowed(request):
+        return Response(status_code=403, content="Unauthorized")
+    drain = get_drain()
+    drain.resume()
+    return drain.status()
 
 @app.get("/")
 async def root():
@@ -0,0 +1,103 @@
+"""Time duplicate-offer checks for a review batch.
+
+Fills FakeNotionClient with N offers through StructuredDealParser, syncs
+them into a temporary NotionMirror and builds an OfferIndex from it. It
+then checks a batch of deals, where --resubmit-rate of the batch is copied
+from existing offers, and reports the time for the first check (new deals)
+and for repeated checks (re-rendered cards). For comparison it also times
+a linear scan over every active offer.
+
+    python -m benchmarks.bench_duplicates --offers 5000 --batch 100
+"""
+import argparse
+import logging
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import report_meta, structured_corpus, write_report
+from bot.duplicates import OfferIndex, _keys
+from bot.models import Deal
+
+
+def linear_matches(offers, deal):
+    exact, near = _keys(deal.partner, deal.geo, deal.language, deal.source, deal.funnels)
+    wanted = set(near)
+    return [offer for offer in offers
+            if wanted & set(_keys(offer['partner'], offer['geo'], offer['language'],
+                                  offer['sources'], offer['funnels'])[1])]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--offers", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--resubmit-rate", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    from bot.mirror import NotionMirror
+    from bot.notion_stub import FakeNotionClient
+    from bot.structured_deal_parser import StructuredDealParser
+
+    existing = [Deal.from_dash_string(s)[0] for s in structured_corpus(args.offers, seed=args.seed)]
+    notion = FakeNotionClient()
+    StructuredDealParser(notion_token="bench", database_id="offers", kitchen_database_id="advertisers",
+                         client=notion).submit_deals([deal.to_submission(clean=False) for deal in existing])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mirror = NotionMirror(str(Path(tmp) / "mirror.db"), "offers", "advertisers", client=notion)
+        mirror.sync()
+        offers = mirror.active_offers()
+        mirror.close()
+
+    start = time.perf_counter()
+    index = OfferIndex(offers)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(args.seed)
+    resubmits = int(args.batch * args.resubmit_rate)
+    fresh = [Deal.from_dash_string(s)[0] for s in structured_corpus(args.batch, seed=args.seed + 1)]
+    batch = rng.sample(existing, resubmits) + fresh[:args.batch - resubmits]
+
+    start = time.perf_counter()
+    flagged = [index.match(deal) for deal in batch]
+    first_us = (time.perf_counter() - start) * 1e6
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        flagged = [index.match(deal) for deal in batch]
+        timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    linear = [linear_matches(offers, deal) for deal in batch[:10]]
+    linear_us = (time.perf_counter() - start) / 10 * args.batch * 1e6
+
+    results = {
+        "offers_indexed": index.size,
+        "index_keys": {"exact": len(index.exact), "near": len(index.near)},
+        "index_build_ms": round(build_ms, 2),
+        "first_batch_us": round(first_us, 1),
+        "batch_us_p50": round(statistics.median(timings) * 1e6, 1),
+        "per_deal_us": round(statistics.median(timings) * 1e6 / args.batch, 2),
+        "linear_scan_batch_us": round(linear_us, 1),
+        "flagged": {
+            "exact": sum(1 for m in flagged if m and m[0].kind == "exact"),
+            "near_only": sum(1 for m in flagged if m and m[0].kind == "near"),
+            "resubmitted": resubmits,
+            "resubmitted_flagged_exact": sum(1 for m in flagged[:resubmits] if m and m[0].kind == "exact"),
+        },
+        "linear_agrees": all(bool(a) == bool(b) for a, b in zip(linear, flagged)),
+    }
+    write_report({"benchmark": "duplicates", "meta": report_meta(), "config": vars(args), "results": results},
+                 args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Time /history queries over a large local deal history.
+
+Fills a temporary DealHistory with N deals spread over --years, half of
+them also recorded as submitted, using structured_corpus deals so the
+partner and GEO mix looks like real traffic. It then times stats() for
+the busiest partner and the busiest GEO, and reports write throughput,
+database size and how much compressing the raw text saves.
+
+    python -m benchmarks.bench_history --deals 200000 --years 3
+"""
+import argparse
+import logging
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from benchmarks.common import report_meta, structured_corpus, write_report
+from bot.history import PARSED, SUBMITTED, DealHistory, compress
+from bot.models import Deal
+from bot.regions import split_geos
+
+
+def timed_query(history: DealHistory, repeat: int, **scope) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stats = history.stats(**scope)
+        timings.append(time.perf_counter() - start)
+    return {"scope": scope, "matching_deals": stats["parsed"] + stats["submitted"],
+            "ms_p50": round(statistics.median(timings) * 1000, 2), "ms_max": round(max(timings) * 1000, 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deals", type=int, default=200000)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--batch", type=int, default=20, help="deals per record() call, like one message")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    rng = random.Random(args.seed)
+    corpus = [Deal.from_dash_string(s)[0] for s in structured_corpus(2000, seed=args.seed)]
+    for deal in corpus:
+        deal.raw_text = (f"Partner: {deal.partner}\nGEO: {deal.geo} {deal.language}\nSource: {deal.source}\n"
+                         f"Price: {deal.cpa}$ + {deal.crg or 0:.0%} CRG\nFunnels: {', '.join(deal.funnels)}\n"
+                         f"Deduction up to {deal.deduction_limit or 0:.0%} wrong numbers, pay weekly")
+    start_ts = time.time() - args.years * 365 * 86400
+    step = args.years * 365 * 86400 / max(1, args.deals)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "history.db"
+        history = DealHistory(str(path))
+        written = 0
+        start = time.perf_counter()
+        while written < args.deals:
+            batch = [rng.choice(corpus) for _ in range(min(args.batch, args.deals - written))]
+            at = start_ts + written * step
+            history.record(batch, PARSED, user_id=1, flow="bench", recorded_at=at)
+            history.record(batch[::2], SUBMITTED, user_id=1, flow="bench", recorded_at=at + 60)
+            written += len(batch)
+        write_s = time.perf_counter() - start
+
+        partners = Counter(deal.partner for deal in corpus)
+        geos = Counter(code for deal in corpus for code in split_geos(deal.geo))
+        raw = [deal.raw_text for deal in corpus]
+        stored = [compress(text) for text in raw]
+        results = {
+            "rows": history.count(),
+            "write_rows_per_sec": round(history.count() / write_s),
+            "db_mb": round(sum(f.stat().st_size for f in Path(tmp).iterdir()) / 1e6, 1),
+            "raw_text_stored_ratio": round(sum(len(v if isinstance(v, bytes) else v.encode()) for v in stored)
+                                           / sum(len(text.encode()) for text in raw), 2),
+            "raw_text_compressed_share": round(sum(isinstance(v, bytes) for v in stored) / len(stored), 2),
+            "partner_query": timed_query(history, args.repeat, partner=partners.most_common(1)[0][0]),
+            "geo_query": timed_query(history, args.repeat, geo=geos.most_common(1)[0][0]),
+            "rare_partner_query": timed_query(history, args.repeat, partner=partners.most_common()[-1][0]),
+        }
+        history.close()
+    write_report({"benchmark": "history", "meta": report_meta(), "config": vars(args), "results": results},
+                 args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Measure cold-start import time of the bot entry points with ``-X importtime``.
+
+Each run imports the target module in a fresh interpreter and parses the
+importtime table from stderr. Reports the best/median cumulative time of
+the target, the slowest top-level imports, and whether any of the heavy
+modules that should only load on first use (mistralai, rich,
+notion_client) were imported eagerly.
+
+Exits non-zero if the median exceeds --budget-ms (default IMPORT_BUDGET_MS)
+or a deferred module is imported. tests/test_import_time.py runs the same
+checks under pytest:
+
+    python -m benchmarks.bench_import --module api.telegram --budget-ms 900
+
+Dummy credentials are supplied for any unset required setting, so no .env
+file is needed.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from benchmarks.common import report_meta, write_report
+
+DEFERRED_MODULES = ("mistralai", "rich", "notion_client")
+# Median cold import of api.telegram is ~450-600ms; leave headroom for slower CI machines
+IMPORT_BUDGET_MS = 900.0
+DUMMY_ENV = {
+    "TELEGRAM_BOT_TOKEN": "1:bench",
+    "NOTION_TOKEN": "bench",
+    "OFFERS_DATABASE_ID": "bench-offers",
+    "ADVERTISERS_DATABASE_ID": "bench-advertisers",
+    "MISTRAL_API_KEY": "bench",
+}
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Parse '-X importtime' output into (module, self_us, cumulative_us, depth) rows"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def import_once(module: str) -> List[Tuple[str, int, int, int]]:
+    env = dict(os.environ)
+    for key, value in DUMMY_ENV.items():
+        env.setdefault(key, value)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def import_ms(rows: List[Tuple[str, int, int, int]], module: str) -> float:
+    """Cumulative import time of module in one run"""
+    target = next((r for r in reversed(rows) if r[0] == module), None)
+    return target[2] / 1000 if target else sum(r[1] for r in rows) / 1000
+
+
+def eager_modules(rows: List[Tuple[str, int, int, int]], allow: Tuple[str, ...] = ()) -> List[str]:
+    """DEFERRED_MODULES that were imported during the run"""
+    imported = {name.split(".", 1)[0] for name, *_ in rows}
+    return [name for name in DEFERRED_MODULES if name in imported and name not in allow]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="api.telegram", help="module to import (default: api.telegram)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="number of slowest top-level imports to report")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS,
+                        help="fail if the median import time exceeds this (0: no budget)")
+    parser.add_argument("--allow", nargs="*", default=[], help="deferred modules allowed to load at import")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    totals: List[float] = []
+    rows: List[Tuple[str, int, int, int]] = []
+    for _ in range(args.runs):
+        rows = import_once(args.module)
+        totals.append(import_ms(rows, args.module))
+
+    # slowest packages as seen from the last run, keyed by top-level name
+    by_package: Dict[str, int] = {}
+    for name, _, cumulative_us, _ in rows:
+        package = name.split(".", 1)[0]
+        by_package[package] = max(by_package.get(package, 0), cumulative_us)
+    slowest = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    eager = eager_modules(rows, tuple(args.allow))
+
+    median_ms = statistics.median(totals)
+    results = {
+        "module": args.module,
+        "best_ms": round(min(totals), 1),
+        "median_ms": round(median_ms, 1),
+        "modules_imported": len(rows),
+        "slowest_packages_ms": {name: round(us / 1000, 1) for name, us in slowest},
+        "eager_deferred_modules": eager,
+        "budget_ms": args.budget_ms,
+    }
+    failures = []
+    if args.budget_ms and median_ms > args.budget_ms:
+        failures.append(f"median import time {median_ms:.1f}ms exceeds budget {args.budget_ms}ms")
+    if eager:
+        failures.append(f"modules meant to load on first use were imported eagerly: {', '.join(eager)}")
+    results["passed"] = not failures
+
+    write_report({"benchmark": "import", "meta": report_meta(), "config": vars(args), "results": results},
+                 args.output)
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
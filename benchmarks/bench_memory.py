@@ -0,0 +1,112 @@
+"""Compare the memory held by a review session in each deal representation.
+
+Builds N deals from the synthetic structured corpus and holds them either
+as the legacy nested LLM dicts (``{'raw_text', 'parsed_data', 'metadata'}``)
+or as slotted Deal objects, measuring retained allocations with tracemalloc.
+Also times a read of every field on each deal, which is what rendering a
+review card or summary does.
+
+Deal is a memory win, not a speed win: building a Deal from the LLM dict
+still costs more than keeping the dict, and that overhead is reported as
+``build_overhead_ns_per_deal`` rather than hidden in the totals.
+
+    python -m benchmarks.bench_memory --deals 10000
+"""
+import argparse
+import gc
+import operator
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from benchmarks.common import report_meta, structured_corpus, write_report
+from bot.models import Deal
+
+
+def legacy_dict(deal: Deal) -> Dict:
+    """The nested dict shape DealParser produced before Deal existed"""
+    return {
+        'raw_text': deal.raw_text,
+        'parsed_data': {
+            'partner': deal.partner,
+            'region': deal.region,
+            'geo': deal.geo,
+            'language': deal.language,
+            'source': deal.source,
+            'pricing_model': deal.pricing_model,
+            'cpa': deal.cpa,
+            'crg': deal.crg,
+            'cpl': deal.cpl,
+            'funnels': list(deal.funnels),
+            'cr': deal.cr,
+            'deduction_limit': deal.deduction_limit,
+        },
+        'metadata': {'confidence': 1.0, 'error': None},
+    }
+
+
+def retained_bytes(build: Callable[[], List]) -> Dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    held = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"held": held, "bytes": current, "build_s": elapsed}
+
+
+def time_reads(deals: List, read: Callable, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for deal in deals:
+            read(deal)
+    return (time.perf_counter() - start) / (repeat * len(deals)) * 1e9
+
+
+_ITEMS = operator.itemgetter(*Deal.FIELDS)
+_ATTRS = operator.attrgetter(*Deal.FIELDS)
+
+
+def read_dict(deal: Dict) -> None:
+    _ITEMS(deal['parsed_data'])
+
+
+def read_deal(deal: Deal) -> None:
+    _ATTRS(deal)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deals", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5, help="passes over every deal when timing reads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    strings = structured_corpus(args.deals, seed=args.seed)
+    # Parse up front so both measurements only count what the session keeps
+    parsed = [Deal.from_dash_string(s)[0] or Deal(raw_text=s) for s in strings]
+
+    legacy = retained_bytes(lambda: [legacy_dict(deal) for deal in parsed])
+    slotted = retained_bytes(lambda: [Deal.from_llm(d) for d in legacy["held"]])
+
+    results = {}
+    for name, run, read in (("legacy_dict", legacy, read_dict), ("deal", slotted, read_deal)):
+        results[name] = {
+            "retained_kib": round(run["bytes"] / 1024, 1),
+            "bytes_per_deal": round(run["bytes"] / args.deals, 1),
+            "build_ms": round(run["build_s"] * 1000, 2),
+            "field_read_ns_per_deal": round(time_reads(run["held"], read, args.repeat), 1),
+        }
+    results["build_overhead_ns_per_deal"] = round(
+        (slotted["build_s"] - legacy["build_s"]) / args.deals * 1e9, 1)
+    results["memory_saved_pct"] = round(
+        100 * (1 - slotted["bytes"] / legacy["bytes"]), 1) if legacy["bytes"] else 0.0
+
+    write_report({"benchmark": "memory", "meta": report_meta(), "config": vars(args), "results": results},
+                 args.output)
+
+
+if __name__ == "__main__":
+    main()
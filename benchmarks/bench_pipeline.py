@@ -0,0 +1,288 @@
+"""End-to-end benchmark of the deal pipeline against local stand-ins.
+
+Runs DealRouter.detect_format -> parsing (SimpleDealBot.parse_deal_string
+for the structured flow, DealParser.parse_deals for the unstructured flow)
+-> FieldValidator cleanup -> submit_deals, with Mistral replaced by
+ReplayMistral and Notion by FakeNotionClient.
+
+Before timing the structured flow, one message is also sent through
+SimpleDealBot.handle_message itself and its outbox batch is drained; the
+run aborts if the user would get an error reply or a deal is not
+submitted. History and outbox files go to a temporary directory.
+
+Usage:
+    python -m benchmarks.bench_pipeline --sizes 10 100 10000 --output bench.json
+    python -m benchmarks.bench_pipeline --flow unstructured --llm-latency lognormal:0.4,0.5
+
+The JSON report can be diffed between commits.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+from benchmarks.common import (
+    chunked, latency_summary, peak_rss_mb, report_meta, structured_corpus,
+    unstructured_corpus, write_report,
+)
+
+OFFERS_DB = "bench-offers"
+ADVERTISERS_DB = "bench-advertisers"
+STRUCTURED_BATCH = 50  # SimpleDealBot MAX_DEALS
+
+
+def _notion_parser(client):
+    from bot.structured_deal_parser import StructuredDealParser
+    return StructuredDealParser(
+        notion_token="bench", database_id=OFFERS_DB, kitchen_database_id=ADVERTISERS_DB, client=client
+    )
+
+
+class _Message:
+    """Just enough of telegram.Message for handle_message; keeps every text shown to the user"""
+
+    def __init__(self, text: str = "", sent: List[str] = None):
+        self.text = text
+        self.date = datetime.now(timezone.utc)
+        self.sent = [] if sent is None else sent
+
+    async def reply_text(self, text: str, **kwargs) -> "_Message":
+        self.sent.append(text)
+        return _Message(text, self.sent)
+
+    async def edit_text(self, text: str, **kwargs) -> None:
+        self.sent.append(text)
+
+    async def delete(self) -> None:
+        pass
+
+
+def check_handler(bot, text: str) -> List[str]:
+    """Send one message through SimpleDealBot.handle_message and drain the batch it queues.
+
+    Raises if the user is shown an error or a deal of the message does not reach Notion.
+    """
+    from bot.outbox import DONE, get_outbox
+
+    outbox = get_outbox()
+    outbox.submit = bot.deal_parser.submit_deals
+    message = _Message(text)
+    update = SimpleNamespace(message=message, effective_user=SimpleNamespace(id=1),
+                             effective_chat=SimpleNamespace(id=1))
+
+    async def run() -> None:
+        await bot.handle_message(update, SimpleNamespace(args=[]))
+        while await outbox.drain_once():
+            pass
+
+    asyncio.run(run())
+    errors = [sent for sent in message.sent if sent.startswith("❌")]
+    queued = re.search(r"Batch: (\w+)", message.sent[-1]) if message.sent else None
+    if errors or not queued:
+        raise RuntimeError(f"handle_message rejected a valid structured message: {errors or message.sent[-1:]}")
+    status = outbox.batch_status(queued.group(1))
+    if status != {DONE: len(text.split("\n"))}:
+        raise RuntimeError(f"Structured batch {queued.group(1)} did not reach Notion: {status}")
+    return message.sent
+
+
+def run_structured(size: int, args) -> Dict:
+    from bot.client import FieldValidator
+    from bot.llm_stub import LatencyModel
+    from bot.notion_stub import FakeNotionClient
+    from bot.router import DealRouter, DataFormat
+    from bot.structured_deal_bot import SimpleDealBot
+
+    notion = FakeNotionClient(latency=LatencyModel.parse(args.notion_latency),
+                              error_rate=args.notion_error_rate, seed=args.seed)
+    service = _notion_parser(notion)
+    bot = SimpleDealBot(deal_service=service)
+    messages = ["\n".join(batch) for batch in chunked(structured_corpus(size, args.seed), STRUCTURED_BATCH)]
+    check_handler(SimpleDealBot(deal_service=_notion_parser(FakeNotionClient())), messages[0])
+
+    stages = defaultdict(float)
+    latencies: List[float] = []
+    failed = 0
+    start = time.perf_counter()
+    for text in messages:
+        t0 = time.perf_counter()
+        if DealRouter.detect_format(text).format_type != DataFormat.STRUCTURED:
+            raise RuntimeError("Structured corpus was not detected as structured")
+        t1 = time.perf_counter()
+        deals = []
+        for line in text.split("\n"):
+            deal, error = bot.parse_deal_string(line)
+            if deal:
+                deals.append(deal)
+        t2 = time.perf_counter()
+        submissions = []
+        for deal in deals:
+            deal.geo = FieldValidator.clean_geo(deal.geo)
+            deal.language = FieldValidator.clean_language(deal.language)
+            deal.source = FieldValidator.clean_source(deal.source)
+            submissions.append(deal.to_submission(clean=False))
+        t3 = time.perf_counter()
+        results = service.submit_deals(submissions)
+        t4 = time.perf_counter()
+        failed += sum(1 for r in results if not r["success"])
+        stages["detect"] += t1 - t0
+        stages["parse"] += t2 - t1
+        stages["validate"] += t3 - t2
+        stages["submit"] += t4 - t3
+        latencies.append(t4 - t0)
+    elapsed = time.perf_counter() - start
+    return _result("structured", size, len(messages), elapsed, latencies, stages,
+                   llm_calls=0, notion_calls=notion.total_calls, failed=failed)
+
+
+def run_unstructured(size: int, args) -> Dict:
+    from bot.client import DealParser
+    from bot.llm_stub import LatencyModel, ReplayMistral
+    from bot.notion_stub import FakeNotionClient
+    from bot.router import DealRouter, DataFormat
+
+    from bot.metrics import token_ledger
+
+    llm = ReplayMistral(
+        recordings=args.recordings, latency=LatencyModel.parse(args.llm_latency),
+        error_rate=args.llm_error_rate, seed=args.seed,
+    )
+    notion = FakeNotionClient(latency=LatencyModel.parse(args.notion_latency),
+                              error_rate=args.notion_error_rate, seed=args.seed)
+    parser = DealParser(client=llm)
+    parser.base_delay = args.retry_delay
+    if args.models:
+        parser.models = args.models.split(",")
+    if len(parser.models) > 1:
+        llm.invalid_rate = {parser.models[0]: args.small_invalid_rate}
+    if args.hedge_percentile:
+        from bot.hedging import Hedger
+        parser.hedger = Hedger(percentile=args.hedge_percentile, max_rate=args.hedge_max_rate)
+    service = _notion_parser(notion)
+    messages = unstructured_corpus(size, args.seed, args.deals_per_message)
+
+    stages = defaultdict(float)
+    latencies: List[float] = []
+    failed = 0
+
+    async def process(text: str) -> None:
+        nonlocal failed
+        t0 = time.perf_counter()
+        if DealRouter.detect_format(text).format_type != DataFormat.UNSTRUCTURED:
+            raise RuntimeError("Unstructured corpus was not detected as unstructured")
+        t1 = time.perf_counter()
+        deals = await parser.parse_deals(text)
+        t2 = time.perf_counter()
+        submissions = [deal.to_submission() for deal in deals]
+        t3 = time.perf_counter()
+        results = await asyncio.to_thread(service.submit_deals, submissions)
+        t4 = time.perf_counter()
+        failed += sum(1 for r in results if not r["success"])
+        stages["detect"] += t1 - t0
+        stages["parse"] += t2 - t1
+        stages["validate"] += t3 - t2
+        stages["submit"] += t4 - t3
+        latencies.append(t4 - t0)
+
+    async def run_all() -> None:
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(text: str) -> None:
+            async with semaphore:
+                await process(text)
+
+        await asyncio.gather(*(bounded(text) for text in messages))
+
+    start = time.perf_counter()
+    with token_ledger() as ledger:
+        asyncio.run(run_all())
+    elapsed = time.perf_counter() - start
+    result = _result("unstructured", size, len(messages), elapsed, latencies, stages,
+                     llm_calls=llm.calls, notion_calls=notion.total_calls, failed=failed)
+    first_tier = llm.calls_by_model.get(parser.models[0], 0)
+    escalated = llm.calls - first_tier
+    result["model_cascade"] = {
+        "tiers": parser.models,
+        "escalation_rate": round(escalated / first_tier, 4) if first_tier else 0.0,
+        "by_model": ledger.by_model(),
+        "cost_usd_per_deal": round(ledger.cost / size, 8),
+    }
+    if parser.hedger is not None:
+        result["hedging"] = {
+            "calls": parser.hedger.calls,
+            "hedges": parser.hedger.hedges,
+            "hedge_rate": round(parser.hedger.hedges / parser.hedger.calls, 4) if parser.hedger.calls else 0.0,
+        }
+    return result
+
+
+def _result(flow: str, size: int, messages: int, elapsed: float, latencies: List[float],
+            stages: Dict[str, float], llm_calls: int, notion_calls: int, failed: int) -> Dict:
+    return {
+        "flow": flow,
+        "deals": size,
+        "messages": messages,
+        "elapsed_s": round(elapsed, 4),
+        "deals_per_sec": round(size / elapsed, 2) if elapsed else None,
+        "message_latency_ms": latency_summary(latencies),
+        "stage_total_ms": {name: round(total * 1000, 3) for name, total in stages.items()},
+        "api_calls": {
+            "llm": llm_calls,
+            "notion": notion_calls,
+            "per_deal": round((llm_calls + notion_calls) / size, 3) if size else 0.0,
+        },
+        "failed_submissions": failed,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 10000])
+    parser.add_argument("--flow", choices=["structured", "unstructured", "both"], default="both")
+    parser.add_argument("--llm-latency", default="fixed:0", help="e.g. lognormal:0.8,0.4 (seconds)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--notion-error-rate", type=float, default=0.0,
+                        help="fraction of Notion calls failing with a retryable 429")
+    parser.add_argument("--notion-latency", default="fixed:0", help="e.g. uniform:0.3,0.1 (seconds)")
+    parser.add_argument("--models", help="comma-separated model cascade (default: MISTRAL_MODELS)")
+    parser.add_argument("--small-invalid-rate", type=float, default=0.0,
+                        help="fraction of first-tier replies that fail validation and escalate")
+    parser.add_argument("--hedge-percentile", type=float, default=0,
+                        help="hedge Mistral calls slower than this latency percentile (0: off)")
+    parser.add_argument("--hedge-max-rate", type=float, default=0.05)
+    parser.add_argument("--recordings", help="JSONL file of recorded Mistral responses")
+    parser.add_argument("--deals-per-message", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1, help="messages processed at once")
+    parser.add_argument("--retry-delay", type=float, default=0.0, help="DealParser.base_delay override")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    # Drop everything below the requested level so logging does not skew timings
+    logging.disable(logging.getLevelName(args.log_level.upper()) - 1)
+
+    runs = []
+    flows = ["structured", "unstructured"] if args.flow == "both" else [args.flow]
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("history_path", "outbox_path"):
+            os.environ[name.upper()] = str(Path(tmp) / f"{name}.db")
+        for flow in flows:
+            for size in args.sizes:
+                runner = run_structured if flow == "structured" else run_unstructured
+                runs.append(runner(size, args))
+
+    write_report({"benchmark": "pipeline", "meta": report_meta(), "config": vars(args), "runs": runs}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Mistral tokens per deal for the unstructured flow, before and after prompt compaction.
+
+"after" runs DealParser.parse_deals against ReplayMistral and reads the
+per-call usage collected by bot.metrics.token_ledger. "before" rebuilds
+the previous per-deal prompt (full schema text, ``indent=2`` context that
+repeated the deal text, nested output echoing raw_text and region) for
+the same deal blocks and estimates it with the same ~4 chars/token rule
+the stub uses, so the two columns are comparable.
+
+    python -m benchmarks.bench_tokens --deals 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+from typing import Dict, List
+
+from benchmarks.common import report_meta, unstructured_corpus, write_report
+
+LEGACY_DEAL_PARSING_PROMPT = """Parse individual deal details using shared context.
+
+Input Format:
+{
+    "shared_fields": {
+        "partner": string,
+        "language": string,
+        "source": string,
+        "model": string,
+        "deduction_limit": number|null
+    },
+    "deal_text": string
+}
+
+Output Format:
+{
+    "raw_text": string,
+    "parsed_data": {
+        "partner": string,
+        "region": "TIER1"|"TIER2"|"TIER3"|"LATAM"|"NORDICS"|"BALTICS",
+        "geo": string,
+        "language": string,
+        "source": string,
+        "pricing_model": "CPA"|"CPA/CRG"|"CPL",
+        "cpa": number|null,
+        "crg": number|null,
+        "cpl": number|null,
+        "funnels": string[],
+        "cr": number|null,
+        "deduction_limit": number|null
+    }
+}
+"""
+
+
+def legacy_parsing_prompt(deal_text: str, shared_fields: Dict) -> List[Dict]:
+    context = json.dumps({"shared_fields": shared_fields, "deal_text": deal_text}, indent=2)
+    prompt = f"Parse this deal using the shared context and rules.\n\nShared Context:\n{context}\n\nDeal Text:\n{deal_text}"
+    return [
+        {"role": "system", "content": LEGACY_DEAL_PARSING_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def legacy_tokens(messages: List[str]) -> Dict[str, int]:
+    """Estimated prompt/completion tokens of the old per-deal prompts for these messages"""
+    from bot.llm_stub import _synthesize_structure, estimate_tokens, synthesize_response
+    from bot.prompts import DealPrompts
+    from bot.regions import region_for
+
+    totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    for text in messages:
+        for section in _synthesize_structure(text)["sections"]:
+            shared = section["shared_fields"]
+            for block in section["deal_blocks"]:
+                legacy = legacy_parsing_prompt(block["text"], shared)
+                data = json.loads(synthesize_response(DealPrompts.create_parsing_prompt(block["text"], shared)))
+                data["region"] = region_for(data.get("geo"))
+                completion = json.dumps({"raw_text": block["text"], "parsed_data": data}, indent=2)
+                totals["calls"] += 1
+                totals["prompt_tokens"] += sum(estimate_tokens(m["content"]) for m in legacy)
+                totals["completion_tokens"] += estimate_tokens(completion)
+    return totals
+
+
+async def current_tokens(messages: List[str]) -> Dict[str, int]:
+    from bot.client import DealParser
+    from bot.llm_stub import ReplayMistral
+    from bot.metrics import token_ledger
+
+    parser = DealParser(client=ReplayMistral(seed=0))
+    with token_ledger() as ledger:
+        for text in messages:
+            await parser._parse_deals(text)
+    deal_calls = [call for call in ledger.calls if call[0] == "deal"]
+    return {
+        "calls": len(deal_calls),
+        "prompt_tokens": sum(call[1] for call in deal_calls),
+        "completion_tokens": sum(call[2] for call in deal_calls),
+        "structure_tokens": sum(call[1] + call[2] for call in ledger.calls if call[0] == "structure"),
+    }
+
+
+def per_deal(totals: Dict[str, int], deals: int) -> Dict:
+    return {
+        **totals,
+        "prompt_per_deal": round(totals["prompt_tokens"] / deals, 1),
+        "completion_per_deal": round(totals["completion_tokens"] / deals, 1),
+        "total_per_deal": round((totals["prompt_tokens"] + totals["completion_tokens"]) / deals, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deals", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    messages = unstructured_corpus(args.deals, seed=args.seed)
+    before = per_deal(legacy_tokens(messages), args.deals)
+    after = per_deal(asyncio.run(current_tokens(messages)), args.deals)
+    results = {
+        "deal_prompt_before": before,
+        "deal_prompt_after": after,
+        "saved_per_deal": round(before["total_per_deal"] - after["total_per_deal"], 1),
+        "saved_pct": round(100 * (1 - after["total_per_deal"] / before["total_per_deal"]), 1),
+    }
+    write_report({"benchmark": "tokens", "meta": report_meta(), "config": vars(args), "results": results},
+                 args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Measure the per-span overhead of bot.tracing on the hot path.
+
+Compares an empty loop with span creation while tracing is disabled
+(no-op), enabled with a discarding processor, and enabled with the real
+batch processor writing to a file, plus nested spans under a trace root.
+The file run reports how many spans the bounded export queue dropped;
+the exporter is waited for before its temporary directory is removed.
+
+Usage:
+    python -m benchmarks.bench_tracing --iterations 200000 --output tracing.json
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, Dict
+
+from benchmarks.common import report_meta, write_report
+
+
+class _DiscardProcessor:
+    def submit(self, item) -> None:
+        pass
+
+    def shutdown(self, timeout: float = 0.0) -> None:
+        pass
+
+
+def _ns_per_op(func: Callable[[int], None], iterations: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func(iterations)
+        best = min(best, (time.perf_counter_ns() - start) / iterations)
+    return round(best, 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    from bot import tracing
+
+    class _Empty:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    empty = _Empty()
+
+    def baseline(n: int) -> None:
+        for _ in range(n):
+            with empty:
+                pass
+
+    def spans(n: int) -> None:
+        for _ in range(n):
+            with tracing.span("stage", index=1):
+                pass
+
+    def nested(n: int) -> None:
+        with tracing.start_trace("telegram.update", **{"telegram.update_id": 1}):
+            for _ in range(n):
+                with tracing.span("stage", index=1):
+                    pass
+
+    results: Dict[str, float] = {}
+    tracing.configure(None)
+    results["baseline_ns"] = _ns_per_op(baseline, args.iterations, args.repeat)
+    results["disabled_span_ns"] = _ns_per_op(spans, args.iterations, args.repeat)
+
+    tracing.set_processor(_DiscardProcessor())
+    results["enabled_discard_span_ns"] = _ns_per_op(spans, args.iterations, args.repeat)
+    results["enabled_discard_nested_span_ns"] = _ns_per_op(nested, args.iterations, args.repeat)
+    tracing.set_processor(None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        processor = tracing.BatchSpanProcessor(tracing.FileExporter(os.path.join(tmp, "spans.jsonl")))
+        tracing.set_processor(processor)
+        results["enabled_file_nested_span_ns"] = _ns_per_op(nested, args.iterations, args.repeat)
+        tracing.set_processor(None)
+        processor.shutdown(timeout=None)
+        results["file_spans_dropped"] = processor.dropped
+
+    results["overhead_disabled_ns"] = round(results["disabled_span_ns"] - results["baseline_ns"], 1)
+    results["overhead_enabled_ns"] = round(results["enabled_file_nested_span_ns"] - results["baseline_ns"], 1)
+    write_report({"benchmark": "tracing", "meta": report_meta(), "config": vars(args), "results": results},
+                 args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Cost of a replayed webhook backlog with and without the update pre-filter.
+
+Builds N raw update bodies like the ones Telegram replays after downtime:
+mostly stale text messages, plus re-delivered duplicates, non-text
+messages and a few fresh messages and button clicks. "before" parses
+every body and builds an Update from it, as telegram_webhook used to.
+"after" runs UpdateFilter.check and builds Updates only for survivors.
+Dispatch is not included, so the real saving is larger.
+
+    python -m benchmarks.bench_webhook --updates 20000
+"""
+import argparse
+import json
+import logging
+import random
+import time
+from typing import Dict, List
+
+from benchmarks.common import report_meta, structured_corpus, write_report
+
+
+def backlog(n: int, seed: int = 0, stale_rate: float = 0.7, duplicate_rate: float = 0.1,
+            other_rate: float = 0.1) -> List[bytes]:
+    rng = random.Random(seed)
+    now = int(time.time())
+    texts = structured_corpus(50, seed=seed)
+    user = {"id": 42, "is_bot": False, "first_name": "Bench"}
+    chat = {"id": 42, "type": "private"}
+    bodies: List[bytes] = []
+    for update_id in range(1, n + 1):
+        roll = rng.random()
+        if roll < duplicate_rate and bodies:
+            bodies.append(rng.choice(bodies))
+            continue
+        message = {"message_id": update_id, "from": user, "chat": chat, "date": now}
+        if roll < duplicate_rate + stale_rate:
+            message.update(date=now - rng.randint(60, 6 * 3600), text=rng.choice(texts))
+            update = {"update_id": update_id, "message": message}
+        elif roll < duplicate_rate + stale_rate + other_rate:
+            message["sticker"] = {"file_id": "x", "file_unique_id": "x", "width": 512, "height": 512,
+                                  "is_animated": False, "is_video": False, "type": "regular"}
+            update = {"update_id": update_id, "message": message}
+        elif rng.random() < 0.5:
+            update = {"update_id": update_id, "callback_query": {
+                "id": str(update_id), "from": user, "chat_instance": "1", "data": "a:kf12ab:0",
+                "message": dict(message, text="card")}}
+        else:
+            update = {"update_id": update_id, "message": dict(message, text=rng.choice(texts))}
+        bodies.append(json.dumps(update).encode())
+    return bodies
+
+
+def timed(run) -> Dict:
+    start = time.perf_counter()
+    built = run()
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 4), "updates_built": built}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    from telegram import Bot, Update
+    from bot import update_filter
+
+    bot = Bot("1:bench")
+    bodies = backlog(args.updates, seed=args.seed)
+
+    def before():
+        return sum(1 for body in bodies if Update.de_json(json.loads(body), bot) is not None)
+
+    pre = update_filter.UpdateFilter()
+    verdicts: Dict[str, int] = {}
+
+    def after():
+        built = 0
+        for body in bodies:
+            verdict, data = pre.check(body)
+            verdicts[verdict] = verdicts.get(verdict, 0) + 1
+            if verdict == update_filter.ACCEPT:
+                Update.de_json(data, bot)
+                built += 1
+        return built
+
+    results = {"before": timed(before), "after": timed(after)}
+    results["verdicts"] = verdicts
+    results["json_parser"] = update_filter.loads.__module__
+    results["us_per_update_before"] = round(results["before"]["seconds"] / args.updates * 1e6, 2)
+    results["us_per_update_after"] = round(results["after"]["seconds"] / args.updates * 1e6, 2)
+    results["speedup"] = round(results["before"]["seconds"] / results["after"]["seconds"], 1)
+    write_report({"benchmark": "webhook", "meta": report_meta(), "config": vars(args), "results": results},
+                 args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Shared helpers for the benchmark scripts: synthetic corpora and reporting."""
+import json
+import math
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from bot.regions import region_for
+
+PARTNERS = ["Acolyte", "Deum", "Sutra", "Genio", "AffGenius", "FTD Company", "Rayzone"]
+GEOS = ["UK", "DE", "FR", "ES", "IT", "NL", "CA", "AU", "SG", "MX", "CL", "CO", "PE",
+        "SE", "NO", "DK", "FI", "EE", "LV", "LT", "RO", "PL", "BE", "CH"]
+LANGUAGES = ["Native", "English", "French", "Spanish", "German"]
+SOURCES = ["Facebook", "Google", "Facebook|Google", "Taboola", "Bing", "SEO"]
+SHORT_SOURCES = ["FB", "GG", "FB, GG", "Taboola", "Bing", "SEO"]
+FUNNELS = ["Quantum AI", "Oil Profit", "Immediate Edge", "ByteToken360", "Bitcoin Buyer",
+           "Tradeshop AI", "Riquezal", "Finance Phantom"]
+
+
+def structured_corpus(n: int, seed: int = 0) -> List[str]:
+    """Generate n dash-separated deal strings in the structured format"""
+    rng = random.Random(seed)
+    deals = []
+    for _ in range(n):
+        geo = rng.choice(GEOS)
+        funnels = "|".join(rng.sample(FUNNELS, rng.randint(1, 3)))
+        if rng.random() < 0.8:
+            model, cpa, crg, cpl = "cpa_crg", str(rng.randrange(600, 1600, 50)), f"0.{rng.randint(5, 15):02d}", "&"
+        else:
+            model, cpa, crg, cpl = "cpl", "&", "&", str(rng.randint(10, 40))
+        deals.append("-".join([
+            region_for(geo), rng.choice(PARTNERS), geo, rng.choice(LANGUAGES),
+            rng.choice(SOURCES), model, cpa, crg, cpl, funnels,
+            str(rng.randint(5, 15)) if rng.random() < 0.5 else "&",
+            "0.05" if rng.random() < 0.3 else "&",
+        ]))
+    return deals
+
+
+def unstructured_corpus(n: int, seed: int = 0, deals_per_message: int = 10) -> List[str]:
+    """Generate messages in the 'Partner: ...' format holding n deals in total"""
+    rng = random.Random(seed)
+    messages = []
+    remaining = n
+    while remaining > 0:
+        count = min(deals_per_message, remaining)
+        lines = [f"Partner: {rng.choice(PARTNERS)}", f"Source: {rng.choice(SHORT_SOURCES)}"]
+        for _ in range(count):
+            funnels = ", ".join(rng.sample(FUNNELS, rng.randint(1, 3)))
+            line = f"{rng.choice(GEOS)} {rng.randrange(600, 1600, 50)}+{rng.randint(5, 15)}% mostly {funnels}"
+            if rng.random() < 0.3:
+                line += " until 5% wrong number"
+            lines.append(line)
+        messages.append("\n".join(lines))
+        remaining -= count
+    return messages
+
+
+def chunked(items: List, size: int) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(seconds, 50) * 1000, 3),
+        "p95": round(percentile(seconds, 95) * 1000, 3),
+        "p99": round(percentile(seconds, 99) * 1000, 3),
+        "max": round(max(seconds) * 1000, 3) if seconds else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 2)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent, stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report_meta() -> Dict:
+    return {
+        "commit": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_report(report: Dict, output: Optional[str]) -> None:
+    text = json.dumps(report, indent=2)
+    if output:
+        Path(output).write_text(text + "\n")
+    print(text)
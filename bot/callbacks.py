@@ -0,0 +1,125 @@
+"""Compact, versioned callback payloads for the review keyboards.
+
+Every button carries ``<code>:<session>:<index>[:<arg>]``, where ``code``
+is a one-letter action code, ``session`` the base-36 version of the review
+session that rendered the button and ``index`` the deal index in base 36.
+The optional ``arg`` holds the field name or pricing model and may contain
+underscores, so ``editfield`` on ``deduction_limit`` parses cleanly.
+
+Callbacks are dispatched through a table of action -> handler, and a button
+whose session does not match the user's current one is rejected before any
+handler runs.
+
+Usage:
+    data = encode('approve', session, 3)      # 'a:kf12ab:3'
+    router = CallbackRouter()
+    router.register('approve', handler)
+    await router.dispatch(callback, *args)
+"""
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects callback_data longer than 64 bytes
+MAX_CALLBACK_BYTES = 64
+
+ACTION_CODES = {
+    'approve': 'a',
+    'reject': 'r',
+    'next': 'n',
+    'prev': 'p',
+    'edit': 'e',
+    'editfield': 'f',
+    'editmodel': 'm',
+    'setmodel': 's',
+    'back': 'b',
+    'submit': 'S',
+    'discard': 'D',
+    'reprocess': 'R',
+    'page': 'P',
+    'toggle': 't',
+    'approve_page': 'A',
+    'approve_valid': 'V',
+    'summary': 'Z',
+}
+ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+
+# Seeded from the clock so sessions created after a restart never reuse the
+# versions printed on buttons that are still sitting in old chats.
+_session_counter = itertools.count(int(time.time()))
+
+
+def new_session() -> int:
+    """Version number for a freshly created review session"""
+    return next(_session_counter)
+
+
+def _base36(number: int) -> str:
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    if number == 0:
+        return '0'
+    out = []
+    while number:
+        number, rem = divmod(number, 36)
+        out.append(digits[rem])
+    return ''.join(reversed(out))
+
+
+class Callback(NamedTuple):
+    action: str
+    session: int
+    index: int
+    arg: Optional[str] = None
+
+
+def encode(action: str, session: int, index: int = 0, arg: Optional[str] = None) -> str:
+    """Build callback_data for a button"""
+    parts = [ACTION_CODES[action], _base36(session), _base36(index)]
+    if arg is not None:
+        parts.append(arg)
+    data = ':'.join(parts)
+    if len(data.encode()) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"Callback data too long ({len(data.encode())} bytes): {data}")
+    return data
+
+
+def decode(data: Optional[str]) -> Optional[Callback]:
+    """Parse callback_data; None if it is not a compact payload (e.g. legacy buttons)"""
+    if not data:
+        return None
+    parts = data.split(':', 3)
+    if len(parts) < 3 or parts[0] not in ACTIONS:
+        return None
+    try:
+        session = int(parts[1], 36)
+        index = int(parts[2], 36)
+    except ValueError:
+        return None
+    return Callback(ACTIONS[parts[0]], session, index, parts[3] if len(parts) == 4 else None)
+
+
+Handler = Callable[..., Awaitable[None]]
+
+
+class CallbackRouter:
+    """Dispatch decoded callbacks through an action -> handler table"""
+
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+
+    def register(self, action: str, handler: Handler) -> None:
+        if action not in ACTION_CODES:
+            raise ValueError(f"Unknown callback action: {action}")
+        self._handlers[action] = handler
+
+    async def dispatch(self, callback: Callback, *args) -> bool:
+        """Run the handler for callback.action; False when none is registered"""
+        handler = self._handlers.get(callback.action)
+        if handler is None:
+            logger.warning("No handler registered for callback action %s", callback.action)
+            return False
+        await handler(callback, *args)
+        return True
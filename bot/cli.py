@@ -0,0 +1,335 @@
+"""Headless batch loader: parse deal files and submit them without Telegram.
+
+Input goes through the same DealRouter format detection as chat messages.
+Structured lines (``TIER1-Partner-GEO-...``) are parsed with
+Deal.from_dash_string across a process pool. ``Partner:`` blocks are
+parsed by DealParser (Mistral), several messages at a time. Valid deals are
+written to Notion through StructuredDealParser.submit_deals, or to a CSV or
+JSONL file.
+
+Input is processed in windows of ``--batch-size`` items. After a window is
+written, its item keys (file, line, content hash) are appended to the
+``--checkpoint`` file, so a rerun with the same checkpoint skips them.
+Delivery is at least once: a crash mid-window resubmits that window.
+
+Usage:
+    python -m bot.cli deals.txt --output deals.jsonl
+    python -m bot.cli deals/*.txt --output notion --checkpoint load.ckpt --errors failed.jsonl
+    cat deals.txt | python -m bot.cli - --output deals.csv --workers 4
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from bot.models import Deal
+from bot.router import DataFormat, DealRouter
+
+logger = logging.getLogger(__name__)
+
+SIMPLE = 'simple'
+COMPLEX = 'complex'
+INVALID = 'invalid'
+
+# Structured lines per process-pool task; small enough to spread a window
+# across workers, large enough that pickling is not the bottleneck
+CHUNK_SIZE = 250
+
+
+class Item(NamedTuple):
+    """One unit of input: a structured line or a ``Partner:`` message"""
+    file: str
+    line: int
+    flow: str
+    text: str
+
+    @property
+    def key(self) -> str:
+        digest = hashlib.sha1(self.text.encode()).hexdigest()[:12]
+        return f"{self.file}:{self.line}:{digest}"
+
+
+class Result(NamedTuple):
+    item: Item
+    deal: Optional[Deal]
+    error: Optional[str]
+
+
+def split_items(file: str, text: str) -> List[Item]:
+    """Split a file into items the way the router would route each message"""
+    items = []
+    block: Optional[List] = None  # [line, lines] of the open Partner: message
+
+    def close_block():
+        if block is not None:
+            items.append(Item(file, block[0], COMPLEX, '\n'.join(block[1])))
+
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        if re.match(DealRouter.COMPLEX_START_PATTERN, line, re.IGNORECASE):
+            close_block()
+            block = [number, [line]]
+        elif DealRouter.detect_format(line).format_type == DataFormat.STRUCTURED:
+            close_block()
+            block = None
+            items.append(Item(file, number, SIMPLE, line))
+        elif block is not None:
+            block[1].append(line)
+        else:
+            items.append(Item(file, number, INVALID, line))
+    close_block()
+    return items
+
+
+def read_items(paths: Iterable[str]) -> List[Item]:
+    items = []
+    for path in paths:
+        if path == '-':
+            items.extend(split_items('<stdin>', sys.stdin.read()))
+        else:
+            with open(path, encoding='utf-8') as f:
+                items.extend(split_items(path, f.read()))
+    return items
+
+
+def parse_structured(lines: List[str]) -> List[Tuple[Optional[Deal], Optional[str]]]:
+    """Process-pool task: parse dash strings (same parser as SimpleDealBot)"""
+    results = []
+    for line in lines:
+        try:
+            results.append(Deal.from_dash_string(line))
+        except Exception as e:
+            results.append((None, f"Error parsing deal: {e}"))
+    return results
+
+
+class Checkpoint:
+    """Append-only file of item keys that have been written"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.done: Set[str] = set()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.done = {line.strip() for line in f if line.strip()}
+            logger.info("Resuming from %s: %d items already written", path, len(self.done))
+
+    def record(self, items: Iterable[Item]) -> None:
+        if not self.path:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(f"{item.key}\n" for item in items)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class FileSink:
+    """Append valid deals to a CSV or JSONL file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+    def write(self, results: List[Result]) -> List[Result]:
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, 'a', encoding='utf-8', newline='') as f:
+            if self.format == 'csv':
+                writer = csv.DictWriter(f, fieldnames=('file', 'line') + Deal.FIELDS)
+                if new_file:
+                    writer.writeheader()
+                for result in results:
+                    row = {name: getattr(result.deal, name) for name in Deal.FIELDS}
+                    row['funnels'] = '|'.join(result.deal.funnels)
+                    writer.writerow({'file': result.item.file, 'line': result.item.line, **row})
+            else:
+                for result in results:
+                    record = {'file': result.item.file, 'line': result.item.line, **result.deal.to_dict()}
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return []
+
+
+class NotionSink:
+    """Submit valid deals through the shared StructuredDealParser"""
+
+    def write(self, results: List[Result]) -> List[Result]:
+        from bot.clients import get_structured_parser
+        # Same payloads as the bots: typed values as entered, LLM values cleaned
+        payloads = [r.deal.to_submission(clean=r.item.flow == COMPLEX) for r in results]
+        outcomes = get_structured_parser().submit_deals(payloads)
+        return [Result(r.item, r.deal, outcome.get('error') or 'Submission failed')
+                for r, outcome in zip(results, outcomes) if not outcome['success']]
+
+
+class BatchLoader:
+    def __init__(self, sink, checkpoint: Checkpoint, executor: Optional[Executor] = None,
+                 concurrency: int = 4, errors: Optional[str] = None):
+        self.sink = sink
+        self.checkpoint = checkpoint
+        self.executor = executor
+        self.concurrency = concurrency
+        self.errors = errors
+        self.stats = {'items': 0, 'skipped': 0, 'deals': 0, 'invalid': 0, 'written': 0, 'failed': 0,
+                      'parse_seconds': 0.0, 'output_seconds': 0.0}
+        self._parser = None
+
+    async def _parse_simple(self, items: List[Item]) -> List[Result]:
+        lines = [item.text for item in items]
+        chunks = [lines[i:i + CHUNK_SIZE] for i in range(0, len(lines), CHUNK_SIZE)]
+        if self.executor is None or len(chunks) < 2:
+            parsed = [parse_structured(chunk) for chunk in chunks]
+        else:
+            loop = asyncio.get_running_loop()
+            parsed = await asyncio.gather(*(loop.run_in_executor(self.executor, parse_structured, chunk)
+                                            for chunk in chunks))
+        flat = [pair for chunk in parsed for pair in chunk]
+        return [Result(item, deal, error) for item, (deal, error) in zip(items, flat)]
+
+    async def _parse_complex(self, item: Item, semaphore: asyncio.Semaphore) -> List[Result]:
+        from bot.client import DealParser
+        if self._parser is None:
+            self._parser = DealParser()
+        async with semaphore:
+            try:
+                deals = await self._parser.parse_deals(item.text)
+            except Exception as e:
+                logger.error("Failed to parse message at %s:%d: %s", item.file, item.line, e)
+                return [Result(item, None, str(e))]
+        results = []
+        for deal in deals:
+            if deal.error or not deal.is_valid:
+                missing = deal.missing_fields()
+                error = deal.error or (f"Missing required fields: {', '.join(missing)}" if missing
+                                       else f"Invalid pricing values for model {deal.pricing_model}")
+                results.append(Result(item, None, error))
+            else:
+                results.append(Result(item, deal, None))
+        return results
+
+    async def _parse(self, items: List[Item]) -> List[Result]:
+        simple = [item for item in items if item.flow == SIMPLE]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        complex_tasks = [self._parse_complex(item, semaphore) for item in items if item.flow == COMPLEX]
+        parsed = await asyncio.gather(self._parse_simple(simple), *complex_tasks)
+        results = [r for group in parsed for r in group]
+        results.extend(Result(item, None, "Invalid format: not a structured deal or 'Partner:' message")
+                       for item in items if item.flow == INVALID)
+        return results
+
+    def _write_errors(self, failed: List[Result]) -> None:
+        for result in failed:
+            logger.warning("%s:%d: %s", result.item.file, result.item.line, result.error)
+        if not self.errors or not failed:
+            return
+        with open(self.errors, 'a', encoding='utf-8') as f:
+            for result in failed:
+                f.write(json.dumps({'file': result.item.file, 'line': result.item.line,
+                                    'text': result.item.text, 'error': result.error},
+                                   ensure_ascii=False) + '\n')
+
+    async def run_window(self, items: List[Item]) -> None:
+        start = time.perf_counter()
+        results = await self._parse(items)
+        parsed_at = time.perf_counter()
+        valid = [r for r in results if r.deal is not None]
+        invalid = [r for r in results if r.deal is None]
+
+        rejected = await asyncio.to_thread(self.sink.write, valid) if valid else []
+        written_at = time.perf_counter()
+        self._write_errors(invalid + rejected)
+        self.checkpoint.record(items)
+
+        self.stats['deals'] += len(valid)
+        self.stats['invalid'] += len(invalid)
+        self.stats['written'] += len(valid) - len(rejected)
+        self.stats['failed'] += len(rejected)
+        self.stats['parse_seconds'] += parsed_at - start
+        self.stats['output_seconds'] += written_at - parsed_at
+        logger.info("Wrote %d/%d deals from %d items in %.2fs (%.1f deals/s)",
+                    len(valid) - len(rejected), len(results), len(items), written_at - start,
+                    len(valid) / (written_at - start) if written_at > start else 0.0)
+
+    async def run(self, items: List[Item], batch_size: int) -> Dict:
+        from bot.metrics import token_ledger
+        start = time.perf_counter()
+        todo = [item for item in items if item.key not in self.checkpoint.done]
+        self.stats['items'] = len(items)
+        self.stats['skipped'] = len(items) - len(todo)
+        with token_ledger() as ledger:
+            for i in range(0, len(todo), batch_size):
+                await self.run_window(todo[i:i + batch_size])
+        elapsed = time.perf_counter() - start
+        self.stats.update({
+            'elapsed_seconds': elapsed,
+            'deals_per_sec': round(self.stats['deals'] / elapsed, 1) if elapsed else 0.0,
+            'mistral': ledger.summary(self.stats['deals']),
+        })
+        self.stats['parse_seconds'] = round(self.stats['parse_seconds'], 3)
+        self.stats['output_seconds'] = round(self.stats['output_seconds'], 3)
+        self.stats['elapsed_seconds'] = round(elapsed, 3)
+        return self.stats
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m bot.cli', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help="deal files, or '-' for stdin")
+    parser.add_argument('--output', required=True,
+                        help="'notion' to submit, or a .csv / .jsonl file to append to")
+    parser.add_argument('--checkpoint', help='file of written item keys; reruns skip them')
+    parser.add_argument('--errors', help='append invalid and failed deals to this JSONL file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='processes for structured parsing (1 parses inline)')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="'Partner:' messages parsed by Mistral at once")
+    parser.add_argument('--batch-size', type=int, default=1000, help='items per checkpointed window')
+    parser.add_argument('--stats', help='write throughput stats as JSON to this file (default stderr)')
+    parser.add_argument('--log-level', default='INFO')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from bot.logging_config import setup_logging
+    args = build_parser().parse_args(argv)
+    setup_logging(level=args.log_level)
+
+    if args.output == 'notion':
+        from bot.settings import get_settings
+        missing = get_settings().missing('notion_token', 'offers_database_id', 'advertisers_database_id')
+        if missing:
+            logger.error("Missing required environment variables: %s", ', '.join(missing))
+            return 2
+        sink = NotionSink()
+    else:
+        sink = FileSink(args.output)
+
+    items = read_items(args.inputs)
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    try:
+        loader = BatchLoader(sink, Checkpoint(args.checkpoint), executor=executor,
+                             concurrency=args.concurrency, errors=args.errors)
+        stats = asyncio.run(loader.run(items, args.batch_size))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    report = json.dumps(stats, indent=2)
+    if args.stats:
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+    else:
+        print(report, file=sys.stderr)
+    return 1 if stats['invalid'] or stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
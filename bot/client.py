@@ -1,41 +1,27 @@
-import os
-import sys
 from enum import Enum
 import re
-
-import mistralai
-import dotenv
-import rich
-
-# Actual imports
-from mistralai import Mistral
-from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
 import time
 import random
 import json
-from bot.prompts import DealPrompts
+from bot.prompts import DealPrompts, check_deal_response, check_structure_response
+from bot.schemas import validate_deals, validate_structure
 import asyncio
 from functools import partial
-from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn, BarColumn
-from rich.panel import Panel
-from rich.text import Text
 from bot.progress_handler import ProgressHandler
+from bot.metrics import MISTRAL_CASCADE, MISTRAL_SECONDS, instrument, record_usage, token_ledger
+from bot import tracing
+from bot.logging_config import log_payload
+from bot.settings import get_settings
+from bot.clients import get_mistral_client
+from bot.hedging import get_hedger
+from bot.models import Deal
+from bot import derived
 
 # Logging configuration
 import logging
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-try:
-    load_dotenv()
-except Exception as e:
-    logger.error(f"Error loading .env file: {e}")
-
-# Initialize console
-console = Console()
-
 class ProgressStages(Enum):
     INIT = "Initializing"
     COMPLETE = "Complete"
@@ -182,9 +168,11 @@ class FieldValidator:
     
     @classmethod
     def clean_geo(cls, geo: str) -> str:
-        """Clean geo codes - extract only country code"""
+        """Clean geo codes - extract only country code ("UK|IE" keeps one code per part)"""
         if not geo:
             return geo
+        if '|' in str(geo):
+            return '|'.join(filter(None, (cls.clean_geo(part) for part in str(geo).split('|'))))
             
         # Remove emojis and flags
         geo = re.sub(r'[\U0001F1E6-\U0001F1FF]', '', str(geo))
@@ -257,19 +245,33 @@ class FieldValidator:
             return value  # Return original value if cleaning fails
 
 class DealParser:
-    def __init__(self, message=None):
-        self._validate_api_key()
-        self.client = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
+    def __init__(self, message=None, client=None):
+        self._client = client
         self.message = message
         self.progress = None  # Will hold ProgressHandler instance
         self.max_retries = 3
         self.base_delay = 1.0
-        self.model = "mistral-large-latest"
+        # Model cascade, cheapest first (MISTRAL_MODELS)
+        self.models = get_settings().mistral_model_tiers
+        self.hedger = get_hedger()
+
+    @property
+    def client(self):
+        """Mistral client; borrows the shared pooled client on first use"""
+        if self._client is None:
+            if not get_settings().mistral_replay_file:
+                self._validate_api_key()
+            self._client = get_mistral_client()
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
 
     def _validate_api_key(self):
         """Validate API key exists"""
         try:
-            if not os.getenv("MISTRAL_API_KEY"):
+            if not get_settings().mistral_api_key:
                 logger.error("MISTRAL_API_KEY environment variable not set")
                 raise ValueError(
                     "MISTRAL_API_KEY environment variable not set. "
@@ -279,7 +281,16 @@ class DealParser:
             logger.error(f"API key validation error: {str(e)}")
             raise
 
-    async def parse_deals(self, text: str) -> List[Dict]:
+    async def parse_deals(self, text: str) -> List[Deal]:
+        with token_ledger() as ledger:
+            deals = await self._parse_deals(text)
+        usage = ledger.summary(len(deals))
+        logger.info("Parsed %d deals in %d Mistral calls: %d prompt + %d completion tokens (%.1f per deal)",
+                    len(deals), usage["calls"], usage["prompt_tokens"], usage["completion_tokens"],
+                    usage["tokens_per_deal"])
+        return deals
+
+    async def _parse_deals(self, text: str) -> List[Deal]:
         try:
             start_time = time.time()
             
@@ -307,7 +318,7 @@ class DealParser:
                 })
             
             total_deals = self.get_total_deals(structure)
-            results = []
+            replies = []
             
             # Process deals
             for section_idx, section in enumerate(structure.get("sections", [])):
@@ -321,13 +332,11 @@ class DealParser:
                             "message": f"🔄 Processing deal {deal_idx + 1} of {total_deals}"
                         })
                     
-                    context = {
-                        "shared_fields": shared_fields,
-                        "deal_text": deal_block["text"]
-                    }
-                    
-                    parsed_deal = await self._parse_deal(deal_block["text"], context)
-                    results.append(parsed_deal)
+                    with tracing.span("deal", section=section_idx, index=deal_idx):
+                        replies.append(await self._parse_deal(deal_block["text"], shared_fields))
+            
+            # Validate every reply in one call before anything reaches Notion
+            results = self._build_deals(replies)
             
             # Complete
             elapsed_time = time.time() - start_time
@@ -351,8 +360,12 @@ class DealParser:
         """Show completion message without blocking main process"""
         await asyncio.sleep(0.2)  # Small delay for visual purposes only
         total_time = time.time() - start_time
-        self.console.print()
-        self.console.print(Panel(
+        from rich.console import Console
+        from rich.panel import Panel
+        from rich.text import Text
+        console = Console()
+        console.print()
+        console.print(Panel(
             Text.assemble(
                 ("✨ Deal Processing Complete!\n\n", "bold green"),
                 (f"Total Time: {total_time:.2f} seconds\n", "blue"),
@@ -362,68 +375,61 @@ class DealParser:
             border_style="green"
         ))
 
+    @instrument("analyze_structure")
     async def _analyze_structure(self, text: str) -> Dict:
         """Analyze text structure and identify shared fields and deal blocks"""
         try:
             response = await self._call_mistral(
-                DealPrompts.create_structure_prompt(text)
+                DealPrompts.create_structure_prompt(text), prompt="structure",
+                validate=check_structure_response
             )
-            structure = json.loads(response)
-            
-            # Validate structure format
-            if "sections" not in structure:
-                structure = {
-                    "sections": [{
-                        "shared_fields": {},
-                        "deal_blocks": []
-                    }]
-                }
-                
-            return structure
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse structure response: {e}")
+            return validate_structure(response)
+        except ValueError as e:
+            logger.error("Unusable structure response: %s", e)
             raise
 
-    async def _parse_deal(self, deal_text: str, context: Dict) -> Dict:
-        """Parse individual deal with shared context"""
+    @instrument("parse_deal")
+    async def _parse_deal(self, deal_text: str, shared_fields: Dict) -> Dict:
+        """Parse individual deal with shared context; the reply is validated later with its batch"""
+        response = await self._call_mistral(
+            DealPrompts.create_parsing_prompt(deal_text, shared_fields), prompt="deal",
+            validate=check_deal_response
+        )
         try:
-            response = await self._call_mistral(
-                DealPrompts.create_parsing_prompt(deal_text, context)
-            )
             parsed = json.loads(response)
-            
-            if "parsed_data" in parsed:
-                data = parsed["parsed_data"]
-                
-                # Clean fields using FieldValidator
-                data["language"] = FieldValidator.clean_language(data.get("language"))
-                data["source"] = FieldValidator.clean_source(data.get("source"))
-                data["geo"] = FieldValidator.clean_geo(data.get("geo"))
-                data["cr"] = FieldValidator.clean_value(data.get("cr"), "cr")
-                data["crg"] = FieldValidator.clean_value(data.get("crg"), "crg")
-                
-                # Determine pricing model based on values
-                if data.get("crg"):
-                    data["pricing_model"] = "CPA/CRG"
-                elif data.get("cpa"):
-                    data["pricing_model"] = "CPA"
-                elif data.get("cpl"):
-                    data["pricing_model"] = "CPL"
-                
-                # Ensure funnels is always a list
-                if not isinstance(data.get("funnels"), list):
-                    data["funnels"] = []
-                    
-            return parsed
-            
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse deal response: {e}")
-            return self._create_error_response(str(e))
+            return {"raw_text": deal_text, "error": f"invalid JSON: {e}"}
+        if not isinstance(parsed, dict):
+            return {"raw_text": deal_text, "parsed_data": parsed}
+        # The trimmed schema returns flat fields and no raw_text echo
+        return {"raw_text": parsed.get("raw_text") or deal_text, "parsed_data": parsed.get("parsed_data", parsed)}
 
-    def _create_error_response(self, error_message: str) -> Dict:
+    def _build_deals(self, replies: List[Dict]) -> List[Deal]:
+        """Validate all deal replies of a message in one call and build Deals from them"""
+        checked, errors = validate_deals([reply.get("parsed_data") for reply in replies])
+        deals = []
+        for index, (reply, data) in enumerate(zip(replies, checked)):
+            error = reply.get("error") or errors.get(index)
+            if error:
+                logger.warning("Rejected deal reply %d: %s", index, error)
+                deal = self._create_error_response(error)
+                deal.raw_text = reply["raw_text"]
+                deals.append(deal)
+                continue
+            # Leave a missing language empty so derived.fill picks English/Native from the GEO
+            data["language"] = FieldValidator.clean_language(data["language"]) if data["language"] else None
+            data["source"] = FieldValidator.clean_source(data["source"])
+            data["geo"] = FieldValidator.clean_geo(data["geo"])
+            # Region, default language and a pricing model that follows the prices
+            deal = Deal.from_llm({"raw_text": reply["raw_text"], "parsed_data": data})
+            derived.fill(deal, derived=('region', 'pricing_model'))
+            deals.append(deal)
+        return deals
+
+    def _create_error_response(self, error_message: str) -> Deal:
         """Create standardized error response"""
-        return {
+        return Deal.from_llm({
             "raw_text": "",
             "parsed_data": {
                 "partner": "&",
@@ -442,22 +448,64 @@ class DealParser:
             "metadata": {
                 "error": error_message
             }
-        }
+        })
+
+    @instrument("mistral_call")
+    async def _call_mistral(self, messages: List[Dict], prompt: str = "other",
+                            validate: Optional[Callable[[str], Optional[str]]] = None) -> str:
+        """Run the model cascade: try the cheapest tier and escalate when `validate` rejects its reply"""
+        last_tier = len(self.models) - 1
+        for tier, model in enumerate(self.models):
+            try:
+                content = await self._complete(model, messages, prompt, validate)
+            except Exception as e:
+                if tier == last_tier:
+                    raise
+                MISTRAL_CASCADE.inc(model=model, prompt=prompt, outcome="escalated")
+                logger.warning("Escalating %s prompt from %s after error: %s", prompt, model, e)
+                continue
 
-    async def _call_mistral(self, messages: List[Dict]) -> str:
+            reason = validate(content) if validate else None
+            if reason is None:
+                MISTRAL_CASCADE.inc(model=model, prompt=prompt, outcome="accepted")
+                return content
+            if tier == last_tier:
+                # Nothing left to escalate to; the caller falls back to its error handling
+                MISTRAL_CASCADE.inc(model=model, prompt=prompt, outcome="invalid")
+                logger.warning("%s reply from %s failed validation: %s", prompt, model, reason)
+                return content
+            MISTRAL_CASCADE.inc(model=model, prompt=prompt, outcome="escalated")
+            logger.info("Escalating %s prompt from %s: %s", prompt, model, reason)
+
+    async def _complete(self, model: str, messages: List[Dict], prompt: str,
+                        validate: Optional[Callable[[str], Optional[str]]] = None) -> str:
         """Make API call to Mistral with proper async handling"""
+        def call():
+            return self.client.chat.complete_async(
+                model=model,
+                messages=messages,
+                temperature=0.0,
+                response_format={"type": "json_object"}
+            )
+
+        def usable(response) -> bool:
+            return validate is None or validate(response.choices[0].message.content) is None
+
         for attempt in range(self.max_retries):
+            start = time.perf_counter()
             try:
-                response = await self.client.chat.complete_async(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0.0,
-                    response_format={"type": "json_object"}
-                )
+                with tracing.span("mistral.complete", model=model, prompt=prompt):
+                    if self.hedger is not None:
+                        response = await self.hedger.run(model, prompt, call, usable)
+                    else:
+                        response = await call()
+                MISTRAL_SECONDS.observe(time.perf_counter() - start, model=model, prompt=prompt)
+                
+                record_usage(model, getattr(response, "usage", None), prompt)
                 
                 # Log response for debugging
                 content = response.choices[0].message.content
-                logger.debug(f"Mistral response: {content}")
+                log_payload(logger, "Mistral response: %s", content)
                 return content
                 
             except Exception as e:
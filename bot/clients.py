@@ -0,0 +1,141 @@
+"""Process-wide registry of long-lived API clients.
+
+Notion and Mistral clients are created once per process on first use and
+shared by SimpleDealBot, MessageHandler, DealParser and the Notion
+parsers. Each one sits on a keep-alive connection pool (HTTP/2 when the
+``h2`` package is installed), so the TLS handshake is paid once per
+process rather than once per batch.
+
+Usage:
+    from bot.clients import get_notion_client, get_structured_parser
+
+    notion = get_notion_client()
+    parser = get_structured_parser()
+
+Call close_clients() on shutdown to release the pools.
+"""
+import logging
+import threading
+from typing import Dict, Optional
+
+import httpx
+
+from bot.settings import get_settings
+from bot.tracing import AsyncTracingTransport, TracingTransport
+
+logger = logging.getLogger(__name__)
+
+# Keep idle connections well past httpx's 5s default so that a Submit click
+# minutes after the last call can still reuse the pooled connection.
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120.0)
+NOTION_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+MISTRAL_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+_lock = threading.RLock()
+_notion_clients: Dict[str, object] = {}
+_mistral_client = None
+_structured_parser = None
+_http_clients = []
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (pip install 'httpx[http2]')"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _transport_options() -> Dict:
+    return {"http2": http2_available(), "limits": POOL_LIMITS}
+
+
+def _sync_http_client(timeout: httpx.Timeout) -> httpx.Client:
+    client = httpx.Client(transport=TracingTransport(**_transport_options()), timeout=timeout)
+    _http_clients.append(client)
+    return client
+
+
+def _async_http_client(timeout: httpx.Timeout) -> httpx.AsyncClient:
+    client = httpx.AsyncClient(transport=AsyncTracingTransport(**_transport_options()), timeout=timeout)
+    _http_clients.append(client)
+    return client
+
+
+def get_notion_client(token: Optional[str] = None):
+    """Shared notion_client.Client for the given token (default: NOTION_TOKEN)"""
+    token = token or get_settings().notion_token
+    client = _notion_clients.get(token)
+    if client is not None:
+        return client
+    with _lock:
+        client = _notion_clients.get(token)
+        if client is None:
+            from notion_client import Client
+            client = Client(auth=token, client=_sync_http_client(NOTION_TIMEOUT))
+            _notion_clients[token] = client
+            logger.info("Created shared Notion client (http2=%s)", http2_available())
+    return client
+
+
+def get_mistral_client():
+    """Shared Mistral client, or a ReplayMistral when MISTRAL_REPLAY_FILE is set"""
+    global _mistral_client
+    if _mistral_client is not None:
+        return _mistral_client
+    with _lock:
+        if _mistral_client is None:
+            settings = get_settings()
+            if settings.mistral_replay_file:
+                # Offline mode: serve recorded responses instead of the live API
+                from bot.llm_stub import ReplayMistral
+                _mistral_client = ReplayMistral(recordings=settings.mistral_replay_file)
+            else:
+                from mistralai import Mistral
+                _mistral_client = Mistral(
+                    api_key=settings.mistral_api_key,
+                    client=_sync_http_client(MISTRAL_TIMEOUT),
+                    async_client=_async_http_client(MISTRAL_TIMEOUT),
+                )
+                logger.info("Created shared Mistral client (http2=%s)", http2_available())
+    return _mistral_client
+
+
+def get_structured_parser():
+    """Shared StructuredDealParser for the configured offers/advertisers databases"""
+    global _structured_parser
+    if _structured_parser is not None:
+        return _structured_parser
+    with _lock:
+        if _structured_parser is None:
+            from bot.structured_deal_parser import StructuredDealParser
+            settings = get_settings()
+            missing = settings.missing('notion_token', 'offers_database_id', 'advertisers_database_id')
+            if missing:
+                raise ValueError(f"Missing required Notion environment variables: {', '.join(missing)}")
+            _structured_parser = StructuredDealParser(
+                notion_token=settings.notion_token,
+                database_id=settings.offers_database_id,
+                kitchen_database_id=settings.advertisers_database_id,
+            )
+    return _structured_parser
+
+
+async def close_clients() -> None:
+    """Close every pooled HTTP client created by the registry"""
+    global _mistral_client, _structured_parser
+    with _lock:
+        http_clients = list(_http_clients)
+        _http_clients.clear()
+        _notion_clients.clear()
+        _mistral_client = None
+        _structured_parser = None
+    for client in http_clients:
+        try:
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            else:
+                client.close()
+        except Exception as e:
+            logger.warning("Error closing HTTP client: %s", e)
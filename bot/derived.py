@@ -0,0 +1,121 @@
+"""Deal fields computed from other fields, recomputed incrementally.
+
+Each derived field names the fields it is computed from:
+
+    region         <- geo                 region_for(geo)
+    language       <- geo                 'English' for UK/US/AU/CA, else 'Native'
+    pricing_model  <- crg, cpa, cpl       CPA/CRG if crg, else CPA if cpa, else CPL
+
+An edit recomputes only the derived fields downstream of the edited one,
+in dependency order, and reports every field that changed so the card is
+re-rendered once. Language and pricing model are only recomputed while
+they are unset or were derived in the first place (``deal.derived``); once
+the LLM or the user sets them explicitly they stay put. A rule that has
+nothing to go on (no GEO, no prices) leaves the current value alone.
+
+Usage:
+    fill(deal, derived=('region', 'pricing_model'))   # after parsing
+    changed = recompute(deal, {'geo'})                # after an edit: {'region', 'language'}
+"""
+import logging
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional, Set, Tuple
+
+from bot.regions import canonical_country, region_for, split_geos
+
+if TYPE_CHECKING:
+    from bot.models import Deal
+
+logger = logging.getLogger(__name__)
+
+ENGLISH_COUNTRIES = frozenset({'GB', 'US', 'AU', 'CA'})
+
+
+def _region(deal: 'Deal') -> Optional[str]:
+    return region_for(deal.geo)
+
+
+def _language(deal: 'Deal') -> Optional[str]:
+    if not deal.geo:
+        return 'Native'
+    codes = {canonical_country(code) for code in split_geos(deal.geo)}
+    return 'English' if codes & ENGLISH_COUNTRIES else 'Native'
+
+
+def _pricing_model(deal: 'Deal') -> Optional[str]:
+    if deal.crg:
+        return 'CPA/CRG'
+    if deal.cpa:
+        return 'CPA'
+    if deal.cpl:
+        return 'CPL'
+    return None
+
+
+class Rule:
+    __slots__ = ('field', 'inputs', 'compute', 'always')
+
+    def __init__(self, field: str, inputs: Tuple[str, ...], compute: Callable[['Deal'], Any],
+                 always: bool = False):
+        self.field = field
+        self.inputs = inputs
+        self.compute = compute
+        # Recompute even when the current value was set explicitly
+        self.always = always
+
+
+RULES: Tuple[Rule, ...] = (
+    Rule('region', ('geo',), _region, always=True),
+    Rule('language', ('geo',), _language),
+    Rule('pricing_model', ('crg', 'cpa', 'cpl'), _pricing_model),
+)
+DERIVED_FIELDS = frozenset(rule.field for rule in RULES)
+
+
+def _order(rules: Iterable[Rule]) -> List[Rule]:
+    """Rules sorted so every rule runs after the rules producing its inputs"""
+    pending = {rule.field: rule for rule in rules}
+    ordered: List[Rule] = []
+    while pending:
+        ready = [rule for rule in pending.values() if not set(rule.inputs) & set(pending)]
+        if not ready:
+            raise ValueError(f"Cycle among derived fields: {sorted(pending)}")
+        for rule in ready:
+            ordered.append(rule)
+            del pending[rule.field]
+    return ordered
+
+
+_ORDERED = _order(RULES)
+_INPUTS = frozenset(field for rule in RULES for field in rule.inputs)
+
+
+def recompute(deal: 'Deal', changed: Iterable[str]) -> Set[str]:
+    """Recompute the derived fields affected by `changed`; returns the derived fields that changed"""
+    dirty = set(changed)
+    updated: Set[str] = set()
+    for rule in _ORDERED:
+        if not dirty.intersection(rule.inputs):
+            continue
+        current = getattr(deal, rule.field)
+        if not (rule.always or not current or rule.field in deal.derived):
+            continue
+        value = rule.compute(deal)
+        if value is None:
+            continue
+        deal.derived = deal.derived | {rule.field}
+        if value != current:
+            setattr(deal, rule.field, value)
+            updated.add(rule.field)
+            dirty.add(rule.field)
+            logger.debug("Derived %s: %r -> %r", rule.field, current, value)
+    return updated
+
+
+def fill(deal: 'Deal', derived: Iterable[str] = ()) -> Set[str]:
+    """Compute every derived field of a freshly parsed deal.
+
+    Fields named in `derived` are treated as derived even if already set,
+    e.g. a pricing model the LLM guessed that the prices should override.
+    """
+    deal.derived = deal.derived | frozenset(derived)
+    return recompute(deal, _INPUTS)
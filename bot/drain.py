@@ -0,0 +1,98 @@
+"""Graceful drain for shutdowns and redeploys.
+
+Once draining starts, the webhook answers new updates with 503, which makes
+Telegram deliver them again later (to this instance after the restart, or
+to another one), and /health reports "draining" so the orchestrator stops
+routing traffic here. Updates already being processed are tracked, and
+shutdown waits for them up to DRAIN_TIMEOUT seconds before the outbox is
+stopped and open review sessions are saved to the session store.
+
+Usage:
+    drain = get_drain()
+    async with drain.track():
+        await application.process_update(update)
+    ...
+    drain.start()
+    await drain.wait_idle(timeout=25)
+    drain.resume()    # a pre-stop hook fired but the process is staying up
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DrainController:
+    """Counts in-flight updates and remembers whether the process is draining"""
+
+    def __init__(self):
+        self.draining = False
+        self.draining_since: Optional[float] = None
+        self.in_flight = 0
+        self._idle: Optional[asyncio.Event] = None
+
+    def _event(self) -> asyncio.Event:
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            if not self.in_flight:
+                self._idle.set()
+        return self._idle
+
+    @asynccontextmanager
+    async def track(self):
+        """Mark one update as in flight for the duration of the block"""
+        self.in_flight += 1
+        self._event().clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._event().set()
+
+    def start(self) -> None:
+        if not self.draining:
+            self.draining = True
+            self.draining_since = time.time()
+            logger.info("Draining: refusing new updates, %d in flight", self.in_flight)
+
+    def resume(self) -> None:
+        """Accept updates again after a drain that did not end in a shutdown"""
+        if self.draining:
+            self.draining = False
+            self.draining_since = None
+            logger.info("Drain cancelled: accepting updates again")
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait until no update is in flight; False if the deadline passed first"""
+        try:
+            await asyncio.wait_for(self._event().wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("Drain deadline of %gs passed with %d updates in flight", timeout, self.in_flight)
+            return False
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "status": "draining" if self.draining else "healthy",
+            "in_flight": self.in_flight,
+            "draining_for": round(time.time() - self.draining_since, 1) if self.draining else None,
+        }
+
+
+_drain: Optional[DrainController] = None
+_drain_lock = threading.Lock()
+
+
+def get_drain() -> DrainController:
+    """Process-wide drain controller"""
+    global _drain
+    if _drain is None:
+        with _drain_lock:
+            if _drain is None:
+                _drain = DrainController()
+    return _drain
@@ -0,0 +1,166 @@
+"""Flag deals that already exist as active offers in Notion.
+
+OfferIndex keeps the active offers from the local mirror (bot/mirror.py)
+in two dicts:
+
+- exact: keyed on (partner, geo, language, source, funnel)
+- near: keyed on the same fields minus language, since "Native" and
+  "German" are often the same DE offer
+
+Multi-valued offers ("UK|IE", "Facebook|Google", several funnels) get one
+entry per combination. Values are normalized first (case, punctuation, UK ->
+GB, FB -> Facebook) and memoized, so checking a deal is a handful of dict
+lookups.
+
+Usage:
+    index = get_offer_index()          # await load_offer_index() on the event loop
+    for match in index.match(deal):
+        print(match.kind, match.offer['code'])
+"""
+import asyncio
+import itertools
+import logging
+import re
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from bot.models import Deal
+from bot.regions import canonical_country, split_geos
+from bot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+EXACT = 'exact'
+NEAR = 'near'
+
+_PUNCTUATION = re.compile(r'[^0-9a-z]+')
+_LIST_SEPARATORS = re.compile(r'[|,]')
+
+
+class Match(NamedTuple):
+    kind: str
+    offer: Dict[str, Any]
+
+
+# Partners, GEOs, languages, sources and funnels come from small vocabularies,
+# so normalized values and whole key sets are memoized.
+@lru_cache(maxsize=8192)
+def _word(value: str) -> str:
+    """'FTD Company' / 'ftd-company' -> 'ftdcompany'"""
+    return _PUNCTUATION.sub('', value.casefold())
+
+
+@lru_cache(maxsize=1024)
+def _language(value: str) -> str:
+    from bot.client import FieldValidator
+    return _word(FieldValidator.clean_language(value))
+
+
+@lru_cache(maxsize=1024)
+def _source(value: str) -> str:
+    from bot.client import FieldValidator
+    return _word(FieldValidator.clean_source(value))
+
+
+def _values(value: Any) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = _LIST_SEPARATORS.split(value)
+    return [str(v).strip() for v in value if v and str(v).strip()]
+
+
+@lru_cache(maxsize=16384)
+def _keys(partner: Any, geo: Any, language: Any, source: Any, funnels: Any) -> Tuple[Tuple, Tuple]:
+    """(exact keys, near keys) for every combination of the multi-valued fields"""
+    partner = _word(str(partner or ''))
+    geos = {canonical_country(code) for code in split_geos(geo)}
+    languages = {_language(lang) for lang in _values(language)}
+    sources = {_source(source) for source in _values(source)}
+    funnels = {_word(funnel) for funnel in _values(funnels)}
+    if not (partner and geos and sources and funnels):
+        return (), ()
+    near = tuple((partner, geo, src, funnel) for geo, src, funnel in itertools.product(geos, sources, funnels))
+    exact = tuple((partner, geo, lang, src, funnel)
+                  for geo, lang, src, funnel in itertools.product(geos, languages, sources, funnels))
+    return exact, near
+
+
+class OfferIndex:
+    """In-memory lookup of active offers by (partner, geo, language, source, funnel)"""
+
+    def __init__(self, offers: Iterable[Dict[str, Any]] = (), version: Optional[int] = None):
+        self.exact: Dict[Tuple, List[Dict]] = defaultdict(list)
+        self.near: Dict[Tuple, List[Dict]] = defaultdict(list)
+        self.size = 0
+        # NotionMirror.version the offers come from; cached renderings of matches key on it
+        self.version = version
+        for offer in offers:
+            self.add(offer)
+
+    def add(self, offer: Dict[str, Any]) -> None:
+        exact, near = _keys(offer.get('partner'), offer.get('geo'), offer.get('language'),
+                            offer.get('sources'), offer.get('funnels'))
+        for key in exact:
+            self.exact[key].append(offer)
+        for key in near:
+            self.near[key].append(offer)
+        self.size += 1
+
+    def match(self, deal: Deal) -> List[Match]:
+        """Existing offers this deal duplicates, exact matches first"""
+        exact, near = _keys(deal.partner, deal.geo, deal.language, deal.source, deal.funnels)
+        found: Dict[str, Match] = {}
+        for key in exact:
+            for offer in self.exact.get(key, ()):
+                found.setdefault(offer['page_id'], Match(EXACT, offer))
+        for key in near:
+            for offer in self.near.get(key, ()):
+                found.setdefault(offer['page_id'], Match(NEAR, offer))
+        return sorted(found.values(), key=lambda m: m.kind != EXACT)
+
+
+_index: Optional[OfferIndex] = None
+_index_lock = threading.Lock()
+
+
+def _current_index() -> Optional[OfferIndex]:
+    """The built index if it still matches the mirror's content, else None (no database access)"""
+    if get_settings().missing('offers_database_id', 'advertisers_database_id'):
+        return OfferIndex()
+    from bot.mirror import get_mirror
+    index = _index
+    if index is not None and index.version == get_mirror().version:
+        return index
+    return None
+
+
+def get_offer_index() -> OfferIndex:
+    """Index of the mirror's active offers, rebuilt whenever a sync changed them.
+
+    Empty when Notion is not configured or the mirror has not synced yet.
+    A rebuild reads every active offer, so code on the event loop should
+    use load_offer_index() instead.
+    """
+    global _index
+    index = _current_index()
+    if index is not None:
+        return index
+    from bot.mirror import get_mirror
+    mirror = get_mirror()
+    with _index_lock:
+        version = mirror.version
+        if _index is None or _index.version != version:
+            _index = OfferIndex(mirror.active_offers(), version=version)
+            logger.info("Built duplicate index over %d active offers", _index.size)
+        return _index
+
+
+async def load_offer_index() -> OfferIndex:
+    """get_offer_index() for the event loop: a stale index is rebuilt in a worker thread"""
+    index = _current_index()
+    if index is not None:
+        return index
+    return await asyncio.to_thread(get_offer_index)
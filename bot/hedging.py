@@ -0,0 +1,134 @@
+"""Hedged requests for slow Mistral calls.
+
+A Hedger keeps a sliding window of recent latencies per (model, prompt).
+When a call has not finished by the configured percentile of that window,
+it fires one duplicate and returns whichever finishes first with a valid
+result; the other call is cancelled. Hedges are capped at ``max_rate`` of
+all calls, so a slow API cannot double the load on it.
+
+Enabled by MISTRAL_HEDGE_PERCENTILE (e.g. 95; 0 disables) with
+MISTRAL_HEDGE_MAX_RATE (default 0.05).
+
+Usage:
+    hedger = get_hedger()
+    response = await hedger.run(model, "deal", lambda: client.chat.complete_async(...))
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from bot.metrics import MISTRAL_HEDGES
+from bot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyWindow:
+    """Most recent `size` latencies, in seconds"""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        ordered = sorted(self.samples)
+        rank = max(1, math.ceil(pct / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+
+class Hedger:
+    def __init__(self, percentile: float = 95.0, max_rate: float = 0.05, min_samples: int = 20,
+                 min_delay: float = 0.25, max_delay: float = 30.0, window: int = 200):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.window = window
+        self.calls = 0
+        self.hedges = 0
+        self._windows: Dict[Tuple[str, str], LatencyWindow] = {}
+
+    def hedge_delay(self, key: Tuple[str, str]) -> Optional[float]:
+        """Seconds to wait before hedging, or None until enough latencies have been seen"""
+        window = self._windows.get(key)
+        if window is None or len(window.samples) < self.min_samples:
+            return None
+        return min(self.max_delay, max(self.min_delay, window.percentile(self.percentile)))
+
+    def _can_hedge(self) -> bool:
+        return self.hedges < self.max_rate * self.calls
+
+    def _observe(self, key: Tuple[str, str], seconds: float) -> None:
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = LatencyWindow(self.window)
+        window.add(seconds)
+
+    def _usable(self, task: asyncio.Future, validate) -> bool:
+        if task.exception() is not None:
+            return False
+        return validate is None or validate(task.result())
+
+    async def run(self, model: str, prompt: str, call: Callable[[], Awaitable],
+                  validate: Optional[Callable[[object], bool]] = None):
+        """Await call(), hedging it with a second call(); returns the first usable result"""
+        key = (model, prompt)
+        self.calls += 1
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(call())
+        delay = self.hedge_delay(key)
+        if delay is not None:
+            await asyncio.wait({primary}, timeout=delay)
+        if delay is None or primary.done() or not self._can_hedge():
+            result = await primary
+            self._observe(key, time.perf_counter() - start)
+            return result
+
+        self.hedges += 1
+        MISTRAL_HEDGES.inc(model=model, prompt=prompt, outcome="fired")
+        logger.info("Hedging %s %s call after %.2fs", model, prompt, delay)
+        hedge = asyncio.ensure_future(call())
+        pending = {primary, hedge}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                usable = [task for task in done if self._usable(task, validate)]
+                if not usable and pending:
+                    # The other request may still come back usable
+                    continue
+                winner = usable[0] if usable else next(iter(done))
+                MISTRAL_HEDGES.inc(model=model, prompt=prompt,
+                                   outcome="hedge_won" if winner is hedge else "primary_won")
+                # The primary took at least this long; recording it keeps the threshold adaptive
+                self._observe(key, time.perf_counter() - start)
+                return winner.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+
+_hedger: Optional[Hedger] = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Optional[Hedger]:
+    """Process-wide Hedger, or None when MISTRAL_HEDGE_PERCENTILE is 0"""
+    global _hedger
+    settings = get_settings()
+    if not settings.mistral_hedge_percentile:
+        return None
+    if _hedger is None:
+        with _hedger_lock:
+            if _hedger is None:
+                _hedger = Hedger(percentile=settings.mistral_hedge_percentile,
+                                 max_rate=settings.mistral_hedge_max_rate)
+    return _hedger
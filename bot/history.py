@@ -0,0 +1,256 @@
+"""Append-only local history of parsed and submitted deals.
+
+Every deal is appended to SQLite twice: once when it is parsed, and once
+when it is submitted (queued for Notion).
+The review session is deleted after submit or discard, but its history
+stays, so partner pricing trends can be analysed without scraping Notion.
+Raw text is stored zlib-compressed whenever that makes it smaller.
+
+Lookups by partner and by GEO never scan the whole table:
+
+- deal_history: indexed on (partner_key, event, recorded_at) and
+  covering the price columns
+- deal_history_geos: a WITHOUT ROWID copy of the GEO and price columns,
+  one row per country of multi-GEO deals and keyed on (geo, event,
+  recorded_at)
+
+Usage:
+    history = get_history()
+    history.record(deals, SUBMITTED, user_id=user_id, flow='unstructured')
+    history.stats(partner="FTD Company")
+    history.stats(geo="DE")
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from bot.models import Deal
+from bot.regions import canonical_country, split_geos
+from bot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+PARSED = 'parsed'
+SUBMITTED = 'submitted'
+
+PRICES = ('cpa', 'crg', 'cpl')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deal_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recorded_at REAL NOT NULL,
+    event TEXT NOT NULL,
+    flow TEXT,
+    user_id INTEGER,
+    partner TEXT,
+    partner_key TEXT,
+    region TEXT,
+    geo TEXT,
+    language TEXT,
+    source TEXT,
+    pricing_model TEXT,
+    cpa REAL,
+    crg REAL,
+    cpl REAL,
+    cr REAL,
+    deduction REAL,
+    funnels TEXT,
+    raw_text BLOB
+);
+CREATE INDEX IF NOT EXISTS deal_history_partner
+    ON deal_history (partner_key, event, recorded_at, cpa, crg, cpl, geo);
+CREATE INDEX IF NOT EXISTS deal_history_recorded ON deal_history (recorded_at);
+CREATE TABLE IF NOT EXISTS deal_history_geos (
+    geo TEXT NOT NULL,
+    event TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    deal_id INTEGER NOT NULL,
+    partner TEXT,
+    cpa REAL,
+    crg REAL,
+    cpl REAL,
+    PRIMARY KEY (geo, event, recorded_at, deal_id)
+) WITHOUT ROWID;
+"""
+
+_PUNCTUATION = re.compile(r'[^0-9a-z]+')
+
+
+def partner_key(name: Optional[str]) -> str:
+    """'FTD Company' / 'ftd-company' -> 'ftdcompany'"""
+    return _PUNCTUATION.sub('', (name or '').casefold())
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def compress(text: Optional[str]) -> Union[bytes, str, None]:
+    """zlib BLOB, or the text itself when it is too short for zlib to save anything"""
+    if not text:
+        return None
+    raw = text.encode('utf-8')
+    blob = zlib.compress(raw, 6)
+    return blob if len(blob) < len(raw) else text
+
+
+def decompress(value: Union[bytes, str, None]) -> str:
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value or ''
+
+
+class DealHistory:
+    """SQLite log of deals with per-partner and per-GEO price statistics"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def record(self, deals: Iterable[Deal], event: str, user_id: Optional[int] = None,
+               flow: Optional[str] = None, recorded_at: Optional[float] = None) -> int:
+        """Append deals; history is best effort, so failures are logged, not raised"""
+        now = time.time() if recorded_at is None else recorded_at
+        deals = [deal for deal in deals if deal is not None and not deal.error]
+        if not deals:
+            return 0
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for deal in deals:
+                        self._insert(deal, event, user_id, flow, now)
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            logger.warning("Could not record %d %s deals in history: %s", len(deals), event, e)
+            return 0
+        logger.debug("Recorded %d %s deals in history", len(deals), event)
+        return len(deals)
+
+    def _insert(self, deal: Deal, event: str, user_id: Optional[int], flow: Optional[str], now: float) -> None:
+        prices = [_number(getattr(deal, name)) for name in PRICES]
+        cursor = self._conn.execute(
+            "INSERT INTO deal_history (recorded_at, event, flow, user_id, partner, partner_key, region, geo, "
+            "language, source, pricing_model, cpa, crg, cpl, cr, deduction, funnels, raw_text) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (now, event, flow, user_id, deal.partner, partner_key(deal.partner), deal.region, deal.geo,
+             deal.language, deal.source, deal.pricing_model, *prices, _number(deal.cr),
+             _number(deal.deduction_limit), ', '.join(deal.funnels), compress(deal.raw_text)),
+        )
+        geos = {canonical_country(code) for code in split_geos(deal.geo)}
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO deal_history_geos (geo, event, recorded_at, deal_id, partner, cpa, crg, cpl) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(geo, event, now, cursor.lastrowid, deal.partner, *prices) for geo in geos],
+        )
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def _scope(self, partner: Optional[str], geo: Optional[str]):
+        """(table, WHERE clause, params, column to break down by) for one partner or one GEO"""
+        if geo:
+            return "deal_history_geos", "geo = ?", [canonical_country(geo)], "partner"
+        return "deal_history", "partner_key = ?", [partner_key(partner)], "geo"
+
+    def stats(self, partner: Optional[str] = None, geo: Optional[str] = None,
+              since: Optional[float] = None, months: int = 12, recent: int = 5) -> Dict[str, Any]:
+        """Counts, price ranges, monthly averages and a breakdown for one partner or GEO.
+
+        Prices come from submitted deals, or from parsed deals when none of
+        the matching deals were submitted yet (``basis`` says which).
+        """
+        if not (partner or geo):
+            raise ValueError("stats() needs a partner or a geo")
+        table, where, params, breakdown = self._scope(partner, geo)
+        if since is not None:
+            where += " AND recorded_at >= ?"
+            params = params + [since]
+        with self._lock:
+            counts = {row['event']: row for row in self._conn.execute(
+                f"SELECT event, COUNT(*) AS n, MIN(recorded_at) AS first, MAX(recorded_at) AS last "
+                f"FROM {table} WHERE {where} AND event IN (?, ?) GROUP BY event",
+                params + [PARSED, SUBMITTED])}
+            basis = SUBMITTED if SUBMITTED in counts else PARSED
+            scoped = f"FROM {table} WHERE {where} AND event = ?"
+            scoped_params = params + [basis]
+            prices = self._conn.execute(
+                "SELECT " + ", ".join(f"MIN({p}) AS {p}_min, AVG({p}) AS {p}_avg, MAX({p}) AS {p}_max, "
+                                      f"COUNT({p}) AS {p}_n" for p in PRICES) + f" {scoped}",
+                scoped_params).fetchone()
+            monthly = self._conn.execute(
+                "SELECT strftime('%Y-%m', recorded_at, 'unixepoch') AS month, COUNT(*) AS n, "
+                f"AVG(cpa) AS cpa, AVG(crg) AS crg, AVG(cpl) AS cpl {scoped} "
+                "GROUP BY month ORDER BY month DESC LIMIT ?", scoped_params + [months]).fetchall()
+            top = self._conn.execute(
+                f"SELECT {breakdown} AS label, COUNT(*) AS n, AVG(cpa) AS cpa, AVG(crg) AS crg, AVG(cpl) AS cpl, "
+                f"MAX(recorded_at) AS last {scoped} GROUP BY {breakdown} ORDER BY n DESC LIMIT 5",
+                scoped_params).fetchall()
+            latest = self._conn.execute(
+                f"SELECT recorded_at, partner, geo, cpa, crg, cpl {scoped} ORDER BY recorded_at DESC LIMIT ?",
+                scoped_params + [recent]).fetchall()
+        return {
+            "partner": partner,
+            "geo": canonical_country(geo) if geo else None,
+            "parsed": counts[PARSED]['n'] if PARSED in counts else 0,
+            "submitted": counts[SUBMITTED]['n'] if SUBMITTED in counts else 0,
+            "first": min((row['first'] for row in counts.values()), default=None),
+            "last": max((row['last'] for row in counts.values()), default=None),
+            "basis": basis,
+            "prices": {p: {"min": prices[f"{p}_min"], "avg": prices[f"{p}_avg"], "max": prices[f"{p}_max"],
+                           "n": prices[f"{p}_n"]} for p in PRICES if prices[f"{p}_n"]},
+            "monthly": [dict(row) for row in reversed(monthly)],
+            "breakdown": breakdown,
+            "top": [dict(row) for row in top],
+            "recent": [dict(row) for row in latest],
+        }
+
+    def raw_texts(self, partner: str, limit: int = 10) -> List[str]:
+        """Original messages of a partner's latest deals"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT raw_text FROM deal_history WHERE partner_key = ? ORDER BY recorded_at DESC LIMIT ?",
+                (partner_key(partner), limit)).fetchall()
+        return [decompress(row['raw_text']) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM deal_history").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_history: Optional[DealHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_history() -> DealHistory:
+    """Process-wide deal history at HISTORY_PATH (default history.db)"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = DealHistory(get_settings().history_path)
+    return _history
@@ -0,0 +1,340 @@
+"""Offline stand-in for the Mistral client used by DealParser.
+
+ReplayMistral implements the small slice of the mistralai SDK that
+DealParser touches (``client.chat.complete_async(...)`` returning
+``response.choices[0].message.content`` and ``response.usage``) so the
+parsing pipeline can be exercised without the live API.
+
+Responses are served from a JSONL recording keyed on the exact prompt
+messages. Prompts that were never recorded are answered by a small
+heuristic synthesizer that understands the structure and parsing prompts
+from bot.prompts, which is enough to drive benchmarks end to end.
+Latency and error rate are tunable so throughput and retry behaviour can
+be measured reproducibly.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from bot.prompts import STRUCTURE_ANALYSIS_PROMPT, DEAL_PARSING_PROMPT
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_key(messages: List[Dict]) -> str:
+    """Stable key for a list of chat messages"""
+    canonical = json.dumps(messages, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class LatencyModel:
+    """Latency distribution for simulated API calls, in seconds.
+
+    kind is one of 'fixed', 'uniform', 'normal' or 'lognormal'.
+    For 'uniform' the range is [mean - spread, mean + spread]; for 'normal'
+    and 'lognormal' spread is the standard deviation (of the underlying
+    normal for 'lognormal', with mean taken as the median).
+    """
+    kind: str = 'fixed'
+    mean: float = 0.0
+    spread: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> 'LatencyModel':
+        """Build from 'kind:mean,spread', e.g. 'lognormal:0.8,0.4'"""
+        kind, _, params = spec.partition(':')
+        values = [float(v) for v in params.split(',') if v.strip()] if params else []
+        return cls(kind=kind.strip() or 'fixed',
+                   mean=values[0] if values else 0.0,
+                   spread=values[1] if len(values) > 1 else 0.0)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'fixed':
+            value = self.mean
+        elif self.kind == 'uniform':
+            value = rng.uniform(self.mean - self.spread, self.mean + self.spread)
+        elif self.kind == 'normal':
+            value = rng.gauss(self.mean, self.spread)
+        elif self.kind == 'lognormal':
+            if self.mean <= 0:
+                return 0.0
+            value = rng.lognormvariate(0.0, self.spread) * self.mean
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.kind}")
+        return max(0.0, value)
+
+
+class StubAPIError(Exception):
+    """Error raised by the stub to simulate API failures"""
+
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        super().__init__(f"API error occurred: Status {status_code}")
+
+
+class _Usage:
+    __slots__ = ('prompt_tokens', 'completion_tokens', 'total_tokens')
+
+    def __init__(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+
+
+class _Message:
+    __slots__ = ('role', 'content')
+
+    def __init__(self, content: str):
+        self.role = 'assistant'
+        self.content = content
+
+
+class _Choice:
+    __slots__ = ('index', 'message', 'finish_reason')
+
+    def __init__(self, content: str):
+        self.index = 0
+        self.message = _Message(content)
+        self.finish_reason = 'stop'
+
+
+class StubResponse:
+    """Minimal ChatCompletionResponse look-alike"""
+    __slots__ = ('model', 'choices', 'usage')
+
+    def __init__(self, model: str, content: str, usage: _Usage):
+        self.model = model
+        self.choices = [_Choice(content)]
+        self.usage = usage
+
+
+class _Chat:
+    def __init__(self, owner: 'ReplayMistral'):
+        self._owner = owner
+
+    async def complete_async(self, model: str, messages: List[Dict], **kwargs) -> StubResponse:
+        delay, content, error = self._owner._next(model, messages)
+        if delay:
+            await asyncio.sleep(delay)
+        if error:
+            raise error
+        return self._owner._build_response(model, messages, content)
+
+    def complete(self, model: str, messages: List[Dict], **kwargs) -> StubResponse:
+        delay, content, error = self._owner._next(model, messages)
+        if delay:
+            time.sleep(delay)
+        if error:
+            raise error
+        return self._owner._build_response(model, messages, content)
+
+
+class ReplayMistral:
+    """Replay/stub backend with the same call surface as ``Mistral``"""
+
+    def __init__(self, recordings: Optional[str] = None, latency: Optional[LatencyModel] = None,
+                 error_rate: float = 0.0, error_status: int = 429, seed: Optional[int] = None,
+                 synthesize: bool = True, invalid_rate: Optional[Dict[str, float]] = None):
+        self.responses: Dict[str, str] = {}
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.synthesize = synthesize
+        # model -> fraction of replies replaced by an empty object, to exercise the model cascade
+        self.invalid_rate = invalid_rate or {}
+        self.calls_by_model: Dict[str, int] = {}
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.misses = 0
+        self.chat = _Chat(self)
+        if recordings:
+            self.load(recordings)
+
+    def load(self, path: str) -> int:
+        """Load recorded responses from a JSONL file, returns count loaded"""
+        loaded = 0
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                key = record.get('key') or prompt_key(record['messages'])
+                self.responses[key] = record['content']
+                loaded += 1
+        logger.info("Loaded %d recorded Mistral responses from %s", loaded, path)
+        return loaded
+
+    def _next(self, model: str, messages: List[Dict]):
+        self.calls += 1
+        self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+        delay = self.latency.sample(self.rng)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            return delay, None, StubAPIError(self.error_status)
+
+        content = self.responses.get(prompt_key(messages))
+        if content is None:
+            self.misses += 1
+            if not self.synthesize:
+                raise KeyError(f"No recorded response for prompt {prompt_key(messages)[:12]}")
+            content = synthesize_response(messages)
+        if self.invalid_rate.get(model) and self.rng.random() < self.invalid_rate[model]:
+            content = '{}'
+        return delay, content, None
+
+    def _build_response(self, model: str, messages: List[Dict], content: str) -> StubResponse:
+        prompt_tokens = sum(estimate_tokens(m.get('content', '')) for m in messages)
+        return StubResponse(model, content, _Usage(prompt_tokens, estimate_tokens(content)))
+
+
+class RecordingMistral:
+    """Wraps a real Mistral client and appends every response to a JSONL file"""
+
+    def __init__(self, client, path: str):
+        self._client = client
+        self._path = Path(path)
+        self.chat = self
+
+    async def complete_async(self, model: str, messages: List[Dict], **kwargs):
+        response = await self._client.chat.complete_async(model=model, messages=messages, **kwargs)
+        self._append(model, messages, response)
+        return response
+
+    def complete(self, model: str, messages: List[Dict], **kwargs):
+        response = self._client.chat.complete(model=model, messages=messages, **kwargs)
+        self._append(model, messages, response)
+        return response
+
+    def _append(self, model: str, messages: List[Dict], response) -> None:
+        record = {
+            'key': prompt_key(messages),
+            'model': model,
+            'messages': messages,
+            'content': response.choices[0].message.content,
+        }
+        with self._path.open('a', encoding='utf-8') as file:
+            file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+# ---------------------------------------------------------------------------
+# Heuristic synthesizer for prompts without a recording
+# ---------------------------------------------------------------------------
+
+_SHARED_KEYS = {
+    'partner': 'partner', 'company': 'partner', 'language': 'language',
+    'source': 'source', 'model': 'model',
+}
+_PRICE_PATTERN = re.compile(r'\$?(\d+(?:\.\d+)?)\s*\$?\s*\+\s*(\d+(?:\.\d+)?)\s*%')
+_CPL_PATTERN = re.compile(r'cpl\s*:?\s*\$?(\d+(?:\.\d+)?)', re.IGNORECASE)
+_FLAT_PATTERN = re.compile(r'(?:price|cpa)\s*:?\s*\$?(\d+(?:\.\d+)?)', re.IGNORECASE)
+_GEO_PATTERN = re.compile(r'\b([A-Z]{2})\b')
+_CR_PATTERN = re.compile(r'(?:doing|cr\s*:?)\s*(\d+(?:\.\d+)?)\s*%', re.IGNORECASE)
+_DEDUCTION_PATTERN = re.compile(r'until\s+(\d+(?:\.\d+)?)\s*%\s+wrong number', re.IGNORECASE)
+
+
+def _user_content(messages: List[Dict]) -> str:
+    return '\n'.join(m.get('content', '') for m in messages if m.get('role') == 'user')
+
+
+def _system_content(messages: List[Dict]) -> str:
+    return next((m.get('content', '') for m in messages if m.get('role') == 'system'), '')
+
+
+def _extract_pricing(text: str) -> Dict:
+    pricing = {'cpa': None, 'crg': None, 'cpl': None}
+    match = _PRICE_PATTERN.search(text)
+    if match:
+        pricing['cpa'] = float(match.group(1))
+        pricing['crg'] = float(match.group(2))
+        return pricing
+    match = _CPL_PATTERN.search(text)
+    if match:
+        pricing['cpl'] = float(match.group(1))
+        return pricing
+    match = _FLAT_PATTERN.search(text)
+    if match:
+        pricing['cpa'] = float(match.group(1))
+    return pricing
+
+
+def _extract_funnels(text: str) -> List[str]:
+    match = re.search(r'(?:funnels?|landing page|mostly)\s*:?\s*([^\n.-]+)', text, re.IGNORECASE)
+    if not match:
+        return []
+    return [f.strip() for f in re.split(r'[,|/]', match.group(1)) if f.strip()]
+
+
+def _synthesize_structure(text: str) -> Dict:
+    shared: Dict = {}
+    blocks: List[Dict] = []
+    for line in (l.strip() for l in text.split('\n')):
+        if not line:
+            continue
+        key, sep, value = line.partition(':')
+        field = _SHARED_KEYS.get(key.strip().lower()) if sep else None
+        if field and not _PRICE_PATTERN.search(line):
+            shared[field] = value.strip()
+            continue
+        geo = _GEO_PATTERN.search(line)
+        blocks.append({
+            'text': line,
+            'geo': geo.group(1) if geo else '',
+            'pricing': {k: v for k, v in _extract_pricing(line).items() if k in ('cpa', 'crg')},
+            'funnels': _extract_funnels(line),
+        })
+    shared.setdefault('deduction_limit', None)
+    return {'sections': [{'shared_fields': shared, 'deal_blocks': blocks}]}
+
+
+def _synthesize_deal(deal_text: str, shared: Dict) -> Dict:
+    deal_text = deal_text.strip()
+    pricing = _extract_pricing(deal_text)
+    geo = _GEO_PATTERN.search(deal_text)
+    cr = _CR_PATTERN.search(deal_text)
+    deduction = _DEDUCTION_PATTERN.search(deal_text)
+    deduction_limit = shared.get('deduction_limit')
+    if deduction:
+        deduction_limit = float(deduction.group(1)) / 100
+    return {
+        'partner': shared.get('partner', ''),
+        'geo': geo.group(1) if geo else '',
+        'language': shared.get('language', ''),
+        'source': shared.get('source', ''),
+        'pricing_model': 'CPA/CRG' if pricing['crg'] else 'CPL' if pricing['cpl'] else 'CPA',
+        'cpa': pricing['cpa'],
+        'crg': pricing['crg'],
+        'cpl': pricing['cpl'],
+        'funnels': _extract_funnels(deal_text),
+        'cr': float(cr.group(1)) if cr else None,
+        'deduction_limit': deduction_limit,
+    }
+
+
+def synthesize_response(messages: List[Dict]) -> str:
+    """Produce a plausible JSON response for a DealPrompts message list"""
+    system = _system_content(messages)
+    user = _user_content(messages)
+    if system == STRUCTURE_ANALYSIS_PROMPT:
+        text = user.split('\n', 1)[1] if user.startswith('Analyze this text:') else user
+        return json.dumps(_synthesize_structure(text))
+    if system.startswith(DEAL_PARSING_PROMPT):
+        try:
+            shared = json.loads(system[len(DEAL_PARSING_PROMPT):] or '{}')
+        except json.JSONDecodeError:
+            shared = {}
+        return json.dumps(_synthesize_deal(user, shared))
+    return json.dumps({})
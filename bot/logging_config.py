@@ -0,0 +1,161 @@
+"""Logging setup shared by the bot entry points.
+
+setup_logging() installs a single non-blocking QueueHandler on the root
+logger; a QueueListener thread does the formatting and I/O, so request
+handlers never wait on stderr. The message and any traceback are rendered
+in the calling thread, so mutable arguments (deals, dicts) are logged as
+they were at the call; layout (optionally JSON) and I/O happen in the
+listener thread. Records carry the current trace id.
+
+Configuration comes from bot.settings (i.e. the environment / .env):
+    LOG_LEVEL           root level (default INFO in production, else DEBUG)
+    LOG_FORMAT          'text' (default) or 'json'
+    LOG_LEVELS          per-module levels, e.g. 'bot.client=DEBUG,httpx=WARNING'
+    LOG_PAYLOAD_SAMPLE  keep 1 in N verbose payload records (default 100)
+
+Verbose payload logs (full updates, Notion properties, LLM responses)
+should go through log_payload() so they are skipped entirely unless
+DEBUG is enabled and then sampled.
+"""
+import atexit
+import copy
+import itertools
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from bot import tracing
+from bot.settings import get_settings
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Third-party loggers that are far too chatty at DEBUG
+DEFAULT_MODULE_LEVELS = {
+    'httpx': logging.WARNING,
+    'httpcore': logging.WARNING,
+    'telegram.ext': logging.INFO,
+}
+
+_listener: Optional[QueueListener] = None
+_EXC_FORMATTER = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id:
+            entry['trace_id'] = trace_id
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that renders the message here but leaves layout to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Like QueueHandler.prepare, minus the full format(): args may be
+        # mutated by the caller after this returns, so interpolate them now
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _TraceContextFilter(logging.Filter):
+    """Stamp records with the trace id while still in the caller's context"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = tracing.current_trace_id()
+        return True
+
+
+class PayloadSampler(logging.Filter):
+    """Keep only 1 in N records flagged with extra={'payload': True}"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'payload', False) or record.levelno >= logging.WARNING:
+            return True
+        return next(self._counter) % self.every == 0
+
+
+def parse_module_levels(spec: Optional[str]) -> Dict[str, int]:
+    """Parse 'name=LEVEL,name=LEVEL' into a dict of logger levels"""
+    levels: Dict[str, int] = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip():
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None,
+                  module_levels: Optional[str] = None, payload_sample: Optional[int] = None) -> None:
+    """Configure root logging once; later calls only adjust levels"""
+    global _listener
+    settings = get_settings()
+    if level is None:
+        level = settings.log_level or ('INFO' if settings.is_production else 'DEBUG')
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+
+    levels = dict(DEFAULT_MODULE_LEVELS)
+    levels.update(parse_module_levels(module_levels if module_levels is not None else settings.log_levels))
+    for name, module_level in levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    if _listener is not None:
+        return
+
+    fmt = (fmt or settings.log_format or 'text').lower()
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    handler = _DeferredQueueHandler(queue.SimpleQueue())
+    handler.addFilter(_TraceContextFilter())
+    if payload_sample is None:
+        payload_sample = settings.log_payload_sample
+    handler.addFilter(PayloadSampler(payload_sample))
+
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+
+    _listener = QueueListener(handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush and stop the background listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_payload(logger: logging.Logger, msg: str, *args) -> None:
+    """Log a verbose payload at DEBUG, sampled, and only if DEBUG is enabled"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, *args, extra={'payload': True})
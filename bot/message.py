@@ -1,17 +1,29 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from telegram.ext import ContextTypes, CallbackContext
 from bot.client import DealParser, FieldValidator
+from bot.models import Deal
 import logging
 import time
 from typing import Any
-from .structured_deal_parser import StructuredDealParser
 import os
 import re
 import asyncio
 import traceback
+from bot import tracing
+from bot.outbox import get_outbox
+from bot.callbacks import Callback, CallbackRouter, decode, encode, new_session
+from bot.duplicates import EXACT, OfferIndex, load_offer_index
+from bot.history import PARSED, SUBMITTED, get_history
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+
+# Callbacks that act on the whole session rather than one deal index
+SESSION_ACTIONS = frozenset({'submit', 'discard', 'reprocess', 'page', 'approve_page', 'approve_valid', 'summary'})
+
+# Bulk review: deals per table page, and the batch size that offers the table view
+PAGE_SIZE = 10
+BULK_REVIEW_MIN = 5
+STATUS_ICONS = {'approved': "✅", 'rejected': "❌", None: "⬜"}
 
 class MessageHandler:
     def __init__(self):
@@ -21,6 +33,7 @@ class MessageHandler:
         self.user_states = {}  # Track user states
         self.session_timeout = 3600  # 1 hour
         self.editing_state = {}  # Track who's editing what
+        self.callbacks = self._register_callbacks()
 
     def _cleanup_old_sessions(self):
         """Remove expired sessions"""
@@ -33,7 +46,42 @@ class MessageHandler:
             del self.user_states[user_id]
             del self.current_deals[user_id]
 
-    async def _format_deal_message(self, deal, index: int, total: int, user_id: int) -> str:
+    def export_sessions(self) -> dict:
+        """Open review sessions as JSON-ready dicts, for saving across a restart"""
+        return {
+            user_id: {
+                'deals': [dict(deal.to_dict(), metadata={'error': deal.error, 'derived': sorted(deal.derived)})
+                          for deal in data['deals']],
+                'statuses': self.deal_statuses.get(user_id, {}),
+                'session': data['session'],
+                'current_index': data['current_index'],
+                'last_activity': data['last_activity'],
+            }
+            for user_id, data in self.current_deals.items()
+        }
+
+    def restore_sessions(self, sessions: dict) -> int:
+        """Load sessions saved by export_sessions, skipping expired ones and users with a newer session"""
+        now = time.time()
+        restored = 0
+        for user_id, data in sessions.items():
+            user_id = int(user_id)
+            if user_id in self.current_deals or now - data['last_activity'] > self.session_timeout:
+                continue
+            self.current_deals[user_id] = {
+                'deals': [Deal.from_llm(deal) for deal in data['deals']],
+                'session': data['session'],
+                'current_index': data['current_index'],
+                'last_activity': data['last_activity'],
+            }
+            self.deal_statuses[user_id] = {int(idx): status for idx, status in data['statuses'].items()}
+            restored += 1
+        if restored:
+            logger.info("Restored %d review sessions", restored)
+        return restored
+
+    async def _format_deal_message(self, deal: Deal, index: int, total: int, user_id: int,
+                                   offer_index: OfferIndex) -> str:
         """Format deal with status emoji and raw text"""
         # Get deal status
         status = self.deal_statuses.get(user_id, {}).get(index-1)
@@ -45,33 +93,16 @@ class MessageHandler:
         elif status == 'rejected':
             status_emoji = "❌"
             
-        # Get parsed data from correct location
-        parsed_data = deal.get('parsed_data', deal)
-        
-        # Set default language ONLY if it's None, empty string, or not present
-        if not parsed_data.get('language'):
-            geo = parsed_data.get('geo', '').lower()
-            if any(eng_geo in geo for eng_geo in ['uk', 'us', 'gb', 'au', 'ca']):
-                parsed_data['language'] = 'English'
-            else:
-                parsed_data['language'] = 'Native'
-        
-        # Ensure funnels is always a list
-        funnels = parsed_data.get('funnels', [])
-        if isinstance(funnels, str):
-            funnels = [funnels]
-        elif not isinstance(funnels, list):
-            funnels = []
-            
-        raw_text = deal.get('raw_text', '')
+        funnels = deal.funnels
+        raw_text = deal.raw_text
         
         # Format CRG, CR, and Deduction Limit separately for clarity
-        crg_formatted = (f"{round(parsed_data.get('crg', 0)*100, 2):.0f}%" 
-                        if parsed_data.get('crg') else 'N/A')
-        cr_formatted = (f"{round(parsed_data.get('cr', 0)*100, 2):.0f}%" 
-                       if parsed_data.get('cr') else 'N/A')
-        deduction_formatted = (f"{round(parsed_data.get('deduction_limit', 0)*100, 2):.0f}%" 
-                             if parsed_data.get('deduction_limit') else 'N/A')
+        crg_formatted = f"{round(deal.crg*100, 2):.0f}%" if deal.crg else 'N/A'
+        cr_formatted = f"{round(deal.cr*100, 2):.0f}%" if deal.cr else 'N/A'
+        deduction_formatted = (f"{round(deal.deduction_limit*100, 2):.0f}%" 
+                             if deal.deduction_limit else 'N/A')
+        
+        error_note = f"🚫 Could not parse: {deal.error}\n\n" if deal.error else ""
         
         # Helper function to check for empty values
         def check_field(value, field_name):
@@ -81,19 +112,21 @@ class MessageHandler:
         
         return (
             f"{status_emoji} Deal {index} of {total}\n\n"
+            f"{self._duplicate_note(deal, offer_index)}"
+            f"{error_note}"
             f"📝 Original Text:\n{raw_text}\n\n"
             f"📊 Deal Details:\n"
             f"━━━━━━━━━━━━━━━\n"
-            f"🤝 Partner: {check_field(parsed_data.get('partner'), 'partner')}\n"
-            f"🌍 Region: {parsed_data.get('region', 'N/A')}\n"
-            f"🗺 GEO: {check_field(parsed_data.get('geo'), 'geo')}\n"
-            f"🗣 Language: {check_field(parsed_data.get('language'), 'language')}\n"
+            f"🤝 Partner: {check_field(deal.partner, 'partner')}\n"
+            f"🌍 Region: {deal.region or 'N/A'}\n"
+            f"🗺 GEO: {check_field(deal.geo, 'geo')}\n"
+            f"🗣 Language: {check_field(deal.language, 'language')}\n"
             f"━━━━━━━━━━━━━━━\n"
-            f"📱 Source: {check_field(parsed_data.get('source'), 'source')}\n"
-            f"💰 Pricing Model: {parsed_data.get('pricing_model', 'N/A')}\n"
-            f"💵 CPA: {parsed_data.get('cpa', 'N/A')}\n"
+            f"📱 Source: {check_field(deal.source, 'source')}\n"
+            f"💰 Pricing Model: {deal.pricing_model or 'N/A'}\n"
+            f"💵 CPA: {deal.cpa if deal.cpa is not None else 'N/A'}\n"
             f"📈 CRG: {crg_formatted}\n"
-            f"🎯 CPL: {parsed_data.get('cpl', 'N/A')}\n"
+            f"🎯 CPL: {deal.cpl if deal.cpl is not None else 'N/A'}\n"
             f"━━━━━━━━━━━━━━━\n"
             f"🔄 Funnels: {', '.join(funnels) if funnels else 'N/A - check🚨'}\n"
             f"📊 CR: {cr_formatted}\n"
@@ -101,16 +134,32 @@ class MessageHandler:
             f"━━━━━━━━━━━━━━━"
         )
 
-    async def _create_keyboard(self, current_index: int, total_deals: int, statuses: dict) -> InlineKeyboardMarkup:
+    @staticmethod
+    def _duplicate_note(deal: Deal, offer_index: OfferIndex) -> str:
+        """Warning lines for active Notion offers this deal would duplicate"""
+        matches = offer_index.match(deal)
+        if not matches:
+            return ""
+        lines = []
+        for match in matches[:3]:
+            offer = match.offer
+            label = "⚠️ Already in Notion" if match.kind == EXACT else "🔁 Similar offer (other language)"
+            lines.append(f"{label}: {offer['code']}")
+        if len(matches) > 3:
+            lines.append(f"…and {len(matches) - 3} more")
+        return "\n".join(lines) + "\n\n"
+
+    async def _create_keyboard(self, current_index: int, total_deals: int, statuses: dict,
+                               session: int) -> InlineKeyboardMarkup:
         keyboard = []
         
         # Navigation buttons
         if total_deals > 1:
             nav_row = []
             if current_index > 0:
-                nav_row.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"prev_{current_index}"))
+                nav_row.append(InlineKeyboardButton("⬅️ Previous", callback_data=encode('prev', session, current_index)))
             if current_index < total_deals - 1:
-                nav_row.append(InlineKeyboardButton("➡️ Next", callback_data=f"next_{current_index}"))
+                nav_row.append(InlineKeyboardButton("➡️ Next", callback_data=encode('next', session, current_index)))
             if nav_row:
                 keyboard.append(nav_row)
 
@@ -121,14 +170,100 @@ class MessageHandler:
         
         keyboard.extend([
             [
-                InlineKeyboardButton(approve_text, callback_data=f"approve_{current_index}"),
-                InlineKeyboardButton(reject_text, callback_data=f"reject_{current_index}")
+                InlineKeyboardButton(approve_text, callback_data=encode('approve', session, current_index)),
+                InlineKeyboardButton(reject_text, callback_data=encode('reject', session, current_index))
             ],
-            [InlineKeyboardButton("✏️ Edit", callback_data=f"edit_{current_index}")]
+            [InlineKeyboardButton("✏️ Edit", callback_data=encode('edit', session, current_index))]
         ])
+        if total_deals >= BULK_REVIEW_MIN:
+            keyboard[-1].append(InlineKeyboardButton(
+                "📑 Table view", callback_data=encode('page', session, current_index // PAGE_SIZE)))
 
         return InlineKeyboardMarkup(keyboard)
 
+    @staticmethod
+    def _format_table_row(index: int, deal: Deal, status, offer_index: OfferIndex) -> str:
+        if deal.pricing_model == 'CPL':
+            price = f"CPL {deal.cpl}"
+        else:
+            price = f"{deal.cpa if deal.cpa is not None else '?'}" + (f"+{round(deal.crg * 100):.0f}%" if deal.crg else "")
+        funnels = ', '.join(deal.funnels[:2]) + ('…' if len(deal.funnels) > 2 else '')
+        warning = "" if deal.is_valid else " 🚨"
+        matches = offer_index.match(deal)
+        if matches:
+            warning += " ⚠️" if matches[0].kind == EXACT else " 🔁"
+        return (f"{STATUS_ICONS.get(status, '⬜')} {index + 1}. {deal.partner or '?'} · {deal.geo or '?'} · "
+                f"{price} · {funnels or '?'}{warning}")
+
+    async def _render_page(self, user_id: int, page: int):
+        """(text, keyboard) for one page of the bulk-review table"""
+        user_data = self.current_deals[user_id]
+        deals = user_data['deals']
+        session = user_data['session']
+        statuses = self.deal_statuses.get(user_id, {})
+        pages = (len(deals) + PAGE_SIZE - 1) // PAGE_SIZE
+        page = max(0, min(page, pages - 1))
+        start = page * PAGE_SIZE
+        indexes = range(start, min(start + PAGE_SIZE, len(deals)))
+
+        approved = sum(1 for status in statuses.values() if status == 'approved')
+        lines = [f"📑 Deals {start + 1}-{indexes[-1] + 1} of {len(deals)} · ✅ {approved} approved", ""]
+        offer_index = await load_offer_index()
+        lines.extend(self._format_table_row(i, deals[i], statuses.get(i), offer_index) for i in indexes)
+        lines.extend(["", "Tap a number to approve or reject it. 🚨 = missing fields, ⚠️/🔁 = already in Notion"])
+
+        toggles = [
+            InlineKeyboardButton(f"{STATUS_ICONS.get(statuses.get(i), '⬜')} {i + 1}",
+                                 callback_data=encode('toggle', session, i))
+            for i in indexes
+        ]
+        keyboard = [toggles[i:i + 5] for i in range(0, len(toggles), 5)]
+        if pages > 1:
+            nav_row = []
+            if page > 0:
+                nav_row.append(InlineKeyboardButton("⬅️", callback_data=encode('page', session, page - 1)))
+            nav_row.append(InlineKeyboardButton(f"Page {page + 1}/{pages}", callback_data=encode('page', session, page)))
+            if page < pages - 1:
+                nav_row.append(InlineKeyboardButton("➡️", callback_data=encode('page', session, page + 1)))
+            keyboard.append(nav_row)
+        keyboard.extend([
+            [
+                InlineKeyboardButton("✅ Approve page", callback_data=encode('approve_page', session, page)),
+                InlineKeyboardButton("✅ Approve all valid", callback_data=encode('approve_valid', session, page))
+            ],
+            [
+                InlineKeyboardButton("🃏 Card view", callback_data=encode('back', session, start)),
+                InlineKeyboardButton("📊 Summary", callback_data=encode('summary', session))
+            ]
+        ])
+        return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+    async def _render_deal(self, user_id: int, index: int):
+        """(text, keyboard) for one deal card, cached per session by deal version, status and mirror version"""
+        user_data = self.current_deals[user_id]
+        deal = user_data['deals'][index]
+        statuses = self.deal_statuses.get(user_id, {})
+        # The duplicate note depends on the mirror, so a sync that changed offers invalidates the card too
+        offer_index = await load_offer_index()
+        key = (index, deal.version, statuses.get(index), offer_index.version)
+        cards = user_data.setdefault('cards', {})
+        card = cards.get(key)
+        if card is None:
+            total_deals = len(user_data['deals'])
+            card = (
+                await self._format_deal_message(deal, index + 1, total_deals, user_id, offer_index),
+                await self._create_keyboard(index, total_deals, statuses, user_data['session']),
+            )
+            cards[key] = card
+        return card
+
+    def _invalidate_deal(self, user_id: int, index: int) -> None:
+        """Drop cached cards for a deal after it has been edited"""
+        cards = self.current_deals[user_id].get('cards')
+        if cards:
+            for key in [key for key in cards if key[0] == index]:
+                del cards[key]
+
     def _clean_field(self, value, field_type='text'):
         """Clean and format field values consistently"""
         return FieldValidator.clean_value(value, field_type)
@@ -247,10 +382,12 @@ class MessageHandler:
             
             # Parse deals
             formatted_deals = await self.deal_parser.parse_deals(message_text)
-            
+            get_history().record(formatted_deals, PARSED, user_id=user_id, flow='unstructured')
+
             # Store deals for this user
             self.current_deals[user_id] = {
                 'deals': formatted_deals,
+                'session': new_session(),
                 'current_index': 0,
                 'last_activity': time.time()
             }
@@ -295,22 +432,7 @@ class MessageHandler:
             user_data['current_index'] = 0
         
         try:
-            deal = user_data['deals'][current_index]
-            
-            # Pass user_id to _format_deal_message
-            deal_text = await self._format_deal_message(
-                deal, 
-                current_index + 1, 
-                total_deals,
-                user_id
-            )
-            
-            # Create keyboard
-            reply_markup = await self._create_keyboard(
-                current_index, 
-                total_deals, 
-                self.deal_statuses.get(user_id, {})
-            )
+            deal_text, reply_markup = await self._render_deal(user_id, current_index)
 
             if message:
                 await message.edit_text(deal_text, reply_markup=reply_markup)
@@ -345,30 +467,15 @@ class MessageHandler:
             
             # Get approved deals
             approved_deals = []
+            submitted = []
             for idx, deal in enumerate(self.current_deals[user_id]['deals']):
                 if self.deal_statuses.get(user_id, {}).get(idx) == 'approved':
-                    parsed_data = deal.get('parsed_data', deal)
-                    approved_deal = {
-                        'company_name': self._clean_field(parsed_data.get('partner')),
-                        'region': self._clean_field(parsed_data.get('region'), 'geo'),
-                        'geo': self._clean_field(parsed_data.get('geo'), 'geo'),
-                        'language': self._clean_field(parsed_data.get('language'), 'language'),
-                        'sources': self._clean_field(parsed_data.get('source'), 'sources'),
-                        'cpa_buying': parsed_data.get('cpa', ''),
-                        'crg_buying': parsed_data.get('crg', ''),
-                        'cpl_buying': parsed_data.get('cpl', ''),
-                        'funnels': self._clean_field(
-                            parsed_data.get('funnels', []) if isinstance(parsed_data.get('funnels'), list)
-                            else parsed_data.get('funnels', ''),
-                            'list'
-                        ),
-                        'cr': parsed_data.get('cr', ''),
-                        'deduction': parsed_data.get('deduction_limit', '')
-                    }
+                    approved_deal = deal.to_submission()
                     if any([approved_deal['cpa_buying'], 
                            approved_deal['crg_buying'], 
                            approved_deal['cpl_buying']]):
                         approved_deals.append(approved_deal)
+                        submitted.append(deal)
 
             if not approved_deals:
                 await query.edit_message_text(
@@ -379,84 +486,25 @@ class MessageHandler:
 
             logger.info(f"Found {len(approved_deals)} approved deals to submit")
 
-            # Update status - Initializing Notion
-            await query.edit_message_text(
-                "🔄 Processing Submission...\n\n"
-                "1️⃣ Approved deals collected\n"
-                "2️⃣ Initializing Notion connection..."
-            )
-
-            # Initialize Notion client
-            notion_token = os.getenv('NOTION_TOKEN')
-            offers_db_id = os.getenv('OFFERS_DATABASE_ID')
-            kitchen_db_id = os.getenv('ADVERTISERS_DATABASE_ID')
-            
-            if not all([notion_token, offers_db_id, kitchen_db_id]):
-                raise ValueError("Missing required Notion environment variables")
-            
-            deal_parser = StructuredDealParser(
-                notion_token=notion_token,
-                database_id=offers_db_id,
-                kitchen_database_id=kitchen_db_id
-            )
-
-            # Update status - Submitting
-            await query.edit_message_text(
-                "🔄 Processing Submission...\n\n"
-                "1️⃣ Approved deals collected\n"
-                "2️⃣ Notion connection established\n"
-                "3️⃣ Submitting deals..."
-            )
-            logger.info("Submitting deals to Notion...")
+            # Commit to the durable outbox; the drainer pushes to Notion in the background
+            chat_id = query.message.chat_id if query.message else None
+            with tracing.span("outbox.enqueue", deals=len(approved_deals)):
+                batch_id = get_outbox().enqueue(user_id, chat_id, approved_deals)
+            get_history().record(submitted, SUBMITTED, user_id=user_id, flow='unstructured')
 
-            # Submit deals
-            results = deal_parser.submit_deals(approved_deals)
-
-            # Calculate completion time
             completion_time = time.time() - start_time
-            
-            logger.info(f"Notion submission completed in {completion_time:.2f} seconds")
-
-            # Create pretty summary
-            summary = "✅ Submission Complete!\n\n"
-            summary += f"⏱️ Completed in: {completion_time:.1f}s\n"
-            summary += "━━━━━━━━━━━━━━━\n\n"
-            summary += "📋 Submitted Deals:\n\n"
-            
-            for i, deal in enumerate(approved_deals, 1):
-                summary += f"Deal #{i}: {deal['company_name']}\n"
-                summary += "━━━━━━━━━━━━━━━\n"
-                summary += f"🌍 GEO: {deal['geo']}\n"
-                summary += f"🗣 Language: {deal['language']}\n"
-                summary += f"📱 Source: {deal['sources']}\n"
-                
-                if deal['cpa_buying']:
-                    summary += f"💰 CPA: ${deal['cpa_buying']}\n"
-                if deal['crg_buying']:
-                    summary += f" CRG: {float(deal['crg_buying'])*100:.0f}%\n"
-                if deal['cpl_buying']:
-                    summary += f"🎯 CPL: ${deal['cpl_buying']}\n"
-                
-                if deal['funnels']:
-                    # Handle both string and list cases
-                    if isinstance(deal['funnels'], str):
-                        summary += f"🔄 Funnels: {deal['funnels']}\n"
-                    else:
-                        summary += f"🔄 Funnels: {', '.join(deal['funnels'])}\n"
-                
-                summary += "✅ Successfully submitted\n\n"
-
-            # Add final statistics
-            summary += f"📊 Final Results:\n"
-            summary += f"✅ {len(approved_deals)} deals submitted successfully"
+            logger.info(f"Queued batch {batch_id} in {completion_time:.3f} seconds")
 
-            # Update message with pretty summary and new keyboard
             keyboard = [[
-                InlineKeyboardButton("🆕 Process New Deals", callback_data="final_discard")
+                InlineKeyboardButton("🆕 Process New Deals", callback_data=encode('discard', 0))
             ]]
-            
             await query.edit_message_text(
-                text=summary,
+                text=(
+                    "📥 Submission Queued!\n\n"
+                    f"✅ {len(approved_deals)} deals saved and queued for Notion\n"
+                    f"🧾 Batch: {batch_id}\n\n"
+                    "You'll get a message here once they are confirmed in Notion."
+                ),
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
             
@@ -470,216 +518,264 @@ class MessageHandler:
             error_msg = f"❌ Error submitting to Notion: {str(e)}"
             await query.edit_message_text(error_msg)
 
+    @staticmethod
+    def _format_submission_summary(batch: dict) -> str:
+        """Completion message for a settled outbox batch"""
+        items = batch['items']
+        succeeded = [item for item in items if item['status'] == 'done']
+
+        summary = "✅ Submission Complete!\n\n" if len(succeeded) == len(items) else "⚠️ Submission Finished\n\n"
+        summary += f"🧾 Batch: {batch['batch_id']}\n"
+        summary += f"⏱️ Completed in: {batch['elapsed']:.1f}s\n"
+        summary += "━━━━━━━━━━━━━━━\n\n"
+        summary += "📋 Submitted Deals:\n\n"
+        
+        for i, item in enumerate(items, 1):
+            deal = item['deal']
+            summary += f"Deal #{i}: {deal['company_name']}\n"
+            summary += "━━━━━━━━━━━━━━━\n"
+            summary += f"🌍 GEO: {deal['geo']}\n"
+            summary += f"🗣 Language: {deal['language']}\n"
+            summary += f"📱 Source: {deal['sources']}\n"
+            
+            if deal['cpa_buying']:
+                summary += f"💰 CPA: ${deal['cpa_buying']}\n"
+            if deal['crg_buying']:
+                summary += f" CRG: {float(deal['crg_buying'])*100:.0f}%\n"
+            if deal['cpl_buying']:
+                summary += f"🎯 CPL: ${deal['cpl_buying']}\n"
+            
+            if deal['funnels']:
+                # Handle both string and list cases
+                if isinstance(deal['funnels'], str):
+                    summary += f"🔄 Funnels: {deal['funnels']}\n"
+                else:
+                    summary += f"🔄 Funnels: {', '.join(deal['funnels'])}\n"
+            
+            if item['status'] == 'done':
+                summary += "✅ Successfully submitted\n\n"
+            else:
+                summary += f"❌ Failed after {item['attempts']} attempts: {item['error']}\n\n"
+
+        # Add final statistics
+        summary += f"📊 Final Results:\n"
+        summary += f"✅ {len(succeeded)} deals submitted successfully"
+        if len(succeeded) < len(items):
+            summary += f"\n❌ {len(items) - len(succeeded)} deals failed"
+        return summary
+
+    @staticmethod
+    async def notify_submission(bot, batch: dict) -> None:
+        """Send the completion summary for an outbox batch to its chat"""
+        chat_id = batch['chat_id'] or batch['user_id']
+        await bot.send_message(chat_id=chat_id, text=MessageHandler._format_submission_summary(batch))
+
+    def _register_callbacks(self) -> CallbackRouter:
+        router = CallbackRouter()
+        router.register('submit', self._on_submit)
+        router.register('discard', self._on_discard)
+        router.register('reprocess', self._on_reprocess)
+        router.register('edit', self._on_edit)
+        router.register('editmodel', self._on_edit_model)
+        router.register('setmodel', self._on_set_model)
+        router.register('editfield', self._on_edit_field)
+        router.register('back', self._on_back)
+        router.register('approve', self._on_review)
+        router.register('reject', self._on_review)
+        router.register('next', self._on_navigate)
+        router.register('prev', self._on_navigate)
+        router.register('page', self._on_page)
+        router.register('toggle', self._on_toggle)
+        router.register('approve_page', self._on_approve_page)
+        router.register('approve_valid', self._on_approve_page)
+        router.register('summary', self._on_summary)
+        return router
+
+    def _session_version(self, user_id: int) -> int:
+        user_data = self.current_deals.get(user_id)
+        return user_data['session'] if user_data else 0
+
+    def _is_stale(self, callback: Callback, user_id: int) -> bool:
+        """True for buttons rendered by a review session other than the current one"""
+        user_data = self.current_deals.get(user_id)
+        if user_data is None:
+            # Only the post-submit "Process New Deals" button outlives its session
+            return callback.action != 'discard'
+        if callback.session != user_data['session']:
+            return True
+        return callback.action not in SESSION_ACTIONS and callback.index >= len(user_data['deals'])
+
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle button callbacks"""
         query = update.callback_query
         user_id = update.effective_user.id
         
         try:
-            logger.info(f"Processing callback query: {query.data} from user {user_id}")
-            await query.answer()  # Acknowledge the button click
-            
-            # Handle Notion submission
-            if query.data == "submit_notion":
-                logger.info("Starting Notion submission process")
-                await self._submit_to_notion(update, context)
+            logger.info("Processing callback query: %s from user %s", query.data, user_id)
+            callback = decode(query.data)
+            if callback is None or self._is_stale(callback, user_id):
+                logger.info("Rejected stale callback %s from user %s", query.data, user_id)
+                await query.answer("This button is from an older review. Please use the latest message.")
                 return
-                
-            # Handle final action buttons
-            if query.data.startswith('final_'):
-                logger.info(f"Processing final action: {query.data}")
-                action = query.data.split('_')[1]
-                
-                if action == 'discard':
-                    # Clear user data
-                    if user_id in self.current_deals:
-                        del self.current_deals[user_id]
-                    if user_id in self.deal_statuses:
-                        del self.deal_statuses[user_id]
-                        
-                    await query.edit_message_text(
-                        "🗑️ Deals Discarded Successfully\n\n"
-                        "Your deals have been cleared from the system. "
-                        "Thank you for using the Deal Parser."
-                    )
-                    return
-                    
-                elif action == 'reprocess':
-                    # Reset statuses but keep deals
-                    if user_id in self.deal_statuses:
-                        del self.deal_statuses[user_id]
-                    
-                    # Reset to first deal and replace the current message entirely
-                    if user_id in self.current_deals:
-                        self.current_deals[user_id]['current_index'] = 0
-                        await query.edit_message_text(
-                            text=await self._format_deal_message(
-                                self.current_deals[user_id]['deals'][0],
-                                1,
-                                len(self.current_deals[user_id]['deals']),
-                                user_id
-                            ),
-                            reply_markup=await self._create_keyboard(
-                                0,
-                                len(self.current_deals[user_id]['deals']),
-                                {}  # Reset statuses
-                            )
-                        )
-                    return
-
-            # Split callback data
-            parts = query.data.split('_')
-            action = parts[0]
-            index = int(parts[-1])  # Last part is always the index
-            
-            logger.info(f"Processing action: {action} for index: {index}")
-            
-            user_data = self.current_deals.get(user_id)
-            if not user_data:
-                logger.error(f"No deals found for user {user_id}")
-                await query.answer("No active deals found. Please submit your deals again.")
-                return
-                
-            total_deals = len(user_data['deals'])
-            current_deal = user_data['deals'][index]
-            
-            if action == 'edit':
-                logger.info(f"Showing edit options for deal {index}")
-                # Show edit options keyboard
-                keyboard = [
-                    [
-                        InlineKeyboardButton("Partner", callback_data=f"editfield_partner_{index}"),
-                        InlineKeyboardButton("GEO", callback_data=f"editfield_geo_{index}")
-                    ],
-                    [
-                        InlineKeyboardButton("CPA", callback_data=f"editfield_cpa_{index}"),
-                        InlineKeyboardButton("CRG", callback_data=f"editfield_crg_{index}")
-                    ],
-                    [
-                        InlineKeyboardButton("CPL", callback_data=f"editfield_cpl_{index}"),
-                        InlineKeyboardButton("CR", callback_data=f"editfield_cr_{index}")
-                    ],
-                    [
-                        InlineKeyboardButton("Source", callback_data=f"editfield_source_{index}"),
-                        InlineKeyboardButton("Funnels", callback_data=f"editfield_funnels_{index}")
-                    ],
-                    [
-                        InlineKeyboardButton("Language", callback_data=f"editfield_language_{index}"),
-                        InlineKeyboardButton("Pricing Model", callback_data=f"editmodel_{index}")
-                    ],
-                    [
-                        InlineKeyboardButton("Deduction Limit", callback_data=f"editfield_deduction_limit_{index}")
-                    ],
-                    [InlineKeyboardButton("🔙 Back", callback_data=f"back_{index}")]
-                ]
-                await query.edit_message_reply_markup(InlineKeyboardMarkup(keyboard))
-                
-            elif action == 'editmodel':
-                # Show pricing model options
-                keyboard = [
-                    [InlineKeyboardButton("CPA/CRG", callback_data=f"setmodel_CPA/CRG_{index}")],
-                    [InlineKeyboardButton("CPA", callback_data=f"setmodel_CPA_{index}")],
-                    [InlineKeyboardButton("CPL", callback_data=f"setmodel_CPL_{index}")],
-                    [InlineKeyboardButton("🔙 Back", callback_data=f"edit_{index}")]
-                ]
-                await query.edit_message_reply_markup(InlineKeyboardMarkup(keyboard))
-                
-            elif action == 'setmodel':
-                # Update pricing model
-                model = parts[1]
-                deal = self.current_deals[user_id]['deals'][index]
-                if 'parsed_data' in deal:
-                    deal['parsed_data']['pricing_model'] = model
-                else:
-                    deal['pricing_model'] = model
-                    
-                # Show updated deal
-                await query.edit_message_text(
-                    await self._format_deal_message(deal, index + 1, total_deals, user_id),
-                    reply_markup=await self._create_keyboard(index, total_deals, self.deal_statuses.get(user_id, {}))
-                )
-                
-            elif action == 'editfield':
-                # Store editing state with original message
-                self.editing_state[user_id] = {
-                    'field': parts[1],
-                    'deal_index': index,
-                    'message': query.message  # Store the original message
-                }
-                
-                # Store editing state in context.user_data for router
-                context.user_data['editing_state'] = True
-                
-                # Show edit prompt
-                await query.edit_message_text(
-                    f"Please enter new value for {parts[1]}:\n\n" +
-                    (await self._format_deal_message(current_deal, index + 1, total_deals, user_id)) +
-                    "\n\nType your new value or click Back to cancel.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Back", callback_data=f"back_{index}")
-                    ]])
-                )
-                
-            elif action == 'back':
-                # Return to main deal view
-                await self._display_current_deal(update, query.message, user_id)
-                
-            elif action == 'approve':
-                try:
-                    # Update status in our local storage
-                    if user_id not in self.deal_statuses:
-                        self.deal_statuses[user_id] = {}
-                    self.deal_statuses[user_id][index] = 'approved'
-                    
-                    # If there's a next deal, show it in the same window
-                    if index < total_deals - 1:
-                        user_data['current_index'] = index + 1
-                        next_deal = user_data['deals'][index + 1]
-                        await query.edit_message_text(
-                            text=await self._format_deal_message(next_deal, index + 2, total_deals, user_id),
-                            reply_markup=await self._create_keyboard(index + 1, total_deals, self.deal_statuses[user_id])
-                        )
-                    else:
-                        # If this was the last deal, show summary
-                        await self._show_summary(update, user_id)
-                        
-                except Exception as e:
-                    logger.error(f"Error in approve action: {str(e)}", exc_info=True)
-                    await query.answer("Error processing approval")
-                    
-            elif action == 'reject':
-                # Update status
-                if user_id not in self.deal_statuses:
-                    self.deal_statuses[user_id] = {}
-                self.deal_statuses[user_id][index] = 'rejected'
-                
-                # If there's a next deal, show it in the same window
-                if index < total_deals - 1:
-                    user_data['current_index'] = index + 1
-                    next_deal = user_data['deals'][index + 1]
-                    await query.edit_message_text(
-                        text=await self._format_deal_message(next_deal, index + 2, total_deals, user_id),
-                        reply_markup=await self._create_keyboard(index + 1, total_deals, self.deal_statuses[user_id])
-                    )
-                else:
-                    # If this was the last deal, show summary
-                    await self._show_summary(update, user_id)
-                    
-            elif action == 'next':
-                if index < total_deals - 1:
-                    user_data['current_index'] = index + 1
-                    await self._display_current_deal(update, query.message, user_id)
-                    
-            elif action == 'prev':
-                if index > 0:
-                    user_data['current_index'] = index - 1
-                    await self._display_current_deal(update, query.message, user_id)
+
+            await query.answer()  # Acknowledge the button click
+            await self.callbacks.dispatch(callback, update, context, user_id)
 
         except Exception as e:
             error_details = traceback.format_exc()
             logger.error(f"Error handling callback: {str(e)}\n{error_details}")
             await query.answer("Error processing button click")
 
+    async def _on_submit(self, callback: Callback, update: Update, context, user_id: int):
+        logger.info("Starting Notion submission process")
+        await self._submit_to_notion(update, context)
+
+    async def _on_discard(self, callback: Callback, update: Update, context, user_id: int):
+        # Clear user data
+        self.current_deals.pop(user_id, None)
+        self.deal_statuses.pop(user_id, None)
+        await update.callback_query.edit_message_text(
+            "🗑️ Deals Discarded Successfully\n\n"
+            "Your deals have been cleared from the system. "
+            "Thank you for using the Deal Parser."
+        )
+
+    async def _on_reprocess(self, callback: Callback, update: Update, context, user_id: int):
+        # Reset statuses but keep deals, then replace the current message with the first deal
+        self.deal_statuses.pop(user_id, None)
+        self.current_deals[user_id]['current_index'] = 0
+        text, reply_markup = await self._render_deal(user_id, 0)
+        await update.callback_query.edit_message_text(text=text, reply_markup=reply_markup)
+
+    async def _on_edit(self, callback: Callback, update: Update, context, user_id: int):
+        index = callback.index
+        session = callback.session
+        logger.info(f"Showing edit options for deal {index}")
+
+        def field(label, name):
+            return InlineKeyboardButton(label, callback_data=encode('editfield', session, index, name))
+
+        keyboard = [
+            [field("Partner", 'partner'), field("GEO", 'geo')],
+            [field("CPA", 'cpa'), field("CRG", 'crg')],
+            [field("CPL", 'cpl'), field("CR", 'cr')],
+            [field("Source", 'source'), field("Funnels", 'funnels')],
+            [
+                field("Language", 'language'),
+                InlineKeyboardButton("Pricing Model", callback_data=encode('editmodel', session, index))
+            ],
+            [field("Deduction Limit", 'deduction_limit')],
+            [InlineKeyboardButton("🔙 Back", callback_data=encode('back', session, index))]
+        ]
+        await update.callback_query.edit_message_reply_markup(InlineKeyboardMarkup(keyboard))
+
+    async def _on_edit_model(self, callback: Callback, update: Update, context, user_id: int):
+        index = callback.index
+        session = callback.session
+        keyboard = [
+            [InlineKeyboardButton(model, callback_data=encode('setmodel', session, index, model))]
+            for model in ('CPA/CRG', 'CPA', 'CPL')
+        ]
+        keyboard.append([InlineKeyboardButton("🔙 Back", callback_data=encode('edit', session, index))])
+        await update.callback_query.edit_message_reply_markup(InlineKeyboardMarkup(keyboard))
+
+    async def _on_set_model(self, callback: Callback, update: Update, context, user_id: int):
+        index = callback.index
+        self.current_deals[user_id]['deals'][index].update('pricing_model', callback.arg)
+        self._invalidate_deal(user_id, index)
+
+        # Show updated deal
+        text, reply_markup = await self._render_deal(user_id, index)
+        await update.callback_query.edit_message_text(text, reply_markup=reply_markup)
+
+    async def _on_edit_field(self, callback: Callback, update: Update, context, user_id: int):
+        query = update.callback_query
+        index = callback.index
+        card_text, _ = await self._render_deal(user_id, index)
+
+        # Store editing state with original message
+        self.editing_state[user_id] = {
+            'field': callback.arg,
+            'deal_index': index,
+            'message': query.message  # Store the original message
+        }
+
+        # Store editing state in context.user_data for router
+        context.user_data['editing_state'] = True
+
+        # Show edit prompt
+        await query.edit_message_text(
+            f"Please enter new value for {callback.arg}:\n\n" +
+            card_text +
+            "\n\nType your new value or click Back to cancel.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Back", callback_data=encode('back', callback.session, index))
+            ]])
+        )
+
+    async def _on_back(self, callback: Callback, update: Update, context, user_id: int):
+        # Return to the card view of the deal the button belongs to
+        self.current_deals[user_id]['current_index'] = callback.index
+        await self._display_current_deal(update, update.callback_query.message, user_id)
+
+    async def _on_review(self, callback: Callback, update: Update, context, user_id: int):
+        """Approve or reject a deal, then advance to the next one or the summary"""
+        index = callback.index
+        user_data = self.current_deals[user_id]
+        total_deals = len(user_data['deals'])
+        statuses = self.deal_statuses.setdefault(user_id, {})
+        statuses[index] = 'approved' if callback.action == 'approve' else 'rejected'
+
+        # If there's a next deal, show it in the same window
+        if index < total_deals - 1:
+            user_data['current_index'] = index + 1
+            text, reply_markup = await self._render_deal(user_id, index + 1)
+            await update.callback_query.edit_message_text(text=text, reply_markup=reply_markup)
+        else:
+            # If this was the last deal, show summary
+            await self._show_summary(update, user_id)
+
+    async def _on_navigate(self, callback: Callback, update: Update, context, user_id: int):
+        user_data = self.current_deals[user_id]
+        step = 1 if callback.action == 'next' else -1
+        target = callback.index + step
+        if 0 <= target < len(user_data['deals']):
+            user_data['current_index'] = target
+            await self._display_current_deal(update, update.callback_query.message, user_id)
+
+    async def _on_page(self, callback: Callback, update: Update, context, user_id: int):
+        text, reply_markup = await self._render_page(user_id, callback.index)
+        await update.callback_query.edit_message_text(text=text, reply_markup=reply_markup)
+
+    async def _on_toggle(self, callback: Callback, update: Update, context, user_id: int):
+        """Flip one deal between approved and rejected from the table view"""
+        statuses = self.deal_statuses.setdefault(user_id, {})
+        index = callback.index
+        statuses[index] = 'rejected' if statuses.get(index) == 'approved' else 'approved'
+        text, reply_markup = await self._render_page(user_id, index // PAGE_SIZE)
+        await update.callback_query.edit_message_text(text=text, reply_markup=reply_markup)
+
+    async def _on_approve_page(self, callback: Callback, update: Update, context, user_id: int):
+        """Approve every valid deal on the page (approve_page) or in the batch (approve_valid)"""
+        deals = self.current_deals[user_id]['deals']
+        statuses = self.deal_statuses.setdefault(user_id, {})
+        if callback.action == 'approve_page':
+            indexes = range(callback.index * PAGE_SIZE, min((callback.index + 1) * PAGE_SIZE, len(deals)))
+        else:
+            indexes = range(len(deals))
+        approved = 0
+        for i in indexes:
+            if deals[i].is_valid and statuses.get(i) != 'rejected':
+                statuses[i] = 'approved'
+                approved += 1
+        logger.info("Bulk-approved %d deals for user %s", approved, user_id)
+        text, reply_markup = await self._render_page(user_id, callback.index)
+        await update.callback_query.edit_message_text(text=text, reply_markup=reply_markup)
+
+    async def _on_summary(self, callback: Callback, update: Update, context, user_id: int):
+        self.deal_statuses.setdefault(user_id, {})
+        await self._show_summary(update, user_id)
+
     async def _show_summary(self, update: Update, user_id: int):
         """Show summary of all deals"""
         try:
@@ -690,6 +786,9 @@ class MessageHandler:
             approved = sum(1 for i in range(len(deals)) if statuses.get(i) == 'approved')
             rejected = sum(1 for i in range(len(deals)) if statuses.get(i) == 'rejected')
             pending = len(deals) - approved - rejected
+            index = await load_offer_index()
+            duplicates = sum(1 for i, deal in enumerate(deals)
+                             if statuses.get(i) == 'approved' and index.match(deal))
             
             summary = (
                 "📊 Deal Review Summary\n\n"
@@ -697,14 +796,17 @@ class MessageHandler:
                 f"❌ Rejected: {rejected}\n"
                 f"⏳ Pending: {pending}\n\n"
             )
+            if duplicates:
+                summary += f"⚠️ {duplicates} approved deals match offers already in Notion\n\n"
             
             # Create final action buttons
+            session = self.current_deals[user_id]['session']
             keyboard = [
                 [
-                    InlineKeyboardButton("⚪️ Submit to Notion", callback_data="submit_notion"),
-                    InlineKeyboardButton("♺ Reprocess", callback_data="final_reprocess")
+                    InlineKeyboardButton("⚪️ Submit to Notion", callback_data=encode('submit', session)),
+                    InlineKeyboardButton("♺ Reprocess", callback_data=encode('reprocess', session))
                 ],
-                [InlineKeyboardButton("🗑️ Discard All", callback_data="final_discard")]
+                [InlineKeyboardButton("🗑️ Discard All", callback_data=encode('discard', session))]
             ]
             
             # Edit the existing message instead of creating a new one
@@ -775,12 +877,11 @@ class MessageHandler:
                 )
                 return
 
-            # Update the deal with new value
+            # Update the deal; region, language and pricing model follow the edit
             deal = self.current_deals[user_id]['deals'][deal_index]
-            if 'parsed_data' in deal:
-                deal['parsed_data'][field] = converted_value
-            else:
-                deal[field] = converted_value
+            changed = deal.update(field, converted_value)
+            logger.debug("Edit of %s on deal %d changed %s", field, deal_index, sorted(changed))
+            self._invalidate_deal(user_id, deal_index)
 
             # Delete the edit prompt message and user's input message
             await original_message.delete()
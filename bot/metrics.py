@@ -0,0 +1,328 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Holds counters and histograms for the deal pipeline (structure analysis,
+per-deal parsing, Mistral calls, Notion lookups and page creation,
+Telegram Bot API requests) and renders them in the Prometheus text format
+for the ``/metrics`` route in api/telegram.py.
+
+Usage:
+    @instrument("parse_deal")
+    async def _parse_deal(...): ...
+
+    with timed("notion_page_create"):
+        client.pages.create(...)
+"""
+import functools
+import inspect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bot import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # bucket counts followed by sum and count
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets):
+                cumulative += series[i]
+                label = _label_text(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{label} {_format_value(cumulative)}")
+            label = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{label} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{label} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "deal_pipeline_stage_seconds", "Time spent in each deal pipeline stage", ["stage"]))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "deal_pipeline_stage_errors_total", "Exceptions raised by each deal pipeline stage", ["stage"]))
+MISTRAL_TOKENS = REGISTRY.register(Counter(
+    "mistral_tokens_total", "Tokens reported in Mistral response usage", ["model", "kind", "prompt"]))
+TELEGRAM_SECONDS = REGISTRY.register(Histogram(
+    "telegram_api_request_seconds", "Telegram Bot API request latency", ["method"]))
+MISTRAL_SECONDS = REGISTRY.register(Histogram(
+    "mistral_call_seconds", "Mistral completion latency per model tier", ["model", "prompt"]))
+MISTRAL_CASCADE = REGISTRY.register(Counter(
+    "mistral_cascade_total", "Model cascade outcomes per tier (accepted, escalated, invalid)",
+    ["model", "prompt", "outcome"]))
+MISTRAL_COST = REGISTRY.register(Counter(
+    "mistral_cost_usd_total", "Estimated Mistral spend from response usage and MODEL_PRICES", ["model", "prompt"]))
+MISTRAL_HEDGES = REGISTRY.register(Counter(
+    "mistral_hedges_total", "Hedged Mistral calls (fired, primary_won, hedge_won)", ["model", "prompt", "outcome"]))
+WEBHOOK_UPDATES = REGISTRY.register(Counter(
+    "telegram_webhook_updates_total", "Webhook updates by pre-filter verdict (accept, stale, duplicate, ignored, invalid)",
+    ["outcome"]))
+NOTION_RETRIES = REGISTRY.register(Counter(
+    "notion_retries_total", "Notion call retries by outcome (retried, exhausted, budget_exhausted)",
+    ["operation", "outcome"]))
+
+
+@contextmanager
+def timed(stage: str):
+    """Observe the wall time of a block under the given stage label.
+
+    Also opens a tracing span named after the stage.
+    """
+    start = time.perf_counter()
+    with tracing.span(stage):
+        try:
+            yield
+        except BaseException:
+            STAGE_ERRORS.inc(stage=stage)
+            raise
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def instrument(stage: str):
+    """Decorator version of timed() for sync and async functions"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# USD per million (input, output) tokens; update when Mistral changes pricing
+MODEL_PRICES = {
+    "mistral-small-latest": (0.2, 0.6),
+    "mistral-large-latest": (2.0, 6.0),
+    "open-mistral-nemo": (0.15, 0.15),
+    "ministral-8b-latest": (0.1, 0.1),
+}
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+class TokenLedger:
+    """Per-call Mistral token counts for one unit of work, e.g. one parsed message"""
+
+    def __init__(self, parent: Optional['TokenLedger'] = None):
+        self.calls: List[Tuple[str, int, int, str]] = []
+        self.parent = parent
+
+    def record(self, prompt: str, prompt_tokens: int, completion_tokens: int, model: str = "") -> None:
+        self.calls.append((prompt, prompt_tokens, completion_tokens, model))
+        if self.parent is not None:
+            self.parent.record(prompt, prompt_tokens, completion_tokens, model)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(call[1] for call in self.calls)
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(call[2] for call in self.calls)
+
+    def by_model(self) -> Dict[str, Dict[str, float]]:
+        """Calls, tokens and estimated cost per model"""
+        totals: Dict[str, Dict[str, float]] = {}
+        for _, prompt_tokens, completion_tokens, model in self.calls:
+            entry = totals.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["cost_usd"] += estimate_cost(model, prompt_tokens, completion_tokens)
+        for entry in totals.values():
+            entry["cost_usd"] = round(entry["cost_usd"], 6)
+        return totals
+
+    @property
+    def cost(self) -> float:
+        return sum(estimate_cost(model, p, c) for _, p, c, model in self.calls)
+
+    def summary(self, deals: int = 0) -> Dict[str, float]:
+        total = self.prompt_tokens + self.completion_tokens
+        return {
+            "calls": len(self.calls),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tokens_per_deal": round(total / deals, 1) if deals else 0.0,
+            "cost_usd": round(self.cost, 6),
+        }
+
+
+_ledger: ContextVar[Optional[TokenLedger]] = ContextVar("token_ledger", default=None)
+
+
+@contextmanager
+def token_ledger():
+    """Collect the usage of every Mistral call made inside the block (also counted by any outer ledger)"""
+    ledger = TokenLedger(parent=_ledger.get())
+    token = _ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _ledger.reset(token)
+
+
+def record_usage(model: str, usage, prompt: str = "other") -> None:
+    """Record token counts from a Mistral response.usage object"""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    if prompt_tokens:
+        MISTRAL_TOKENS.inc(prompt_tokens, model=model, kind="prompt", prompt=prompt)
+    if completion_tokens:
+        MISTRAL_TOKENS.inc(completion_tokens, model=model, kind="completion", prompt=prompt)
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    if cost:
+        MISTRAL_COST.inc(cost, model=model, prompt=prompt)
+    ledger = _ledger.get()
+    if ledger is not None:
+        ledger.record(prompt, prompt_tokens, completion_tokens, model)
+
+
+def render_latest() -> str:
+    return REGISTRY.render()
+
+
+def telegram_request(**kwargs):
+    """HTTPXRequest that times every Bot API call (edit_text, reply_text, ...)"""
+    from telegram.request import HTTPXRequest
+
+    class InstrumentedRequest(HTTPXRequest):
+        async def do_request(self, url, method, *args, **kw):
+            endpoint = url.rsplit("/", 1)[-1]
+            start = time.perf_counter()
+            try:
+                with tracing.span(f"telegram.{endpoint}", "client", **{"http.method": method}):
+                    return await super().do_request(url, method, *args, **kw)
+            finally:
+                TELEGRAM_SECONDS.observe(time.perf_counter() - start, method=endpoint)
+
+    return InstrumentedRequest(**kwargs)
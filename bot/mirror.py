@@ -0,0 +1,413 @@
+"""Local SQLite mirror of the OFFERS and ADVERTISERS Notion databases.
+
+The first sync pages through both databases in full. Later syncs only ask
+Notion for pages whose ``last_edited_time`` is on or after the newest one
+already mirrored. Notion rounds that timestamp to the minute, so a few
+pages are fetched twice and simply upserted again. Pages that were deleted
+or archived are not returned by an incremental query, so a full sync runs
+again every FULL_SYNC_INTERVAL and removes rows it did not see.
+
+Offers are indexed by partner and GEO-Funnel Code, and by each GEO and
+source through the offer_geos / offer_sources tables, so lookups such as
+"DE offers on Facebook" never touch the Notion API.
+
+``version`` counts syncs that actually changed, added or removed a row. A
+sync that only re-fetched unchanged pages leaves it alone, so caches built
+from the mirror can key on it without reading the database.
+
+Usage:
+    mirror = get_mirror()
+    mirror.sync()                      # or mirror.start() inside the event loop
+    mirror.find_offers(geo="DE", source="Facebook")
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from bot.regions import canonical_country, split_geos
+from bot.retry import RetryPolicy
+from bot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+ADVERTISERS = 'advertisers'
+OFFERS = 'offers'
+
+# Re-read everything this often to drop pages deleted in Notion
+FULL_SYNC_INTERVAL = 24 * 3600
+
+# Offer properties as named in "Individual OFFERS | Kitchen"
+CODE_PROPERTY = 'GEO-Funnel Code'
+ADVERTISER_RELATION = '⚡ ALL ADVERTISERS | Kitchen'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS advertisers (
+    page_id TEXT PRIMARY KEY,
+    name TEXT COLLATE NOCASE,
+    last_edited_time TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS advertisers_name ON advertisers (name);
+CREATE TABLE IF NOT EXISTS offers (
+    page_id TEXT PRIMARY KEY,
+    code TEXT NOT NULL,
+    partner TEXT COLLATE NOCASE,
+    partner_id TEXT,
+    geo TEXT,
+    language TEXT,
+    sources TEXT,
+    funnels TEXT,
+    cpa REAL,
+    crg REAL,
+    cpl REAL,
+    deduction REAL,
+    status TEXT,
+    last_edited_time TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS offers_partner ON offers (partner);
+CREATE INDEX IF NOT EXISTS offers_code ON offers (code);
+CREATE INDEX IF NOT EXISTS offers_partner_id ON offers (partner_id);
+CREATE TABLE IF NOT EXISTS offer_geos (
+    geo TEXT NOT NULL,
+    page_id TEXT NOT NULL,
+    PRIMARY KEY (geo, page_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS offer_geos_page ON offer_geos (page_id);
+CREATE TABLE IF NOT EXISTS offer_sources (
+    source TEXT NOT NULL COLLATE NOCASE,
+    page_id TEXT NOT NULL,
+    PRIMARY KEY (source, page_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS offer_sources_page ON offer_sources (page_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    database_id TEXT PRIMARY KEY,
+    last_edited_time TEXT,
+    full_synced_at REAL,
+    synced_at REAL
+);
+"""
+
+
+# ----------------------------------------------------------------------
+# Notion property values
+# ----------------------------------------------------------------------
+
+def _text(prop: Optional[Dict]) -> Optional[str]:
+    """Plain text of a title, rich_text, select or string formula property"""
+    if not prop:
+        return None
+    for key in ('title', 'rich_text'):
+        if key in prop:
+            text = ''.join(part.get('plain_text') or part.get('text', {}).get('content', '')
+                           for part in prop[key] or [])
+            return text or None
+    if 'select' in prop:
+        return (prop['select'] or {}).get('name')
+    if 'formula' in prop:
+        value = (prop['formula'] or {}).get('string')
+        return value or None
+    return None
+
+
+def _number(prop: Optional[Dict]) -> Optional[float]:
+    if not prop:
+        return None
+    if 'formula' in prop:
+        return (prop['formula'] or {}).get('number')
+    return prop.get('number')
+
+
+def _names(prop: Optional[Dict]) -> List[str]:
+    if not prop:
+        return []
+    return [option['name'] for option in prop.get('multi_select') or [] if option.get('name')]
+
+
+def _title(page: Dict) -> Optional[str]:
+    prop = next((p for p in page.get('properties', {}).values() if 'title' in p), None)
+    return _text(prop)
+
+
+class NotionMirror:
+    """SQLite copy of the offers and advertisers databases"""
+
+    def __init__(self, path: str, offers_database_id: str, advertisers_database_id: str,
+                 client=None, sync_interval: float = 300.0, retry_policy: Optional[RetryPolicy] = None):
+        self.path = path
+        self.offers_database_id = offers_database_id
+        self.advertisers_database_id = advertisers_database_id
+        self._client = client
+        self.sync_interval = sync_interval
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._task: Optional[asyncio.Task] = None
+        # Bumped by every sync that changed the mirrored rows
+        self.version = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            from bot.clients import get_notion_client
+            self._client = get_notion_client()
+        return self._client
+
+    # ------------------------------------------------------------------
+    # Sync
+    # ------------------------------------------------------------------
+
+    def _pages(self, database_id: str, since: Optional[str]) -> Iterator[Dict]:
+        query = {'database_id': database_id, 'page_size': 100}
+        if since:
+            query['filter'] = {'timestamp': 'last_edited_time', 'last_edited_time': {'on_or_after': since}}
+        retry = self.retry_policy.for_batch(10)
+        cursor = None
+        while True:
+            if cursor:
+                query['start_cursor'] = cursor
+            response = retry.call("databases.query", self.client.databases.query, **query)
+            yield from response['results']
+            if not response.get('has_more'):
+                return
+            cursor = response['next_cursor']
+
+    def _unchanged(self, table: str, page_id: str, columns: Dict[str, Any], now: float) -> bool:
+        """True, after marking the row as seen, if it already holds exactly these values"""
+        row = self._conn.execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE page_id = ?", (page_id,)
+        ).fetchone()
+        if row is None or tuple(row) != tuple(columns.values()):
+            return False
+        self._conn.execute(f"UPDATE {table} SET synced_at = ? WHERE page_id = ?", (now, page_id))
+        return True
+
+    def _upsert_advertiser(self, page: Dict, now: float) -> bool:
+        """Store one advertiser page; False if it was already mirrored as is"""
+        if self._unchanged(ADVERTISERS, page['id'], {'name': _title(page)}, now):
+            return False
+        self._conn.execute(
+            "INSERT OR REPLACE INTO advertisers (page_id, name, last_edited_time, synced_at) VALUES (?, ?, ?, ?)",
+            (page['id'], _title(page), page['last_edited_time'], now),
+        )
+        # Offers pick up a renamed advertiser without being edited themselves
+        self._conn.execute(
+            "UPDATE offers SET partner = ? WHERE partner_id = ?", (_title(page), page['id'])
+        )
+        return True
+
+    def _upsert_offer(self, page: Dict, now: float) -> bool:
+        """Store one offer page; False if it was already mirrored as is"""
+        props = page.get('properties', {})
+        code = _text(props.get(CODE_PROPERTY)) or ''
+        # Pages created by the bot have no computed GEO yet; the code starts with it
+        geo = _text(props.get('GEO')) or code.split(' ', 1)[0]
+        relation = (props.get(ADVERTISER_RELATION) or {}).get('relation') or []
+        partner_id = relation[0]['id'] if relation else None
+        partner = _text(props.get('Partner'))
+        if partner is None and partner_id:
+            row = self._conn.execute("SELECT name FROM advertisers WHERE page_id = ?", (partner_id,)).fetchone()
+            partner = row['name'] if row else None
+        sources = _names(props.get('Sources'))
+
+        page_id = page['id']
+        columns = {
+            'code': code, 'partner': partner, 'partner_id': partner_id, 'geo': geo,
+            'language': '|'.join(_names(props.get('Language'))), 'sources': '|'.join(sources),
+            'funnels': '|'.join(_names(props.get('Funnels'))),
+            'cpa': _number(props.get('CPA | Buying')), 'crg': _number(props.get('CRG | Buying')),
+            'cpl': _number(props.get('CPL | Buying')), 'deduction': _number(props.get('Deduction %')),
+            'status': _text(props.get('Active Status`')),
+        }
+        if self._unchanged(OFFERS, page_id, columns, now):
+            return False
+        self._conn.execute(
+            "INSERT OR REPLACE INTO offers (page_id, code, partner, partner_id, geo, language, sources, funnels, "
+            "cpa, crg, cpl, deduction, status, last_edited_time, synced_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (page_id, *columns.values(), page['last_edited_time'], now),
+        )
+        self._conn.execute("DELETE FROM offer_geos WHERE page_id = ?", (page_id,))
+        self._conn.executemany("INSERT OR IGNORE INTO offer_geos (geo, page_id) VALUES (?, ?)",
+                               [(canonical_country(country), page_id) for country in split_geos(geo)])
+        self._conn.execute("DELETE FROM offer_sources WHERE page_id = ?", (page_id,))
+        self._conn.executemany("INSERT OR IGNORE INTO offer_sources (source, page_id) VALUES (?, ?)",
+                               [(source, page_id) for source in sources])
+        return True
+
+    def _delete_unseen(self, table: str, started: float) -> int:
+        if table == OFFERS:
+            for child in ('offer_geos', 'offer_sources'):
+                self._conn.execute(
+                    f"DELETE FROM {child} WHERE page_id IN (SELECT page_id FROM offers WHERE synced_at < ?)",
+                    (started,))
+        return self._conn.execute(f"DELETE FROM {table} WHERE synced_at < ?", (started,)).rowcount
+
+    def _sync_database(self, database_id: str, table: str, full: bool) -> Dict[str, int]:
+        with self._lock:
+            state = self._conn.execute(
+                "SELECT * FROM sync_state WHERE database_id = ?", (database_id,)
+            ).fetchone()
+        started = time.time()
+        full = full or state is None or not state['full_synced_at'] \
+            or started - state['full_synced_at'] > FULL_SYNC_INTERVAL
+        since = None if full else state['last_edited_time']
+        newest = None if full else since
+        upsert = self._upsert_advertiser if table == ADVERTISERS else self._upsert_offer
+
+        pages = changed = removed = 0
+        batch: List[Dict] = []
+
+        def flush():
+            nonlocal changed
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for page in batch:
+                        changed += upsert(page, started)
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            batch.clear()
+
+        for page in self._pages(database_id, since):
+            batch.append(page)
+            pages += 1
+            newest = max(newest or page['last_edited_time'], page['last_edited_time'])
+            if len(batch) >= 100:
+                flush()
+        if batch:
+            flush()
+
+        with self._lock:
+            if full:
+                removed = self._delete_unseen(table, started)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (database_id, last_edited_time, full_synced_at, synced_at) "
+                "VALUES (?, ?, ?, ?)",
+                (database_id, newest, started if full else state['full_synced_at'], time.time()),
+            )
+            if changed or removed:
+                self.version += 1
+        return {'pages': pages, 'changed': changed, 'removed': removed, 'full': full}
+
+    def sync(self, full: bool = False) -> Dict[str, Dict[str, int]]:
+        """Bring both tables up to date; advertisers first so offers can resolve partner names"""
+        start = time.perf_counter()
+        result = {
+            ADVERTISERS: self._sync_database(self.advertisers_database_id, ADVERTISERS, full),
+            OFFERS: self._sync_database(self.offers_database_id, OFFERS, full),
+        }
+        logger.info("Mirror sync in %.2fs: %d advertisers, %d offers fetched, %d changed, %d removed (full=%s)",
+                    time.perf_counter() - start, result[ADVERTISERS]['pages'], result[OFFERS]['pages'],
+                    result[ADVERTISERS]['changed'] + result[OFFERS]['changed'],
+                    result[ADVERTISERS]['removed'] + result[OFFERS]['removed'], result[OFFERS]['full'])
+        return result
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def last_synced(self) -> Optional[float]:
+        """When the offers table was last brought up to date, or None before the first sync"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_at FROM sync_state WHERE database_id = ?", (self.offers_database_id,)
+            ).fetchone()
+        return row['synced_at'] if row else None
+
+    def find_offers(self, geo: Optional[str] = None, source: Optional[str] = None,
+                    partner: Optional[str] = None, active_only: bool = True, limit: int = 20) -> List[Dict[str, Any]]:
+        """Offers matching every given filter, most recently edited first"""
+        where, params = [], []
+        if geo:
+            where.append("page_id IN (SELECT page_id FROM offer_geos WHERE geo = ?)")
+            params.append(canonical_country(geo))
+        if source:
+            where.append("page_id IN (SELECT page_id FROM offer_sources WHERE source = ?)")
+            params.append(source)
+        if partner:
+            where.append("partner = ?")
+            params.append(partner)
+        if active_only:
+            where.append("(status IS NULL OR status = 'Active')")
+        sql = "SELECT * FROM offers"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY last_edited_time DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def active_offers(self) -> List[Dict[str, Any]]:
+        """Every offer that is not marked Dead"""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(
+                "SELECT * FROM offers WHERE status IS NULL OR status = 'Active'")]
+
+    def find_by_code(self, code: str) -> List[Dict[str, Any]]:
+        """Offers whose GEO-Funnel Code is exactly `code`"""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute("SELECT * FROM offers WHERE code = ?", (code,))]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM offers").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Background polling
+    # ------------------------------------------------------------------
+
+    async def _run(self) -> None:
+        logger.info("Mirror sync started (%s, every %ss)", self.path, self.sync_interval)
+        while True:
+            try:
+                await asyncio.to_thread(self.sync)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Mirror sync error: %s", e, exc_info=True)
+            await asyncio.sleep(self.sync_interval)
+
+    def start(self) -> None:
+        """Start polling Notion on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_mirror: Optional[NotionMirror] = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror() -> NotionMirror:
+    """Process-wide mirror at MIRROR_PATH (default mirror.db)"""
+    global _mirror
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                settings = get_settings()
+                _mirror = NotionMirror(settings.mirror_path, settings.offers_database_id,
+                                       settings.advertisers_database_id,
+                                       sync_interval=settings.mirror_sync_interval)
+    return _mirror
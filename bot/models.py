@@ -0,0 +1,270 @@
+"""Canonical deal model shared by the structured and unstructured flows.
+
+Deal is a slotted class, so a review session holding thousands of deals
+stores one small fixed-layout object per deal instead of the LLM's nested
+``{'raw_text', 'parsed_data': {...}, 'metadata': {...}}`` dicts.
+
+Converters:
+    Deal.from_llm(parsed)           LLM JSON (nested or flat) -> Deal
+    Deal.from_dash_string(text)     structured 12-field string -> (Deal, error)
+    deal.to_submission()            Deal -> dict expected by submit_deals
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from bot.derived import recompute
+from bot.regions import region_for
+
+logger = logging.getLogger(__name__)
+
+# Edit-button names that differ from the Deal attribute
+FIELD_ALIASES = {
+    'deduction': 'deduction_limit',
+    'sources': 'source',
+    'company_name': 'partner',
+}
+
+# Display form of each pricing model; dash strings use the lowercase aliases
+PRICING_MODELS = {
+    'cpa/crg': 'CPA/CRG',
+    'cpa_crg': 'CPA/CRG',
+    'cpa+crg': 'CPA/CRG',
+    'crg': 'CPA/CRG',
+    'cpa': 'CPA',
+    'cpl': 'CPL',
+}
+
+
+# Every Deal is built through these two, so both stay allocation-light
+_NORMALIZED_MODELS: Dict[Any, str] = {}
+_NO_DERIVED: frozenset = frozenset()
+
+
+def normalize_pricing_model(value: Optional[str]) -> Optional[str]:
+    """Map 'cpa_crg', 'CPA/CRG', 'cpl', ... onto 'CPA/CRG' / 'CPA' / 'CPL'"""
+    if not value:
+        return value
+    normalized = _NORMALIZED_MODELS.get(value)
+    if normalized is None:
+        normalized = PRICING_MODELS.get(str(value).strip().lower(), str(value).strip())
+        if isinstance(value, str) and len(_NORMALIZED_MODELS) < 256:
+            _NORMALIZED_MODELS[value] = normalized
+    return normalized
+
+
+def _funnels(value: Any) -> Tuple[str, ...]:
+    if not value or value == '&':
+        return ()
+    if isinstance(value, str):
+        value = value.replace('|', ',').split(',')
+    try:
+        return tuple(filter(None, map(str.strip, value)))
+    except TypeError:
+        # Non-string items, e.g. numbers from a sloppy LLM reply
+        return tuple(str(f).strip() for f in value if f and str(f).strip())
+
+
+def _percent(value: str, field: str) -> Tuple[Optional[float], Optional[str]]:
+    """Parse a dash-string number, treating values above 1 as percentages"""
+    if value == '&':
+        return None, None
+    try:
+        number = float(value)
+    except ValueError:
+        return None, f"Invalid {field} '{value}'. Must be a number or '&'"
+    return (number / 100 if number > 1 else number), None
+
+
+class Deal:
+    FIELDS = ('partner', 'region', 'geo', 'language', 'source', 'pricing_model',
+              'cpa', 'crg', 'cpl', 'funnels', 'cr', 'deduction_limit')
+    __slots__ = FIELDS + ('raw_text', 'error', 'version', 'derived')
+
+    def __init__(self, partner: Optional[str] = None, region: Optional[str] = None,
+                 geo: Optional[str] = None, language: Optional[str] = None,
+                 source: Optional[str] = None, pricing_model: Optional[str] = None,
+                 cpa: Optional[float] = None, crg: Optional[float] = None, cpl: Optional[float] = None,
+                 funnels: Iterable[str] = (), cr: Any = None, deduction_limit: Optional[float] = None,
+                 raw_text: str = '', error: Optional[str] = None, derived: Iterable[str] = ()):
+        self.partner = partner
+        self.region = region
+        self.geo = geo
+        self.language = language
+        self.source = source
+        self.pricing_model = normalize_pricing_model(pricing_model)
+        self.cpa = cpa
+        self.crg = crg
+        self.cpl = cpl
+        self.funnels = _funnels(funnels)
+        self.cr = cr
+        self.deduction_limit = deduction_limit
+        self.raw_text = raw_text
+        self.error = error
+        self.version = 0
+        # Fields whose value came from bot/derived.py rather than the LLM or the user
+        self.derived = frozenset(derived) if derived else _NO_DERIVED
+
+    def __repr__(self) -> str:
+        return (f"Deal(partner={self.partner!r}, geo={self.geo!r}, pricing_model={self.pricing_model!r}, "
+                f"cpa={self.cpa!r}, crg={self.crg!r}, cpl={self.cpl!r})")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Deal):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.FIELDS + ('raw_text',))
+
+    # ------------------------------------------------------------------
+    # Converters
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_llm(cls, parsed: Dict[str, Any]) -> 'Deal':
+        """Build a Deal from LLM output, either {'raw_text', 'parsed_data', 'metadata'} or flat"""
+        data = parsed.get('parsed_data', parsed)
+        metadata = parsed.get('metadata') or {}
+        return cls(
+            partner=data.get('partner'),
+            region=data.get('region'),
+            geo=data.get('geo'),
+            language=data.get('language'),
+            source=data.get('source'),
+            pricing_model=data.get('pricing_model'),
+            cpa=data.get('cpa'),
+            crg=data.get('crg'),
+            cpl=data.get('cpl'),
+            funnels=data.get('funnels') or (),
+            cr=data.get('cr'),
+            deduction_limit=data.get('deduction_limit'),
+            raw_text=parsed.get('raw_text', ''),
+            error=metadata.get('error'),
+            derived=metadata.get('derived') or (),
+        )
+
+    @classmethod
+    def from_dash_string(cls, deal_string: str) -> Tuple[Optional['Deal'], Optional[str]]:
+        """Parse REGION-PARTNER-GEO-LANGUAGE-SOURCE-MODEL-CPA-CRG-CPL-FUNNELS-CR-DEDUCTION"""
+        if not deal_string or not isinstance(deal_string, str):
+            return None, "Invalid deal string format"
+
+        fields = [f.strip() for f in deal_string.split("-")]
+        if len(fields) != 12:
+            return None, f"Expected 12 fields, got {len(fields)}"
+
+        try:
+            cpa = float(fields[6]) if fields[6] != "&" else None
+            cpl = float(fields[8]) if fields[8] != "&" else None
+        except ValueError:
+            return None, f"Invalid CPA '{fields[6]}' or CPL '{fields[8]}' value. Must be a number or '&'"
+
+        crg, error = _percent(fields[7], "CRG value")
+        if error:
+            return None, error
+        deduction, error = _percent(fields[11], "deduction limit")
+        if error:
+            return None, error
+
+        # Region is derived from the GEO; the typed one is only a fallback
+        from bot.client import FieldValidator
+        region = region_for(FieldValidator.clean_geo(fields[2])) or fields[0]
+        if region != fields[0]:
+            logger.debug("Region %s replaced by %s for GEO %s", fields[0], region, fields[2])
+
+        deal = cls(
+            region=region,
+            partner=fields[1],
+            geo=fields[2],
+            language=fields[3],
+            source=fields[4],
+            pricing_model=fields[5],
+            cpa=cpa,
+            crg=crg,
+            cpl=cpl,
+            funnels=fields[9].split("|") if fields[9] != "&" else (),
+            cr=fields[10],
+            deduction_limit=deduction,
+            raw_text=deal_string,
+        )
+        if not deal.is_valid:
+            missing = deal.missing_fields()
+            if missing:
+                return None, f"Missing required fields: {', '.join(missing)}"
+            return None, f"Invalid pricing values for model {deal.pricing_model}"
+        return deal, None
+
+    def to_submission(self, clean: bool = True) -> Dict[str, Any]:
+        """Dict expected by submit_deals; clean=False keeps values exactly as entered"""
+        if not clean:
+            return {
+                'company_name': self.partner,
+                'region': self.region,
+                'geo': self.geo,
+                'language': self.language,
+                'sources': self.source,
+                'funnels': list(self.funnels),
+                'cpa_buying': self.cpa,
+                'crg_buying': self.crg,
+                'cpl_buying': self.cpl,
+                'cr': self.cr,
+                'deduction': self.deduction_limit,
+            }
+        from bot.client import FieldValidator
+        return {
+            'company_name': FieldValidator.clean_value(self.partner),
+            'region': FieldValidator.clean_value(self.region, 'geo'),
+            'geo': FieldValidator.clean_value(self.geo, 'geo'),
+            'language': FieldValidator.clean_value(self.language, 'language'),
+            'sources': FieldValidator.clean_value(self.source, 'sources'),
+            'cpa_buying': self.cpa if self.cpa is not None else '',
+            'crg_buying': self.crg if self.crg is not None else '',
+            'cpl_buying': self.cpl if self.cpl is not None else '',
+            'funnels': FieldValidator.clean_value(list(self.funnels), 'list'),
+            'cr': self.cr if self.cr is not None else '',
+            'deduction': self.deduction_limit if self.deduction_limit is not None else '',
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        data['funnels'] = list(self.funnels)
+        return {'raw_text': self.raw_text, 'parsed_data': data}
+
+    # ------------------------------------------------------------------
+    # Editing and validation
+    # ------------------------------------------------------------------
+
+    def update(self, field: str, value: Any) -> Set[str]:
+        """Set one field from an edit, recompute the fields derived from it and
+        bump the version once; returns every field that changed"""
+        field = FIELD_ALIASES.get(field, field)
+        if field not in self.FIELDS:
+            raise AttributeError(f"Unknown deal field: {field}")
+        if field == 'funnels':
+            value = _funnels(value)
+        elif field == 'pricing_model':
+            value = normalize_pricing_model(value)
+        setattr(self, field, value)
+        # An explicit edit pins the field; it is no longer derived
+        self.derived = self.derived - {field}
+        changed = {field} | recompute(self, (field,))
+        self.version += 1
+        return changed
+
+    def missing_fields(self) -> List[str]:
+        missing = [name for name in ('region', 'partner', 'geo', 'language') if not getattr(self, name)]
+        if not self.source or self.source == "&":
+            missing.append('source')
+        if not self.funnels:
+            missing.append('funnels')
+        return missing
+
+    @property
+    def is_valid(self) -> bool:
+        """Required fields present and prices match the pricing model"""
+        if self.missing_fields():
+            return False
+        if self.pricing_model == 'CPA/CRG':
+            return bool(self.cpa and self.crg)
+        if self.pricing_model == 'CPA':
+            return bool(self.cpa)
+        if self.pricing_model == 'CPL':
+            return bool(self.cpl)
+        return False
@@ -0,0 +1,149 @@
+"""In-memory stand-in for the Notion client used by the deal parsers.
+
+FakeNotionClient implements the ``pages.create``, ``pages.update`` and
+``databases.query`` calls made by the deal parsers and the Notion mirror,
+keeping pages in memory per database. It supports the title filters the
+parsers use, the ``last_edited_time`` filter the mirror polls with, cursor
+pagination, and optional simulated latency and error rates so
+submission throughput can be measured without touching a real workspace.
+"""
+import logging
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from bot.llm_stub import LatencyModel
+
+logger = logging.getLogger(__name__)
+
+
+def _title_text(page: Dict, property_name: str) -> str:
+    properties = page.get('properties', {})
+    prop = properties.get(property_name)
+    if prop is None and property_name == 'title':
+        prop = next((p for p in properties.values() if 'title' in p), None)
+    if not prop or not prop.get('title'):
+        return ''
+    return ''.join(part.get('text', {}).get('content', '') for part in prop['title'])
+
+
+class _Pages:
+    def __init__(self, owner: 'FakeNotionClient'):
+        self._owner = owner
+
+    def create(self, parent: Dict, properties: Dict, **kwargs) -> Dict:
+        self._owner._before_call('pages.create')
+        now = datetime.now(timezone.utc).isoformat()
+        page = {
+            'object': 'page',
+            'id': str(uuid.uuid4()),
+            'parent': parent,
+            'properties': properties,
+            'created_time': now,
+            'last_edited_time': now,
+        }
+        self._owner.pages_by_db[parent.get('database_id')].append(page)
+        return page
+
+    def update(self, page_id: str, properties: Optional[Dict] = None, archived: bool = False, **kwargs) -> Dict:
+        self._owner._before_call('pages.update')
+        for pages in self._owner.pages_by_db.values():
+            for page in pages:
+                if page['id'] == page_id:
+                    page['properties'].update(properties or {})
+                    page['last_edited_time'] = datetime.now(timezone.utc).isoformat()
+                    if archived:
+                        pages.remove(page)
+                    return page
+        raise _api_error(404)
+
+
+class _Databases:
+    def __init__(self, owner: 'FakeNotionClient'):
+        self._owner = owner
+
+    def query(self, database_id: str, filter: Optional[Dict] = None,
+              start_cursor: Optional[str] = None, page_size: int = 100, **kwargs) -> Dict:
+        self._owner._before_call('databases.query')
+        pages = [p for p in self._owner.pages_by_db.get(database_id, []) if _matches(p, filter)]
+        start = int(start_cursor) if start_cursor else 0
+        batch = pages[start:start + page_size]
+        has_more = start + page_size < len(pages)
+        return {
+            'object': 'list',
+            'results': batch,
+            'has_more': has_more,
+            'next_cursor': str(start + page_size) if has_more else None,
+        }
+
+
+def _timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _matches(page: Dict, filter: Optional[Dict]) -> bool:
+    if not filter:
+        return True
+    if 'and' in filter:
+        return all(_matches(page, f) for f in filter['and'])
+    if 'or' in filter:
+        return any(_matches(page, f) for f in filter['or'])
+    if filter.get('timestamp') == 'last_edited_time':
+        edited = _timestamp(page['last_edited_time'])
+        condition = filter['last_edited_time']
+        if 'on_or_after' in condition:
+            return edited >= _timestamp(condition['on_or_after'])
+        if 'after' in condition:
+            return edited > _timestamp(condition['after'])
+    if 'title' in filter:
+        text = _title_text(page, filter.get('property', 'title'))
+        condition = filter['title']
+        if 'equals' in condition:
+            return text == condition['equals']
+        if 'starts_with' in condition:
+            return text.startswith(condition['starts_with'])
+        if 'contains' in condition:
+            return condition['contains'] in text
+    return True
+
+
+class FakeNotionClient:
+    """Drop-in replacement for ``notion_client.Client`` in benchmarks"""
+
+    def __init__(self, latency: Optional[LatencyModel] = None, error_rate: float = 0.0,
+                 error_status: int = 429, seed: Optional[int] = None):
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.pages_by_db: Dict[str, List[Dict]] = defaultdict(list)
+        self.calls: Counter = Counter()
+        self.pages = _Pages(self)
+        self.databases = _Databases(self)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def _before_call(self, name: str) -> None:
+        self.calls[name] += 1
+        delay = self.latency.sample(self.rng)
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise _api_error(self.error_status)
+
+
+def _api_error(status: int):
+    """Build the same exception notion_client raises for an HTTP error"""
+    import httpx
+    from notion_client.errors import APIResponseError, APIErrorCode
+
+    request = httpx.Request('POST', 'https://api.notion.com/v1/stub')
+    response = httpx.Response(status, headers={'Retry-After': '0'}, request=request)
+    codes = {429: APIErrorCode.RateLimited, 404: APIErrorCode.ObjectNotFound}
+    code = codes.get(status, APIErrorCode.InternalServerError)
+    return APIResponseError(response, f"Stub error with status {status}", code)
@@ -0,0 +1,359 @@
+"""Durable write-behind outbox for Notion submissions.
+
+Approved deals are committed to a local SQLite database (WAL mode) as soon
+as the user clicks Submit, and the user is told they are queued. A
+background drainer then pushes pending items to Notion in batches with
+exponential backoff, tracks status per item, and sends each user a
+completion notification once every item of their batch has settled.
+
+Items are delivered at least once: anything left ``in_flight`` by a crash
+is retried on the next start. Each batch remembers the trace of the update
+that queued it, and its items are submitted under a span in that trace.
+
+Usage:
+    outbox = get_outbox()
+    batch_id = outbox.enqueue(user_id, chat_id, deals)
+    outbox.start(notify=send_summary)   # inside the running event loop
+    ...
+    await outbox.stop(timeout=25)       # let the batch being submitted finish
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from bot import tracing
+from bot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox_batches (
+    batch_id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER,
+    created_at REAL NOT NULL,
+    notified_at REAL,
+    trace_id TEXT,
+    span_id TEXT
+);
+CREATE TABLE IF NOT EXISTS outbox_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL REFERENCES outbox_batches(batch_id),
+    position INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    page_id TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_items_due ON outbox_items (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS outbox_items_batch ON outbox_items (batch_id);
+"""
+
+SubmitFn = Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]
+NotifyFn = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def _default_submit(deals: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    from bot.clients import get_structured_parser
+    return get_structured_parser().submit_deals(deals)
+
+
+class Outbox:
+    """SQLite-backed queue of deals waiting to be written to Notion"""
+
+    def __init__(self, path: str, submit: Optional[SubmitFn] = None, batch_size: int = 10,
+                 max_attempts: int = 5, base_delay: float = 2.0, max_delay: float = 300.0,
+                 poll_interval: float = 5.0):
+        self.path = path
+        self.submit = submit or _default_submit
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._notify: Optional[NotifyFn] = None
+        self._stopping = False
+        self._recover()
+
+    def _migrate(self) -> None:
+        """Add the columns that outbox databases created by older versions lack"""
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(outbox_batches)")}
+        for column in ('trace_id', 'span_id'):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE outbox_batches ADD COLUMN {column} TEXT")
+
+    def _recover(self) -> None:
+        """Re-queue items that were in flight when the process stopped"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE outbox_items SET status = ?, updated_at = ? WHERE status = ?",
+                (PENDING, time.time(), IN_FLIGHT),
+            )
+        if cursor.rowcount:
+            logger.warning("Re-queued %d outbox items left in flight", cursor.rowcount)
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def enqueue(self, user_id: int, chat_id: Optional[int], deals: List[Dict[str, Any]]) -> str:
+        """Durably store a batch of deals and return its batch id"""
+        batch_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        trace_id, span_id = tracing.current_context()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO outbox_batches (batch_id, user_id, chat_id, created_at, trace_id, span_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (batch_id, user_id, chat_id, now, trace_id, span_id),
+                )
+                self._conn.executemany(
+                    "INSERT INTO outbox_items (batch_id, position, payload, next_attempt_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(batch_id, i, json.dumps(deal, default=str), now, now) for i, deal in enumerate(deals)],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        logger.info("Queued %d deals for Notion in batch %s", len(deals), batch_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return batch_id
+
+    def batch_status(self, batch_id: str) -> Dict[str, int]:
+        """Item counts per status for one batch"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS n FROM outbox_items WHERE batch_id = ? GROUP BY status", (batch_id,)
+            ).fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    def pending_count(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox_items WHERE status IN (?, ?)", (PENDING, IN_FLIGHT)
+            ).fetchone()
+        return row[0]
+
+    # ------------------------------------------------------------------
+    # Drainer
+    # ------------------------------------------------------------------
+
+    def _claim(self) -> List[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT i.id, i.batch_id, i.payload, i.attempts, b.trace_id, b.span_id "
+                    "FROM outbox_items i JOIN outbox_batches b ON b.batch_id = i.batch_id "
+                    "WHERE i.status = ? AND i.next_attempt_at <= ? ORDER BY i.id LIMIT ?",
+                    (PENDING, now, self.batch_size),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox_items SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(IN_FLIGHT, now, row['id']) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+
+    def _record_results(self, rows: List[sqlite3.Row], results: List[Dict[str, Any]]) -> None:
+        now = time.time()
+        updates = []
+        for row, result in zip(rows, results):
+            attempts = row['attempts'] + 1
+            if result.get('success'):
+                page = result.get('parsed_page') or {}
+                updates.append((DONE, None, page.get('id'), now, now, row['id']))
+            elif attempts >= self.max_attempts or result.get('retryable') is False:
+                updates.append((FAILED, result.get('error'), None, now, now, row['id']))
+            else:
+                updates.append((PENDING, result.get('error'), None, now + self._retry_delay(attempts), now, row['id']))
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox_items SET status = ?, last_error = ?, page_id = ?, next_attempt_at = ?, "
+                "updated_at = ? WHERE id = ?",
+                updates,
+            )
+
+    async def _submit(self, rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+        """Submit the due items of one batch inside the trace of the update that queued it"""
+        first = rows[0]
+        deals = [json.loads(row['payload']) for row in rows]
+        with tracing.continue_trace("outbox.submit", first['trace_id'], first['span_id'],
+                                    batch=first['batch_id'], deals=len(rows)):
+            try:
+                results = await asyncio.to_thread(self.submit, deals)
+            except Exception as e:
+                logger.error("Outbox submission failed: %s", e, exc_info=True)
+                results = [{"success": False, "error": str(e)}] * len(rows)
+        if len(results) < len(rows):
+            results = list(results) + [{"success": False, "error": "no result returned"}] * (len(rows) - len(results))
+        return results
+
+    async def drain_once(self) -> int:
+        """Submit one batch of due items; returns the number of items attempted"""
+        rows = self._claim()
+        if rows:
+            by_batch: Dict[str, List[sqlite3.Row]] = {}
+            for row in rows:
+                by_batch.setdefault(row['batch_id'], []).append(row)
+            rows, results = [], []
+            for batch_rows in by_batch.values():
+                rows.extend(batch_rows)
+                results.extend(await self._submit(batch_rows))
+            self._record_results(rows, results)
+            done = sum(1 for result in results if result.get('success'))
+            logger.info("Outbox pushed %d/%d deals to Notion", done, len(rows))
+        await self._notify_completed()
+        return len(rows)
+
+    def _completed_batches(self) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT b.batch_id, b.user_id, b.chat_id FROM outbox_batches b "
+                "WHERE b.notified_at IS NULL AND NOT EXISTS ("
+                "  SELECT 1 FROM outbox_items i WHERE i.batch_id = b.batch_id AND i.status IN (?, ?))",
+                (PENDING, IN_FLIGHT),
+            ).fetchall()
+
+    def batch_summary(self, batch_id: str) -> Dict[str, Any]:
+        """Batch details for the completion notification"""
+        with self._lock:
+            batch = self._conn.execute(
+                "SELECT batch_id, user_id, chat_id, created_at FROM outbox_batches WHERE batch_id = ?", (batch_id,)
+            ).fetchone()
+            items = self._conn.execute(
+                "SELECT payload, status, attempts, last_error, page_id FROM outbox_items "
+                "WHERE batch_id = ? ORDER BY position", (batch_id,)
+            ).fetchall()
+        return {
+            "batch_id": batch['batch_id'],
+            "user_id": batch['user_id'],
+            "chat_id": batch['chat_id'],
+            "elapsed": time.time() - batch['created_at'],
+            "items": [
+                {
+                    "deal": json.loads(item['payload']),
+                    "status": item['status'],
+                    "attempts": item['attempts'],
+                    "error": item['last_error'],
+                    "page_id": item['page_id'],
+                }
+                for item in items
+            ],
+        }
+
+    async def _notify_completed(self) -> None:
+        for batch in self._completed_batches():
+            if self._notify is not None:
+                try:
+                    await self._notify(self.batch_summary(batch['batch_id']))
+                except Exception as e:
+                    # Leave it un-notified so the next pass tries again
+                    logger.warning("Failed to notify user %s about batch %s: %s",
+                                   batch['user_id'], batch['batch_id'], e)
+                    continue
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE outbox_batches SET notified_at = ? WHERE batch_id = ?", (time.time(), batch['batch_id'])
+                )
+
+    async def _run(self) -> None:
+        logger.info("Outbox drainer started (%s)", self.path)
+        while not self._stopping:
+            try:
+                attempted = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Outbox drainer error: %s", e, exc_info=True)
+                attempted = 0
+            if attempted or self._stopping:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, notify: Optional[NotifyFn] = None) -> None:
+        """Start the background drainer on the running event loop"""
+        self._notify = notify
+        self._stopping = False
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, timeout: float = 0.0) -> None:
+        """Stop the drainer; queued items stay in the database.
+
+        With a timeout, the batch currently being submitted may finish (and
+        its users be notified) first; anything left in flight after that is
+        re-queued on the next start.
+        """
+        if self._task is not None:
+            if timeout and not self._task.done():
+                self._stopping = True
+                self._wakeup.set()
+                try:
+                    await asyncio.wait_for(asyncio.shield(self._task), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning("Outbox batch still in flight after %.0fs; it will be retried on restart",
+                                   timeout)
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_outbox: Optional[Outbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """Process-wide outbox at OUTBOX_PATH (default outbox.db)"""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = Outbox(get_settings().outbox_path)
+    return _outbox
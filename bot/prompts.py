@@ -1,6 +1,8 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 import json
 
+from bot.schemas import deal_reply_error, validate_structure
+
 STRUCTURE_ANALYSIS_PROMPT = """Analyze the structure of deal text and identify shared fields and individual deals.
 
 Output Format:
@@ -53,39 +55,35 @@ Key Rules:
    - Funnels as array
 """
 
-DEAL_PARSING_PROMPT = """Parse individual deal details using shared context.
+# Kept short on purpose: it is sent once per deal. The shared context is
+# appended as compact JSON, so every deal of a section shares the same
+# system-message prefix and only the user message differs.
+DEAL_PARSING_PROMPT = """Parse one deal. Shared context fields apply unless the deal text overrides them.
+Reply with JSON only:
+{"partner":str,"geo":str,"language":str,"source":str,"pricing_model":"CPA"|"CPA/CRG"|"CPL","cpa":num|null,"crg":num|null,"cpl":num|null,"funnels":[str],"cr":num|null,"deduction_limit":num|null}
+Percentages as decimals (13% -> 0.13).
+Shared context:"""
 
-Input Format:
-{
-    "shared_fields": {
-        "partner": string,
-        "language": string,
-        "source": string,
-        "model": string,
-        "deduction_limit": number|null
-    },
-    "deal_text": string
-}
 
-Output Format:
-{
-    "raw_text": string,
-    "parsed_data": {
-        "partner": string,
-        "region": "TIER1"|"TIER2"|"TIER3"|"LATAM"|"NORDICS"|"BALTICS",
-        "geo": string,
-        "language": string,
-        "source": string,
-        "pricing_model": "CPA"|"CPA/CRG"|"CPL",
-        "cpa": number|null,
-        "crg": number|null,
-        "cpl": number|null,
-        "funnels": string[],
-        "cr": number|null,
-        "deduction_limit": number|null
-    }
-}
-"""
+def compact_json(data: Dict) -> str:
+    """Minimal JSON: no whitespace, no empty values"""
+    return json.dumps({k: v for k, v in data.items() if v not in (None, '', [], {})},
+                      separators=(',', ':'), ensure_ascii=False, sort_keys=True)
+
+
+def check_structure_response(content: str) -> Optional[str]:
+    """Why a structure-analysis reply breaks the schema, or None if it is usable"""
+    try:
+        validate_structure(content)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def check_deal_response(content: str) -> Optional[str]:
+    """Why a deal-parsing reply breaks the schema, or None if it is usable"""
+    return deal_reply_error(content)
+
 
 class DealPrompts:
     @staticmethod
@@ -97,16 +95,9 @@ class DealPrompts:
     
     @staticmethod
     def create_parsing_prompt(deal_text: str, shared_context: Dict) -> List[Dict]:
-        formatted_context = json.dumps(shared_context, indent=2)
-        prompt = f"""Parse this deal using the shared context and rules.
-
-Shared Context:
-{formatted_context}
-
-Deal Text:
-{deal_text}"""
-        
+        """System prompt + shared context as one cacheable prefix, deal text as the user message"""
+        shared = shared_context.get("shared_fields", shared_context)
         return [
-            {"role": "system", "content": DEAL_PARSING_PROMPT},
-            {"role": "user", "content": prompt}
-        ]
\ No newline at end of file
+            {"role": "system", "content": DEAL_PARSING_PROMPT + compact_json(shared)},
+            {"role": "user", "content": deal_text}
+        ]
@@ -0,0 +1,59 @@
+"""Deterministic GEO -> region lookup.
+
+Country lists follow ``Deal Formatting.md``; anything not listed is TIER3.
+Multi-geo deals ("UK|IE|NL") take the highest-precedence region among
+their countries, so a Tier 1 country anywhere in the list makes the deal
+TIER1.
+
+Usage:
+    region_for("SE")          # 'NORDICS'
+    region_for("UK|IE|NL")    # 'TIER1'
+"""
+import re
+from typing import Dict, List, Optional
+
+REGION_COUNTRIES = {
+    'TIER1': ('AU', 'CA', 'FR', 'DE', 'IT', 'JP', 'NL', 'NZ', 'SG', 'ES', 'GB', 'US'),
+    'NORDICS': ('DK', 'FI', 'IS', 'NO', 'SE'),
+    'BALTICS': ('EE', 'LV', 'LT'),
+    'LATAM': ('AR', 'BO', 'BR', 'CL', 'CO', 'CR', 'CU', 'DO', 'EC', 'SV', 'GT', 'HN',
+              'MX', 'NI', 'PA', 'PY', 'PE', 'UY', 'VE'),
+}
+DEFAULT_REGION = 'TIER3'
+
+# Most specific/valuable region wins for multi-geo deals
+REGION_PRECEDENCE = ('TIER1', 'NORDICS', 'BALTICS', 'LATAM', DEFAULT_REGION)
+
+# Codes people use that are not the ISO 3166 alpha-2 code
+COUNTRY_ALIASES = {'UK': 'GB', 'EL': 'GR'}
+
+REGION_BY_COUNTRY: Dict[str, str] = {
+    country: region for region, countries in REGION_COUNTRIES.items() for country in countries
+}
+_RANK = {region: rank for rank, region in enumerate(REGION_PRECEDENCE)}
+_SEPARATORS = re.compile(r'[|,/+;\s]+')
+
+
+def split_geos(geo: Optional[str]) -> List[str]:
+    """Upper-cased country codes from a single or multi-geo string"""
+    if not geo:
+        return []
+    return [code for code in _SEPARATORS.split(str(geo).upper()) if code and code != '&']
+
+
+def canonical_country(code: str) -> str:
+    """ISO alpha-2 form of a country code ('uk' -> 'GB')"""
+    code = code.upper()
+    return COUNTRY_ALIASES.get(code, code)
+
+
+def country_region(code: str) -> str:
+    return REGION_BY_COUNTRY.get(canonical_country(code), DEFAULT_REGION)
+
+
+def region_for(geo: Optional[str]) -> Optional[str]:
+    """Region for a cleaned GEO; None when there is no GEO to go on"""
+    codes = split_geos(geo)
+    if not codes:
+        return None
+    return min((country_region(code) for code in codes), key=_RANK.__getitem__)
@@ -0,0 +1,147 @@
+"""Retry policy shared by every Notion call.
+
+Errors are classified as retryable (429 rate limits, 409 conflicts, 5xx,
+timeouts and connection errors) or fatal (validation, auth, not found).
+Retryable errors are retried with full-jitter exponential backoff, or
+after the server's ``Retry-After`` when one is sent.
+
+``pages.create`` is not idempotent: after a timeout or a 5xx the page may
+already exist, and creating it again duplicates the offer. Calls made
+with ``idempotent=False`` are therefore retried only when the request
+provably never reached Notion: a failed connect, a 429, or a 503 that
+sent ``Retry-After``.
+
+A RetryBudget caps the total number of retries spent on one batch, so a
+Notion outage fails the remaining deals fast (the outbox picks them up
+later) instead of stalling the whole batch in backoff.
+
+Usage:
+    policy = RetryPolicy()
+    retry = policy.for_batch(len(deals))
+    page = retry.call("pages.create", client.pages.create, idempotent=False, parent=..., properties=...)
+"""
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import httpx
+
+from bot.metrics import NOTION_RETRIES
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = frozenset({409, 429, 500, 502, 503, 504})
+# Failures that happen before the request is sent, so nothing was written
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed is None:
+        return None
+    return max(0.0, parsed.timestamp() - (now if now is not None else time.time()))
+
+
+def classify(exc: BaseException, idempotent: bool = True) -> Tuple[bool, Optional[float], str]:
+    """Return (retryable, retry_after_seconds, reason) for an exception from a Notion call.
+
+    With idempotent=False only failures that wrote nothing are retryable.
+    """
+    status = getattr(exc, 'status', None)
+    if isinstance(status, int):
+        headers = getattr(exc, 'headers', None) or {}
+        retry_after = parse_retry_after(headers.get('retry-after') or headers.get('Retry-After'))
+        if not idempotent:
+            return status == 429 or (status == 503 and retry_after is not None), retry_after, str(status)
+        return status in RETRYABLE_STATUSES, retry_after, str(status)
+    if isinstance(exc, _NOT_SENT):
+        return True, None, 'connection'
+    if isinstance(exc, httpx.TimeoutException) or type(exc).__name__ == 'RequestTimeoutError':
+        return idempotent, None, 'timeout'
+    if isinstance(exc, httpx.TransportError):
+        return idempotent, None, 'connection'
+    return False, None, type(exc).__name__
+
+
+class RetryBudget:
+    """Shared allowance of retries for one batch of calls"""
+
+    def __init__(self, retries: int):
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0,
+                 budget_ratio: float = 0.5, min_budget: int = 3, budget: Optional[RetryBudget] = None,
+                 sleep: Callable[[float], None] = time.sleep, rng: Optional[random.Random] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_budget = min_budget
+        self.budget = budget
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+
+    def for_batch(self, size: int) -> 'RetryPolicy':
+        """Copy of this policy with a fresh budget sized for a batch of `size` items"""
+        retries = max(self.min_budget, int(size * self.budget_ratio))
+        return RetryPolicy(self.max_attempts, self.base_delay, self.max_delay, self.budget_ratio,
+                           self.min_budget, RetryBudget(retries), self.sleep, self.rng)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number `attempt` (1-based)"""
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        # Full jitter: uniform in [0, base * 2^(attempt-1)]
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def call(self, operation: str, func: Callable, *args, idempotent: bool = True, **kwargs):
+        """Call func, retrying retryable errors until attempts or the batch budget run out.
+
+        Pass idempotent=False for calls such as pages.create that must not run twice.
+        """
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                retryable, retry_after, reason = classify(e, idempotent)
+                if not retryable:
+                    raise
+                if attempt >= self.max_attempts:
+                    NOTION_RETRIES.inc(operation=operation, outcome='exhausted')
+                    raise
+                if self.budget is not None and not self.budget.try_spend():
+                    NOTION_RETRIES.inc(operation=operation, outcome='budget_exhausted')
+                    logger.warning("Retry budget exhausted, giving up on %s after %s", operation, reason)
+                    raise
+                delay = self.backoff(attempt, retry_after)
+                NOTION_RETRIES.inc(operation=operation, outcome='retried')
+                logger.info("Retrying %s in %.2fs after %s (attempt %d/%d)",
+                            operation, delay, reason, attempt, self.max_attempts)
+                if delay > 0:
+                    self.sleep(delay)
+                attempt += 1
@@ -6,8 +6,29 @@ from enum import Enum, auto
 import logging
 import re
 
+from bot.callbacks import decode
+
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)  # Change from INFO to DEBUG
+
+CALLBACK_TYPES = {
+    'approve': 'action',
+    'reject': 'action',
+    'edit': 'edit',
+    'editfield': 'edit',
+    'editmodel': 'edit',
+    'setmodel': 'edit',
+    'next': 'navigation',
+    'prev': 'navigation',
+    'back': 'back',
+    'submit': 'final',
+    'discard': 'final',
+    'reprocess': 'final',
+    'page': 'bulk',
+    'toggle': 'bulk',
+    'approve_page': 'bulk',
+    'approve_valid': 'bulk',
+    'summary': 'final',
+}
 
 class DataFormat(Enum):
     STRUCTURED = auto()    # data.md format (TIER1-Genio-SG...)
@@ -93,7 +114,7 @@ class DealRouter:
         """Enhanced message routing with better callback handling"""
         # For callbacks (button clicks)
         if update.callback_query:
-            logger.info(f"Processing callback query: {update.callback_query.data}")
+            logger.debug("Processing callback query: %s", update.callback_query.data)
             
             # Always route callbacks to complex handler for better compatibility
             return 'complex', None
@@ -116,13 +137,13 @@ class DealRouter:
         
         # Detect format for new messages
         detection_result = DealRouter.detect_format(text)
-        logger.info(f"Format detection result: {detection_result}")
+        logger.debug("Format detection result: %s", detection_result)
         
         if detection_result.format_type == DataFormat.STRUCTURED:
-            logger.info(f"Routing to simple flow: {text}")
+            logger.info("Routing to simple flow (%d chars)", len(text))
             return 'simple', text
         elif detection_result.format_type == DataFormat.UNSTRUCTURED:
-            logger.info(f"Routing to complex flow: {text}")
+            logger.info("Routing to complex flow (%d chars)", len(text))
             return 'complex', text
         else:
             logger.info("Invalid format detected")
@@ -141,16 +162,7 @@ class DealRouter:
     @staticmethod
     def get_callback_type(callback_data: str) -> str:
         """Helper to identify callback button type"""
-        if not callback_data:
+        callback = decode(callback_data)
+        if callback is None:
             return 'unknown'
-            
-        if callback_data.startswith(('approve_', 'reject_')):
-            return 'action'
-        elif callback_data.startswith(('edit_', 'editfield_')):
-            return 'edit'
-        elif callback_data.startswith(('next_', 'prev_')):
-            return 'navigation'
-        elif callback_data.startswith('back_'):
-            return 'back'
-        else:
-            return 'unknown'
\ No newline at end of file
+        return CALLBACK_TYPES.get(callback.action, 'unknown')
@@ -0,0 +1,223 @@
+"""Pydantic schemas for LLM replies and Notion submissions.
+
+The models are compiled once into TypeAdapters. Each batch is checked in
+a single call: every deal reply of a message, or every submission handed
+to ``submit_deals``. Values are coerced on the way in ("1 300" ->
+1300.0, "13%" -> 0.13, a funnel string -> a list). A deal that cannot be
+coerced comes back with a precise error such as
+``cpa: Input should be a valid number (got 'ask')``. It is rejected
+before any Notion call is made.
+
+Usage:
+    structure = validate_structure(reply)              # raises ValueError
+    deals, errors = validate_deals(replies)            # errors: {index: message}
+    submissions, errors = validate_submissions(deals)
+"""
+import json
+import logging
+import re
+from typing import Annotated, Any, Dict, List, Optional, Tuple, Union
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter, ValidationError, model_validator
+
+from bot.models import PRICING_MODELS
+
+logger = logging.getLogger(__name__)
+
+PRICE_FIELDS = ('cpa', 'crg', 'cpl')
+
+_RANGE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*-\s*(\d+(?:\.\d+)?)\s*$')
+_NUMBER_NOISE = re.compile(r'[\s$€£,]')
+
+
+def _blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and value.strip() in ('', '&', 'null', 'None'))
+
+
+def _number(value: Any) -> Any:
+    """'$1,300' -> '1300'; blanks -> None; anything else is left for pydantic to judge"""
+    if _blank(value):
+        return None
+    if isinstance(value, str):
+        return _NUMBER_NOISE.sub('', value).rstrip('%')
+    return value
+
+
+def _percent(value: Any) -> Any:
+    """'13%' / 13 / '10-12' -> 0.13 / 0.13 / 0.11; fractions pass through"""
+    value = _number(value)
+    if isinstance(value, str):
+        match = _RANGE.match(value)
+        if match:
+            value = (float(match.group(1)) + float(match.group(2))) / 2
+        else:
+            try:
+                value = float(value)
+            except ValueError:
+                return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return round(value / 100 if value > 1 else float(value), 4)
+    return value
+
+
+def _text(value: Any) -> Any:
+    """None for blanks; lists ('Facebook', 'Google') joined with '|'"""
+    if isinstance(value, (list, tuple)):
+        value = '|'.join(str(v).strip() for v in value if not _blank(v))
+    if _blank(value):
+        return None
+    return value.strip() if isinstance(value, str) else value
+
+
+def _list(value: Any) -> Any:
+    if _blank(value):
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in re.split(r'[,|]', value) if part.strip()]
+    return value
+
+
+def _pricing_model(value: Any) -> Any:
+    if _blank(value):
+        return None
+    model = PRICING_MODELS.get(str(value).strip().lower())
+    if model is None:
+        raise ValueError("unknown pricing model, expected one of CPA, CPA/CRG, CPL")
+    return model
+
+
+Number = Annotated[Optional[float], BeforeValidator(_number)]
+Percent = Annotated[Optional[float], BeforeValidator(_percent)]
+Text = Annotated[Optional[str], BeforeValidator(_text)]
+
+
+class ParsedDeal(BaseModel):
+    """One deal as returned by the deal-parsing prompt"""
+    model_config = ConfigDict(extra='ignore', coerce_numbers_to_str=True)
+
+    partner: Text = None
+    region: Text = None
+    geo: Text = None
+    language: Text = None
+    source: Text = None
+    pricing_model: Annotated[Optional[str], BeforeValidator(_pricing_model)] = None
+    cpa: Number = None
+    crg: Percent = None
+    cpl: Number = None
+    funnels: Annotated[List[str], BeforeValidator(_list)] = Field(default_factory=list)
+    cr: Percent = None
+    deduction_limit: Percent = None
+
+
+class DealBlock(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    text: str = Field(min_length=1)
+
+
+class Section(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    shared_fields: Annotated[Dict[str, Any], BeforeValidator(lambda v: v or {})] = Field(default_factory=dict)
+    deal_blocks: List[DealBlock]
+
+
+class Structure(BaseModel):
+    """Reply of the structure-analysis prompt"""
+    sections: List[Section] = Field(min_length=1)
+
+    @model_validator(mode='after')
+    def _has_blocks(self) -> 'Structure':
+        if not any(section.deal_blocks for section in self.sections):
+            raise ValueError("no deal blocks")
+        return self
+
+
+class Submission(BaseModel):
+    """One deal as handed to StructuredDealParser.submit_deals"""
+    model_config = ConfigDict(extra='allow', str_strip_whitespace=True, coerce_numbers_to_str=True)
+
+    company_name: str = Field(min_length=1)
+    geo: str = Field(min_length=1)
+    language: Union[str, List[str]] = ''
+    sources: Union[str, List[str]] = ''
+    cpa_buying: Number = None
+    crg_buying: Number = None
+    cpl_buying: Number = None
+    deduction: Number = None
+
+
+STRUCTURE = TypeAdapter(Structure)
+DEAL = TypeAdapter(ParsedDeal)
+DEALS = TypeAdapter(List[ParsedDeal])
+SUBMISSIONS = TypeAdapter(List[Submission])
+
+
+def describe(error: Dict[str, Any], skip: int = 0) -> str:
+    """'cpa: Input should be a valid number (got 'ask')' from one pydantic error"""
+    location = '.'.join(str(part) for part in error['loc'][skip:])
+    message = error['msg']
+    if error['type'] not in ('missing', 'json_invalid') and not isinstance(error.get('input'), (dict, list)):
+        message = f"{message} (got {error.get('input')!r})"
+    return f"{location}: {message}" if location else message
+
+
+def _errors_by_item(exc: ValidationError) -> Dict[int, str]:
+    errors: Dict[int, List[str]] = {}
+    for error in exc.errors():
+        errors.setdefault(error['loc'][0], []).append(describe(error, skip=1))
+    return {index: '; '.join(messages) for index, messages in errors.items()}
+
+
+def _validate_batch(adapter: TypeAdapter, items: List[Any]) -> Tuple[List[Optional[BaseModel]], Dict[int, str]]:
+    """Validate a list in one call; a second call re-validates the good items if any failed"""
+    try:
+        return adapter.validate_python(items), {}
+    except ValidationError as e:
+        errors = _errors_by_item(e)
+    good = [index for index in range(len(items)) if index not in errors]
+    checked: List[Optional[BaseModel]] = [None] * len(items)
+    for index, model in zip(good, adapter.validate_python([items[index] for index in good])):
+        checked[index] = model
+    return checked, errors
+
+
+def validate_deals(items: List[Any]) -> Tuple[List[Optional[Dict[str, Any]]], Dict[int, str]]:
+    """Coerced parsed_data dicts (None where invalid) and {index: error}"""
+    models, errors = _validate_batch(DEALS, items)
+    return [model.model_dump() if model is not None else None for model in models], errors
+
+
+def validate_submissions(items: List[Any]) -> Tuple[List[Optional[Dict[str, Any]]], Dict[int, str]]:
+    """Coerced submission dicts (None where invalid) and {index: error}"""
+    models, errors = _validate_batch(SUBMISSIONS, items)
+    return [model.model_dump() if model is not None else None for model in models], errors
+
+
+def validate_structure(content: Union[str, bytes]) -> Dict[str, Any]:
+    """Parse and validate a structure reply in one pass; ValueError says what is wrong"""
+    try:
+        return STRUCTURE.validate_json(content).model_dump()
+    except ValidationError as e:
+        raise ValueError(describe(e.errors()[0])) from None
+
+
+def deal_reply_error(content: Union[str, bytes]) -> Optional[str]:
+    """Why a deal-parsing reply is unusable, or None; used to escalate the model cascade"""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return "invalid JSON"
+    if isinstance(data, dict):
+        data = data.get('parsed_data', data)
+    if not isinstance(data, dict):
+        return "not an object"
+    try:
+        deal = DEAL.validate_python(data)
+    except ValidationError as e:
+        return describe(e.errors()[0])
+    if not deal.geo:
+        return "missing geo"
+    if not any(getattr(deal, field) for field in PRICE_FIELDS):
+        return "no price"
+    return None
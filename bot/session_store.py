@@ -0,0 +1,104 @@
+"""Review sessions saved across a restart.
+
+On shutdown MainBot saves every open review session (parsed deals,
+statuses, position and session version) to SQLite. On the next start they
+are loaded back into MessageHandler, so a redeploy in the middle of a
+review does not throw away the LLM output, and the buttons already in the
+chat keep working because the session version is preserved.
+
+Sessions are taken (read and deleted) on start, so each one is restored
+once at most; sessions older than the handler's timeout are dropped.
+
+Usage:
+    store = get_session_store()
+    store.save(handler.export_sessions())
+    ...
+    handler.restore_sessions(store.take())
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from bot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_sessions (
+    user_id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    saved_at REAL NOT NULL
+);
+"""
+
+
+class SessionStore:
+    """SQLite table of serialized review sessions, one row per user"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def save(self, sessions: Dict[int, Dict[str, Any]]) -> int:
+        """Replace the stored sessions with these; returns how many were saved"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM review_sessions")
+                self._conn.executemany(
+                    "INSERT INTO review_sessions (user_id, payload, saved_at) VALUES (?, ?, ?)",
+                    [(user_id, json.dumps(session, default=str), now) for user_id, session in sessions.items()],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if sessions:
+            logger.info("Saved %d open review sessions", len(sessions))
+        return len(sessions)
+
+    def take(self) -> Dict[int, Dict[str, Any]]:
+        """Load and delete every stored session"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute("SELECT user_id, payload FROM review_sessions").fetchall()
+                self._conn.execute("DELETE FROM review_sessions")
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        sessions = {}
+        for row in rows:
+            try:
+                sessions[row['user_id']] = json.loads(row['payload'])
+            except ValueError as e:
+                logger.warning("Dropping unreadable session for user %s: %s", row['user_id'], e)
+        return sessions
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide session store at SESSION_STORE_PATH (default sessions.db)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore(get_settings().session_store_path)
+    return _store
@@ -0,0 +1,78 @@
+"""Process-wide configuration, loaded once.
+
+get_settings() reads the .env file (if python-dotenv is available) and the
+environment a single time and returns an immutable Settings object; every
+entry point and module shares that instance instead of calling
+load_dotenv()/os.getenv() on import.
+"""
+import os
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import List, Optional
+
+
+@dataclass(frozen=True)
+class Settings:
+    telegram_bot_token: Optional[str] = None
+    notion_token: Optional[str] = None
+    offers_database_id: Optional[str] = None
+    advertisers_database_id: Optional[str] = None
+    mistral_api_key: Optional[str] = None
+    mistral_replay_file: Optional[str] = None
+    # Model cascade, cheapest first; the last tier's answer is always accepted
+    mistral_models: str = 'mistral-small-latest,mistral-large-latest'
+    # Hedge Mistral calls slower than this latency percentile (0 disables)
+    mistral_hedge_percentile: int = 0
+    mistral_hedge_max_rate: float = 0.05
+    webhook_secret: Optional[str] = None
+    # Webhook messages older than this many seconds are dropped unparsed (0 keeps all)
+    webhook_max_age: int = 30
+    environment: Optional[str] = None
+    trace_export: Optional[str] = None
+    log_level: Optional[str] = None
+    log_format: Optional[str] = None
+    log_levels: Optional[str] = None
+    log_payload_sample: int = 100
+    outbox_path: str = 'outbox.db'
+    mirror_path: str = 'mirror.db'
+    # Seconds between incremental syncs of the Notion mirror (0 disables polling)
+    mirror_sync_interval: int = 300
+    session_store_path: str = 'sessions.db'
+    history_path: str = 'history.db'
+    # Seconds shutdown waits for in-flight updates and the outbox batch being submitted
+    drain_timeout: int = 25
+
+    @classmethod
+    def from_env(cls) -> 'Settings':
+        """Build settings from environment variables named after each field"""
+        values = {}
+        for field in fields(cls):
+            value = os.environ.get(field.name.upper())
+            if value is None or value == '':
+                continue
+            values[field.name] = field.type(value) if field.type in (int, float) else value
+        return cls(**values)
+
+    @property
+    def is_production(self) -> bool:
+        return self.environment == 'production'
+
+    @property
+    def mistral_model_tiers(self) -> List[str]:
+        return [model.strip() for model in self.mistral_models.split(',') if model.strip()]
+
+    def missing(self, *names: str) -> List[str]:
+        """Return the environment variable names among `names` that are unset"""
+        return [name.upper() for name in names if not getattr(self, name)]
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Load .env once and return the shared Settings"""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        pass
+    else:
+        load_dotenv()
+    return Settings.from_env()
@@ -1,118 +1,46 @@
 import os
 import logging
 from typing import List, Dict, Any
-from dataclasses import dataclass
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 import asyncio
-import dotenv
 from datetime import datetime
 import time
-from bot.structured_deal_parser import StructuredDealParser as DealService
+from bot.logging_config import setup_logging, log_payload
+from bot.settings import get_settings
+from bot.clients import get_structured_parser
+from bot.models import Deal
+from bot.history import PARSED, SUBMITTED, get_history
+from bot.outbox import get_outbox
 import json
 
-# Load environment variables
-dotenv.load_dotenv()
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-@dataclass
-class Deal:
-    region: str
-    partner: str
-    geo: str
-    language: str
-    source: str
-    pricing_model: str
-    cpa: float = None
-    crg: float = None
-    cpl: float = None
-    funnels: List[str] = None
-    cr: str = None
-    deduction_limit: float = None
-    
-    @property
-    def is_valid(self) -> bool:
-        """Check if deal has all required fields based on pricing model"""
-        # Log validation details for debugging
-        logger.debug(f"Validating deal: {self.__dict__}")
-        
-        # Basic required fields
-        if not all([self.region, self.partner, self.geo, self.language]):
-            logger.debug("Missing basic required fields")
-            return False
-            
-        if not self.source or self.source == "&":
-            logger.debug("Missing or invalid source")
-            return False
-            
-        # Make funnels validation more flexible
-        if self.funnels:
-            if isinstance(self.funnels, list) and (not self.funnels or self.funnels == ["&"]):
-                logger.debug("Empty or invalid funnels list")
-                return False
-            elif isinstance(self.funnels, str) and (not self.funnels or self.funnels == "&"):
-                logger.debug("Empty or invalid funnels string")
-                return False
-        else:
-            logger.debug("Missing funnels")
-            return False
-            
-        # Validate based on pricing model
-        if self.pricing_model == "cpa_crg":
-            valid = bool(self.cpa and self.crg)
-            if not valid:
-                logger.debug("Missing CPA or CRG for cpa_crg model")
-            return valid
-        elif self.pricing_model == "cpa":
-            valid = bool(self.cpa)
-            if not valid:
-                logger.debug("Missing CPA for cpa model")
-            return valid
-        elif self.pricing_model == "cpl":
-            valid = bool(self.cpl)
-            if not valid:
-                logger.debug("Missing CPL for cpl model")
-            return valid
-            
-        logger.debug("Invalid pricing model")
-        return False
-
 class SimpleDealBot:
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, deal_service=None):
         self.debug = debug
         if debug:
             logging.getLogger().setLevel(logging.DEBUG)
             
-        self._validate_env()
-        self.deal_parser = DealService(
-            notion_token=os.getenv("NOTION_TOKEN"),
-            database_id=os.getenv("OFFERS_DATABASE_ID"),
-            kitchen_database_id=os.getenv("ADVERTISERS_DATABASE_ID")
-        )
+        if deal_service is None:
+            self._validate_env()
+        self._deal_service = deal_service
         # Add rate limiting
         self.last_request_time = 0
         self.min_request_interval = 0.5  # seconds
         
+    @property
+    def deal_parser(self):
+        """Notion deal service, created on first use"""
+        if self._deal_service is None:
+            self._deal_service = get_structured_parser()
+        return self._deal_service
+
     def _validate_env(self):
         """Validate required environment variables exist"""
-        # Update to match your .env file
-        required_vars = ["TELEGRAM_BOT_TOKEN", "NOTION_TOKEN", "OFFERS_DATABASE_ID", "ADVERTISERS_DATABASE_ID"]
-        
-        # Add debug print
-        print("\nEnvironment variables:")
-        for var in required_vars:
-            value = os.getenv(var)
-            print(f"{var}: {value}")
-            if value:
-                print(f"Length: {len(value)}")
-        
-        missing = [var for var in required_vars if not os.getenv(var)]
+        missing = get_settings().missing(
+            "telegram_bot_token", "notion_token", "offers_database_id", "advertisers_database_id"
+        )
         if missing:
             raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
 
@@ -182,6 +110,153 @@ class SimpleDealBot:
             logger.error(f"Error reading Deal Formatting.md: {str(e)}")
             await update.message.reply_text("❌ Sorry, I couldn't access the formatting guide at the moment.")
 
+    @staticmethod
+    def _offer_filters(args: List[str]) -> Dict[str, str]:
+        """Turn /offers arguments into mirror filters.
+
+        Accepts geo=, source= and partner= (partner may contain spaces). Bare
+        words are sources when they are known source names (FB, GG, ...),
+        otherwise two-letter words are GEOs and anything else a source.
+        """
+        from bot.client import FieldValidator
+        filters_, key = {}, None
+        for arg in args:
+            name, sep, value = arg.partition('=')
+            if sep and name.lower() in ('geo', 'source', 'partner'):
+                key = name.lower()
+                filters_[key] = value
+            elif key == 'partner':
+                filters_[key] = f"{filters_[key]} {arg}".strip()
+            elif arg.lower() in FieldValidator.SOURCE_MAPPING:
+                filters_['source'] = arg.lower()
+            elif len(arg) == 2 and arg.isalpha():
+                filters_['geo'] = arg.upper()
+            else:
+                filters_['source'] = arg
+        if filters_.get('source'):
+            filters_['source'] = FieldValidator.clean_source(filters_['source'])
+        return {k: v for k, v in filters_.items() if v}
+
+    @staticmethod
+    def _format_offer(offer: Dict[str, Any]) -> str:
+        prices = []
+        if offer['cpa'] is not None:
+            prices.append(f"CPA {offer['cpa']:g}")
+        if offer['crg']:
+            prices.append(f"CRG {offer['crg']:.0%}")
+        if offer['cpl'] is not None:
+            prices.append(f"CPL {offer['cpl']:g}")
+        return f"• {offer['code']} | {offer['partner'] or '?'} | {' + '.join(prices) or 'no price'}"
+
+    async def offers(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Look up active offers in the local Notion mirror.
+
+        Command: /offers [GEO] [source] [partner=Name]
+        Description: List active offers matching a GEO, source and/or partner,
+        e.g. "/offers DE Facebook". Answers from the mirror without calling Notion.
+        """
+        from bot.mirror import get_mirror
+        mirror = get_mirror()
+        synced_at = mirror.last_synced()
+        if synced_at is None:
+            await update.message.reply_text("⏳ The offer list is still syncing from Notion. Try again in a minute.")
+            return
+
+        filters_ = self._offer_filters(context.args or [])
+        if not filters_:
+            await update.message.reply_text(
+                "Usage: /offers [GEO] [source] [partner=Name]\nExample: /offers DE Facebook"
+            )
+            return
+
+        start = time.perf_counter()
+        offers = mirror.find_offers(limit=30, **filters_)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info("/offers %s: %d offers in %.1fms", filters_, len(offers), elapsed_ms)
+
+        query = ", ".join(f"{k}={v}" for k, v in filters_.items())
+        if not offers:
+            await update.message.reply_text(f"No active offers for {query}.")
+            return
+        lines = [f"📦 {len(offers)} active offers for {query}" + (" (first 30)" if len(offers) == 30 else ""), ""]
+        lines.extend(self._format_offer(offer) for offer in offers)
+        minutes = int((time.time() - synced_at) // 60)
+        lines.append(f"\nSynced from Notion {minutes} min ago")
+        await update.message.reply_text("\n".join(lines)[:4096])
+
+    @staticmethod
+    def _history_filter(args: List[str]) -> Dict[str, str]:
+        """'/history DE' -> GEO, '/history FTD Company' -> partner; geo= / partner= force either"""
+        text = " ".join(args).strip()
+        name, sep, value = text.partition('=')
+        if sep and name.strip().lower() in ('geo', 'partner'):
+            return {name.strip().lower(): value.strip()} if value.strip() else {}
+        if len(text) == 2 and text.isalpha():
+            return {'geo': text.upper()}
+        return {'partner': text} if text else {}
+
+    @staticmethod
+    def _format_history(stats: Dict[str, Any]) -> str:
+        def price(p: str, value) -> str:
+            if value is None:
+                return "–"
+            return f"{value:.0%}" if p == 'crg' else f"{value:g}" if float(value).is_integer() else f"{value:.1f}"
+
+        def day(ts: float) -> str:
+            return datetime.fromtimestamp(ts).strftime('%Y-%m-%d')
+
+        subject = f"GEO {stats['geo']}" if stats['geo'] else stats['partner']
+        lines = [
+            f"📈 History for {subject}",
+            f"Parsed {stats['parsed']} · submitted {stats['submitted']} · {day(stats['first'])} → {day(stats['last'])}",
+            "",
+        ]
+        basis = "submitted" if stats['basis'] == 'submitted' else "parsed (none submitted yet)"
+        lines.append(f"💵 Prices of {basis} deals (min / avg / max):")
+        for p, values in stats['prices'].items():
+            lines.append(f"• {p.upper()}: {price(p, values['min'])} / {price(p, values['avg'])} / "
+                         f"{price(p, values['max'])} ({values['n']} deals)")
+        if stats['monthly']:
+            lines.extend(["", "🗓 By month (deals, avg CPA, avg CRG, avg CPL):"])
+            lines.extend(f"• {row['month']}: {row['n']}, {price('cpa', row['cpa'])}, {price('crg', row['crg'])}, "
+                         f"{price('cpl', row['cpl'])}" for row in stats['monthly'])
+        if stats['top']:
+            lines.extend(["", f"🏷 Top {'partners' if stats['breakdown'] == 'partner' else 'GEOs'}:"])
+            lines.extend(f"• {row['label'] or '?'}: {row['n']} deals, CPA {price('cpa', row['cpa'])}, "
+                         f"CRG {price('crg', row['crg'])}, last {day(row['last'])}" for row in stats['top'])
+        if stats['recent']:
+            lines.extend(["", "🕘 Latest:"])
+            lines.extend(f"• {day(row['recorded_at'])} {row['partner'] or '?'} {row['geo'] or '?'} "
+                         f"CPA {price('cpa', row['cpa'])} CRG {price('crg', row['crg'])} CPL {price('cpl', row['cpl'])}"
+                         for row in stats['recent'])
+        return "\n".join(lines)
+
+    async def history(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Show price history from the local deal history.
+
+        Command: /history <partner|GEO>
+        Description: Deal counts, price ranges, monthly averages and the latest
+        deals for a partner or a GEO, e.g. "/history DE" or "/history FTD Company".
+        """
+        filter_ = self._history_filter(context.args or [])
+        if not filter_:
+            await update.message.reply_text(
+                "Usage: /history <partner|GEO>\nExamples: /history DE, /history FTD Company, /history partner=AB"
+            )
+            return
+
+        start = time.perf_counter()
+        stats = get_history().stats(**filter_)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info("/history %s: %d parsed, %d submitted in %.1fms",
+                    filter_, stats['parsed'], stats['submitted'], elapsed_ms)
+
+        if not (stats['parsed'] or stats['submitted']):
+            subject = ", ".join(f"{k}={v}" for k, v in filter_.items())
+            await update.message.reply_text(f"No deal history for {subject}.")
+            return
+        await update.message.reply_text(self._format_history(stats)[:4096])
+
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle incoming messages containing deal strings."""
         try:
@@ -218,14 +293,14 @@ class SimpleDealBot:
             total_deals = len(deal_strings)
             for idx, deal_string in enumerate(deal_strings, 1):
                 # Add debug logging
-                logger.debug(f"Processing deal {idx}/{total_deals}: {deal_string}")
+                logger.debug("Processing deal %d/%d: %s", idx, total_deals, deal_string)
                 
                 deal, error = self.parse_deal_string(deal_string)
                 if deal:
-                    logger.debug(f"Successfully parsed deal: {deal.__dict__}")
+                    log_payload(logger, "Successfully parsed deal: %r", deal)
                     valid_deals.append(deal)
                 else:
-                    logger.error(f"Failed to parse deal: {error}")
+                    logger.warning("Failed to parse deal: %s", error)
                     invalid_deals.append(deal_string)
                     error_messages.append(
                         f"Deal #{idx}:\n"
@@ -234,6 +309,9 @@ class SimpleDealBot:
                         f"❌ Error:\n{error}\n"
                     )
 
+            user_id = update.effective_user.id if update.effective_user else None
+            get_history().record(valid_deals, PARSED, user_id=user_id, flow='structured')
+
             if not valid_deals:
                 error_summary = "❌ No valid deals found.\n\n"
                 error_summary += "Issues found:\n\n"
@@ -266,66 +344,25 @@ class SimpleDealBot:
                     await processing_msg.edit_text(warning)
                     await asyncio.sleep(3)  # Give users time to read the warning
 
-            # Update processing message for Notion submission
-            await processing_msg.edit_text(
-                "🔄 Processing Submission...\n\n"
-                "1️⃣ Collecting approved deals..."
-            )
-
-            # Prepare deals
-            deal_data = self._prepare_deal_data(valid_deals)
-
-            await processing_msg.edit_text(
-                "🔄 Processing Submission...\n\n"
-                "1️⃣ Approved deals collected\n"
-                "2️⃣ Initializing Notion connection..."
-            )
-
-            # Add timing
+            # Commit to the durable outbox; the drainer pushes to Notion in the
+            # background and notify_submission reports back to this chat
             start_time = time.time()
-
-            # Submit to Notion with progress updates
-            total_valid = len(valid_deals)
-            for idx, deal in enumerate(valid_deals, 1):
-                progress = int((idx / total_valid) * 10)
-                progress_bar = "▓" * progress + "░" * (10 - progress)
-                
-                await processing_msg.edit_text(
-                    "🔄 Processing Submission...\n\n"
-                    "1️⃣ Approved deals collected\n"
-                    "2️⃣ Notion connection established\n"
-                    "3️⃣ Submitting deals...\n\n"
-                    f"Progress: [{progress_bar}] {idx}/{total_valid}\n"
-                    f"Current: {deal.partner}"
-                )
-                
-                # Convert Deal object to dictionary before submission
-                deal_dict = {
-                    'company_name': deal.partner,
-                    'geo': deal.geo,
-                    'language': deal.language,
-                    'sources': deal.source,
-                    'funnels': deal.funnels,
-                    'cpa_buying': deal.cpa,
-                    'crg_buying': deal.crg,
-                    'cpl_buying': deal.cpl,
-                    'deduction': deal.deduction_limit
-                }
-                
-                # Submit each deal individually
-                logger.debug(f"Attempting to submit deal: {deal_dict}")
-                result = self.deal_parser.submit_deals([deal_dict])
-                logger.debug(f"Submission result: {result}")
-
-            completion_time = time.time() - start_time
+            chat_id = update.effective_chat.id if update.effective_chat else None
+            submissions = [deal.to_submission(clean=False) for deal in valid_deals]
+            log_payload(logger, "Queueing deals: %s", submissions)
+            batch_id = get_outbox().enqueue(user_id, chat_id, submissions)
+            get_history().record(valid_deals, SUBMITTED, user_id=user_id, flow='structured')
+            logger.info("Queued batch %s in %.3f seconds", batch_id, time.time() - start_time)
 
             # Create summary message
-            summary = "✅ Submission Complete!\n\n"
+            summary = "📥 Submission Queued!\n\n"
             summary += f"📊 Results:\n"
             summary += f"• Total Deals: {len(deal_strings)}\n"
-            summary += f"• Successfully Processed: {len(valid_deals)}\n"
+            summary += f"• Queued for Notion: {len(valid_deals)}\n"
             summary += f"• Failed to Process: {len(invalid_deals)}\n"
+            summary += f"🧾 Batch: {batch_id}\n"
             summary += "━━━━━━━━━━━━━━\n\n"
+            summary += "You'll get a message here once they are confirmed in Notion.\n\n"
 
             # Only add failed deals and their errors
             if invalid_deals:
@@ -345,109 +382,13 @@ class SimpleDealBot:
     def parse_deal_string(self, deal_string: str) -> tuple[Deal, str]:
         """Parse a single deal string into a Deal object and return error message if any"""
         try:
-            # Validate basic string format
-            if not deal_string or not isinstance(deal_string, str):
-                return None, "Invalid deal string format"
-            
-            # Split the string on hyphens
-            fields = [f.strip() for f in deal_string.split("-")]
-            if len(fields) != 12:
-                return None, f"Expected 12 fields, got {len(fields)}"
-            
-            # Convert CPA/CPL to float if not "&"
-            try:
-                cpa = float(fields[6]) if fields[6] != "&" else None
-                cpl = float(fields[8]) if fields[8] != "&" else None
-            except ValueError:
-                return None, f"Invalid CPA '{fields[6]}' or CPL '{fields[8]}' value. Must be a number or '&'"
-            
-            # Convert CRG to float and handle percentage
-            crg = fields[7]
-            if crg != "&":
-                try:
-                    crg = float(crg)
-                    if crg > 1:  # Convert percentage to decimal
-                        crg = crg / 100
-                except ValueError:
-                    return None, f"Invalid CRG value '{fields[7]}'. Must be a number or '&'"
-            else:
-                crg = None
-                
-            # Handle funnels list
-            funnels = fields[9].split("|") if fields[9] != "&" else None
-            
-            # Convert deduction limit
-            deduction = fields[11]
-            if deduction != "&":
-                try:
-                    deduction = float(deduction)
-                    if deduction > 1:  # Convert percentage to decimal
-                        deduction = deduction / 100
-                except ValueError:
-                    return None, f"Invalid deduction limit '{fields[11]}'. Must be a number or '&'"
-            else:
-                deduction = None
-                
-            deal = Deal(
-                region=fields[0],
-                partner=fields[1],
-                geo=fields[2],
-                language=fields[3],
-                source=fields[4],
-                pricing_model=fields[5],
-                cpa=cpa,
-                crg=crg,
-                cpl=cpl,
-                funnels=funnels,
-                cr=fields[10],
-                deduction_limit=deduction
-            )
-            
-            if not deal.is_valid:
-                missing = []
-                if not all([deal.region, deal.partner, deal.geo, deal.language]):
-                    missing.extend([
-                        "region" if not deal.region else None,
-                        "partner" if not deal.partner else None,
-                        "geo" if not deal.geo else None,
-                        "language" if not deal.language else None
-                    ])
-                if not deal.source or deal.source == "&":
-                    missing.append("source")
-                if not deal.funnels or deal.funnels == ["&"]:
-                    missing.append("funnels")
-                    
-                missing = [m for m in missing if m]  # Remove None values
-                return None, f"Missing required fields: {', '.join(missing)}"
-            
-            return deal, None
+            return Deal.from_dash_string(deal_string)
             
         except Exception as e:
             logger.error(f"Error parsing deal string: {str(e)}")
             logger.error(f"Problematic string: {deal_string}")
             return None, f"Error parsing deal: {str(e)}"
 
-    def _prepare_deal_data(self, deals: List[Deal]) -> List[Dict]:
-        """Prepare deals for submission"""
-        formatted_deals = []
-        for deal in deals:
-            if deal is not None:
-                formatted_deal = {
-                    "company_name": deal.partner,
-                    "geo": deal.geo,
-                    "language": deal.language,
-                    "source": deal.source,
-                    "funnels": deal.funnels if isinstance(deal.funnels, list) else [deal.funnels] if deal.funnels else [],
-                    "cpa": deal.cpa,
-                    "crg": deal.crg,
-                    "cpl": deal.cpl,
-                    "deduction": deal.deduction_limit
-                }
-                formatted_deals.append(formatted_deal)
-            else:
-                logger.warning("Skipping None deal")
-        return formatted_deals
-
     async def _rate_limit(self):
         """Simple rate limiting for API calls"""
         current_time = time.time()
@@ -455,15 +396,32 @@ class SimpleDealBot:
             await asyncio.sleep(self.min_request_interval)
         self.last_request_time = current_time
 
+    async def start_outbox(self, application: Application) -> None:
+        """Start draining queued Notion submissions, notifying users as batches settle"""
+        from bot.message import MessageHandler as ReviewHandler
+        get_outbox().start(notify=lambda batch: ReviewHandler.notify_submission(application.bot, batch))
+
+    async def stop_outbox(self, application: Application) -> None:
+        """Let the outbox finish its current batch; the rest stays queued for the next start"""
+        await get_outbox().stop(get_settings().drain_timeout)
+
     def run(self):
         """Start the bot."""
         # Create application and add handlers
-        application = Application.builder().token(os.getenv("TELEGRAM_BOT_TOKEN")).build()
+        application = (
+            Application.builder()
+            .token(get_settings().telegram_bot_token)
+            .post_init(self.start_outbox)
+            .post_shutdown(self.stop_outbox)
+            .build()
+        )
 
         # Add command handlers
         application.add_handler(CommandHandler("start", self.start))
         application.add_handler(CommandHandler("help", self.help_command))
         application.add_handler(CommandHandler("prompt", self.prompt))
+        application.add_handler(CommandHandler("offers", self.offers))
+        application.add_handler(CommandHandler("history", self.history))
 
         # Add message handler
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
@@ -472,6 +430,7 @@ class SimpleDealBot:
         application.run_polling()
 
 if __name__ == '__main__':
+    setup_logging()
     try:
         bot = SimpleDealBot()
         print("🤖 Bot is running...")
@@ -1,48 +1,53 @@
-import dotenv
-from notion_client import Client
 from typing import List, Dict, Any
-from dotenv import load_dotenv
 import logging
-import os
 import traceback
+from bot.metrics import instrument, timed
+from bot.clients import get_notion_client
+from bot.logging_config import log_payload
+from bot.retry import RetryPolicy, classify
+from bot.schemas import validate_submissions
 
 # Logging configuration
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# Load environment variables
-try:
-    load_dotenv()
-except Exception as e:
-    logger.error(f"Error loading .env file: {e}")
 
 class StructuredDealParser:
-    def __init__(self, notion_token: str, database_id: str, kitchen_database_id: str):
+    def __init__(self, notion_token: str, database_id: str, kitchen_database_id: str, client=None,
+                 retry_policy: RetryPolicy = None):
         logger.info("Initializing StructuredDealParser...")
         try:
-            self.client = Client(auth=notion_token)
+            # Borrow the process-wide pooled client unless one is injected
+            self.client = client if client is not None else get_notion_client(notion_token)
+            self.retry_policy = retry_policy or RetryPolicy()
             # Use passed parameters instead of re-fetching from env
             self.database_id = database_id
             self.kitchen_database_id = kitchen_database_id
             
-            logger.info(f"Initialized Notion client with databases:")
-            logger.info(f"OFFERS_DATABASE_ID: {self.database_id}")
-            logger.info(f"ADVERTISERS_DATABASE_ID: {self.kitchen_database_id}")
+            logger.debug("Initialized Notion client with databases: OFFERS_DATABASE_ID=%s ADVERTISERS_DATABASE_ID=%s",
+                         self.database_id, self.kitchen_database_id)
         except Exception as e:
-            logger.error(f"Failed to initialize Notion client: {str(e)}")
+            logger.error("Failed to initialize Notion client: %s", e)
             raise
 
     def submit_deals(self, deals: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Submit multiple deals to Notion database"""
-        logger.info(f"Starting submission of {len(deals)} deals")
+        logger.info("Starting submission of %d deals", len(deals))
+        retry = self.retry_policy.for_batch(len(deals))
+        # Coerce and check the whole batch up front so a malformed deal fails
+        # before its company lookup rather than in float() after it
+        checked, errors = validate_submissions(deals)
         results = []
-        for deal in deals:
+        for index, (original, deal) in enumerate(zip(deals, checked)):
+            if deal is None:
+                logger.warning("Rejected deal %d before submission: %s", index, errors[index])
+                results.append({"success": False, "deal": original, "error": errors[index], "retryable": False})
+                continue
+            creating = False
             try:
-                logger.info(f"Processing deal for company: {deal.get('company_name', 'Unknown')}")
+                logger.debug("Processing deal for company: %s", deal.get('company_name', 'Unknown'))
                 
                 # Get or create company in ALL ADVERTISERS | Kitchen database
-                company_id = self._get_or_create_company(deal["company_name"])
-                logger.info(f"Got company ID: {company_id}")
+                company_id = self._get_or_create_company(deal["company_name"], retry)
+                logger.debug("Got company ID: %s", company_id)
                 
                 # Split multi-value fields
                 languages = [lang.strip() for lang in str(deal["language"]).split("|")]
@@ -52,7 +57,7 @@ class StructuredDealParser:
                 funnels_str = str(deal["funnels"]).replace("[", "").replace("]", "").replace("'", "")
                 funnels = [funnel.strip() for funnel in funnels_str.split(",")]
                 
-                logger.info(f"Processed fields - Languages: {languages}, Sources: {sources}, Funnels: {funnels}")
+                logger.debug("Processed fields - Languages: %s, Sources: %s, Funnels: %s", languages, sources, funnels)
                 
                 # Format the properties according to exact Notion schema
                 properties = {
@@ -119,37 +124,50 @@ class StructuredDealParser:
                 properties = {k: v for k, v in properties.items() 
                             if (v.get("number") is not None or k != "number")}
                 
-                logger.info("Creating new page in Notion...")
-                logger.debug(f"Properties for Notion: {properties}")
+                log_payload(logger, "Properties for Notion: %s", properties)
 
                 # Create the new page in Individual OFFERS | Kitchen database
-                new_page = self.client.pages.create(
-                    parent={"database_id": self.database_id},
-                    properties=properties
-                )
-                logger.info(f"Successfully created Notion page for {deal['company_name']}")
-                results.append({"success": True, "deal": deal, "parsed_page": new_page})
+                # A failed create may still have written the page, so from here on
+                # only failures that provably wrote nothing are handed back for a retry
+                creating = True
+                with timed("notion_page_create"):
+                    new_page = retry.call(
+                        "pages.create", self.client.pages.create, idempotent=False,
+                        parent={"database_id": self.database_id},
+                        properties=properties
+                    )
+                logger.info("Created Notion page for %s", deal['company_name'])
+                results.append({"success": True, "deal": original, "parsed_page": new_page})
                 
             except Exception as e:
+                retryable = classify(e, idempotent=not creating)[0]
+                error = str(e)
+                if creating and not retryable:
+                    error += " (the offer may still have been created in Notion; check before resubmitting)"
                 error_details = traceback.format_exc()
-                logger.error(f"Error submitting deal to Notion: {str(e)}\n{error_details}")
+                logger.error("Error submitting deal to Notion: %s\n%s", e, error_details)
                 results.append({
                     "success": False, 
-                    "deal": deal, 
-                    "error": str(e),
+                    "deal": original, 
+                    "error": error,
+                    "retryable": retryable,
                     "details": error_details
                 })
             
-        logger.info(f"Completed submission. Success: {sum(1 for r in results if r['success'])}, Failed: {sum(1 for r in results if not r['success'])}")
+        succeeded = sum(1 for r in results if r['success'])
+        logger.info("Completed submission. Success: %d, Failed: %d", succeeded, len(results) - succeeded)
         return results
 
-    def _get_or_create_company(self, company_name: str) -> str:
+    @instrument("company_lookup")
+    def _get_or_create_company(self, company_name: str, retry: RetryPolicy = None) -> str:
         """Search for existing company or create new one in ALL ADVERTISERS | Kitchen database"""
         try:
-            logger.info(f"Searching for company: {company_name}")
+            logger.debug("Searching for company: %s", company_name)
             
             # Search for existing company with modified filter syntax
-            search_results = self.client.databases.query(
+            retry = retry or self.retry_policy
+            search_results = retry.call(
+                "databases.query", self.client.databases.query,
                 database_id=self.kitchen_database_id,
                 filter={
                     "property": "title",  
@@ -159,15 +177,16 @@ class StructuredDealParser:
                 }
             )
 
-            logger.debug(f"Search results: {search_results}")
+            log_payload(logger, "Search results: %s", search_results)
 
             if search_results["results"]:
-                logger.info(f"Found existing company: {company_name}")
+                logger.debug("Found existing company: %s", company_name)
                 return search_results["results"][0]["id"]
             
-            logger.info(f"Creating new company: {company_name}")
+            logger.info("Creating new company: %s", company_name)
             # Create new company if not found
-            new_company = self.client.pages.create(
+            new_company = retry.call(
+                "pages.create", self.client.pages.create, idempotent=False,
                 parent={"database_id": self.kitchen_database_id},
                 properties={
                     "title": {  
@@ -175,10 +194,10 @@ class StructuredDealParser:
                     }
                 }
             )
-            logger.info(f"Successfully created new company: {company_name}")
+            logger.info("Created new company: %s", company_name)
             return new_company["id"]
             
         except Exception as e:
             error_details = traceback.format_exc()
-            logger.error(f"Notion API Error for company {company_name}: {str(e)}\n{error_details}")
-            raise Exception(f"Error handling company {company_name}: {str(e)}")
+            logger.error("Notion API Error for company %s: %s\n%s", company_name, e, error_details)
+            raise
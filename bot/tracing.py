@@ -0,0 +1,355 @@
+"""Request tracing across the Telegram, Mistral and Notion calls of one update.
+
+A trace is started per Telegram update in MainBot.handle_message and the
+current span is carried in a ContextVar, so it follows the update through
+DealParser and MessageHandler (including work handed to threads with
+asyncio.to_thread). Pipeline stages open child spans via
+bot.metrics.timed(), and outbound HTTP requests get their own spans from
+the httpx transports defined here.
+
+Notion submission runs later, in the outbox drainer task, outside the
+update's context. The outbox stores the submitting span's ids with each
+batch (see current_context) and the drainer reopens the trace with
+continue_trace, so the Notion calls still land in the update's trace.
+
+Spans are exported in batches from a background thread, either as JSON
+lines to a local file or as OTLP/HTTP JSON to a collector. Configure with
+TRACE_EXPORT, e.g. ``file:traces.jsonl`` or ``otlp:http://localhost:4318``.
+Without an exporter every span call is a cheap no-op. The export queue is
+bounded: when the exporter falls behind, new spans are dropped and counted
+rather than held in memory, and shutdown logs how many were lost.
+"""
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "deal-parser-bot"
+_random_bits = random.getrandbits
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: str, attributes: Dict):
+        self.trace_id = trace_id
+        self.span_id = f"{_random_bits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_processor: Optional['BatchSpanProcessor'] = None
+
+
+class _SpanContext:
+    __slots__ = ('span', '_token')
+
+    def __init__(self, span: Span):
+        self.span = span
+        self._token = None
+
+    def __enter__(self) -> Span:
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.span
+        span.end_ns = time.time_ns()
+        if exc is not None:
+            span.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        processor = _processor
+        if processor is not None:
+            processor.submit(span)
+        return False
+
+
+def span(name: str, kind: str = "internal", **attributes):
+    """Open a child span of the current span (a new trace if there is none)"""
+    if _processor is None:
+        return NOOP_SPAN
+    parent = _current.get()
+    trace_id = parent.trace_id if parent else f"{_random_bits(128):032x}"
+    return _SpanContext(Span(name, trace_id, parent.span_id if parent else None, kind, attributes))
+
+
+def start_trace(name: str, **attributes):
+    """Open a root span that starts a new trace, ignoring any current span"""
+    if _processor is None:
+        return NOOP_SPAN
+    return _SpanContext(Span(name, f"{_random_bits(128):032x}", None, "server", attributes))
+
+
+def continue_trace(name: str, trace_id: Optional[str], parent_id: Optional[str], **attributes):
+    """Open a span under a parent recorded earlier (see current_context); a new trace without one"""
+    if _processor is None:
+        return NOOP_SPAN
+    if not trace_id:
+        return _SpanContext(Span(name, f"{_random_bits(128):032x}", None, "internal", attributes))
+    return _SpanContext(Span(name, trace_id, parent_id, "internal", attributes))
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current.get()
+    return current.trace_id if current else None
+
+
+def current_context() -> Tuple[Optional[str], Optional[str]]:
+    """(trace_id, span_id) of the current span, to hand to continue_trace later"""
+    current = _current.get()
+    return (current.trace_id, current.span_id) if current else (None, None)
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+class FileExporter:
+    """Appends spans as JSON lines to a local file"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            for item in spans:
+                file.write(json.dumps(item.to_dict(), default=str) + "\n")
+
+
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPExporter:
+    """Posts spans to an OTLP/HTTP collector using the JSON encoding"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        endpoint = endpoint.rstrip("/")
+        self.url = endpoint if endpoint.endswith("/v1/traces") else f"{endpoint}/v1/traces"
+        self.timeout = timeout
+
+    def export(self, spans: List[Span]) -> None:
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [self._encode(item) for item in spans],
+                }],
+            }]
+        }
+        request = urllib.request.Request(
+            self.url, data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    @staticmethod
+    def _encode(item: Span) -> Dict:
+        encoded = {
+            "traceId": item.trace_id,
+            "spanId": item.span_id,
+            "name": item.name,
+            "kind": _OTLP_KINDS.get(item.kind, 1),
+            "startTimeUnixNano": str(item.start_ns),
+            "endTimeUnixNano": str(item.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in item.attributes.items()],
+            "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+        }
+        if item.parent_id:
+            encoded["parentSpanId"] = item.parent_id
+        return encoded
+
+
+class BatchSpanProcessor:
+    """Collects finished spans and exports them from a background thread"""
+
+    def __init__(self, exporter, max_batch: int = 512, interval: float = 1.0, max_queue: int = 2048):
+        self.exporter = exporter
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Span) -> None:
+        if self._queue.qsize() >= self.max_queue:
+            if not self.dropped:
+                logger.warning("Span export queue is full (%d); dropping spans until the exporter catches up",
+                               self.max_queue)
+            self.dropped += 1
+            return
+        self._queue.put(item)
+
+    def shutdown(self, timeout: Optional[float] = 5.0) -> None:
+        """Export the queued spans, waiting up to timeout seconds (None: until done)"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self.dropped += max(0, self._queue.qsize() - 1)
+            logger.warning("Span exporter still busy after %gs; queued spans are dropped", timeout)
+        if self.dropped:
+            logger.warning("Dropped %d spans that could not be exported", self.dropped)
+
+    def _run(self) -> None:
+        batch: List[Span] = []
+        deadline = time.monotonic() + self.interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = False
+            if item:
+                batch.append(item)
+            if item is None or len(batch) >= self.max_batch or time.monotonic() >= deadline:
+                if batch:
+                    self._export(batch)
+                    batch = []
+                deadline = time.monotonic() + self.interval
+            if item is None:
+                return
+
+    def _export(self, batch: List[Span]) -> None:
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logger.warning("Failed to export %d spans: %s", len(batch), e)
+
+
+def configure(spec: Optional[str]) -> None:
+    """Configure span export from a 'file:<path>' or 'otlp:<url>' spec"""
+    global _processor
+    shutdown()
+    if not spec:
+        return
+    kind, _, target = spec.partition(":")
+    if kind == "file":
+        exporter = FileExporter(target or "traces.jsonl")
+    elif kind == "otlp":
+        exporter = OTLPExporter(target or "http://localhost:4318")
+    else:
+        raise ValueError(f"Unknown TRACE_EXPORT target: {spec}")
+    _processor = BatchSpanProcessor(exporter)
+    logger.info("Tracing enabled, exporting spans to %s", spec)
+
+
+def set_processor(processor) -> None:
+    """Install a span processor directly (anything with submit/shutdown)"""
+    global _processor
+    _processor = processor
+
+
+def shutdown(timeout: Optional[float] = 5.0) -> None:
+    """Stop tracing and export the spans still queued (see BatchSpanProcessor.shutdown)"""
+    global _processor
+    processor, _processor = _processor, None
+    if processor is not None:
+        processor.shutdown(timeout)
+
+
+# ---------------------------------------------------------------------------
+# Outbound HTTP spans
+# ---------------------------------------------------------------------------
+
+def _request_attributes(request: httpx.Request) -> Dict:
+    return {
+        "http.method": request.method,
+        "http.url": str(request.url.copy_with(query=None)),
+        "net.peer.name": request.url.host,
+    }
+
+
+class TracingTransport(httpx.BaseTransport):
+    """httpx transport that records each request as a client span"""
+
+    def __init__(self, wrapped: Optional[httpx.BaseTransport] = None, **transport_kwargs):
+        self._wrapped = wrapped or httpx.HTTPTransport(**transport_kwargs)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with span(f"HTTP {request.method} {request.url.host}", "client", **_request_attributes(request)) as current:
+            response = self._wrapped.handle_request(request)
+            current.set_attribute("http.status_code", response.status_code)
+            return response
+
+    def close(self) -> None:
+        self._wrapped.close()
+
+
+class AsyncTracingTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of TracingTransport"""
+
+    def __init__(self, wrapped: Optional[httpx.AsyncBaseTransport] = None, **transport_kwargs):
+        self._wrapped = wrapped or httpx.AsyncHTTPTransport(**transport_kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with span(f"HTTP {request.method} {request.url.host}", "client", **_request_attributes(request)) as current:
+            response = await self._wrapped.handle_async_request(request)
+            current.set_attribute("http.status_code", response.status_code)
+            return response
+
+    async def aclose(self) -> None:
+        await self._wrapped.aclose()
+
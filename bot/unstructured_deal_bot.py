@@ -12,14 +12,11 @@ from telegram.ext import (
     ConversationHandler
 )
 from bot.message import MessageHandler
-from dotenv import load_dotenv
+from bot.logging_config import setup_logging
+from bot.outbox import get_outbox
+from bot.settings import get_settings
 
-load_dotenv()
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 class ComplexDealBot:
@@ -69,17 +66,31 @@ class ComplexDealBot:
 
 def main():
     """Start the bot."""
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    setup_logging(level="INFO")
+    token = get_settings().telegram_bot_token
     if not token:
         logger.error("No TELEGRAM_BOT_TOKEN found in environment variables")
         return
 
-    # Create application
-    application = Application.builder().token(token).build()
-
     # Initialize message handler
     message_handler = MessageHandler()
 
+    # Queued submissions are pushed to Notion by the outbox drainer while polling runs
+    async def start_outbox(application: Application) -> None:
+        get_outbox().start(notify=lambda batch: message_handler.notify_submission(application.bot, batch))
+
+    async def stop_outbox(application: Application) -> None:
+        await get_outbox().stop(get_settings().drain_timeout)
+
+    # Create application
+    application = (
+        Application.builder()
+        .token(token)
+        .post_init(start_outbox)
+        .post_shutdown(stop_outbox)
+        .build()
+    )
+
     # Add handlers
     application.add_handler(
         TelegramMessageHandler(
@@ -1,51 +1,47 @@
-import dotenv
-from notion_client import Client
 from typing import List, Dict, Any
-from dotenv import load_dotenv
 import logging
-import os
 import traceback
-import json
+from bot.metrics import instrument, timed
+from bot.clients import get_notion_client
+from bot.logging_config import log_payload
+from bot.retry import RetryPolicy, classify
 
 # Logging configuration
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# Load environment variables
-try:
-    load_dotenv()
-except Exception as e:
-    logger.error(f"Error loading .env file: {e}")
 
 class UnstructuredDealParser:
-    def __init__(self, notion_token: str, database_id: str, kitchen_database_id: str, debug: bool = False):
+    def __init__(self, notion_token: str, database_id: str, kitchen_database_id: str, debug: bool = False, client=None,
+                 retry_policy: RetryPolicy = None):
         logger.info("Initializing UnstructuredDealParser...")
         try:
             if debug:
                 logger.setLevel(logging.DEBUG)
             
-            self.client = Client(auth=notion_token)
+            # Borrow the process-wide pooled client unless one is injected
+            self.client = client if client is not None else get_notion_client(notion_token)
+            self.retry_policy = retry_policy or RetryPolicy()
             self.database_id = database_id
             self.kitchen_database_id = kitchen_database_id
             
-            logger.info(f"Initialized Notion client with databases:")
-            logger.info(f"OFFERS_DATABASE_ID: {self.database_id}")
-            logger.info(f"ADVERTISERS_DATABASE_ID: {self.kitchen_database_id}")
+            logger.debug("Initialized Notion client with databases: OFFERS_DATABASE_ID=%s ADVERTISERS_DATABASE_ID=%s",
+                         self.database_id, self.kitchen_database_id)
         except Exception as e:
-            logger.error(f"Failed to initialize Notion client: {str(e)}")
+            logger.error("Failed to initialize Notion client: %s", e)
             raise
 
     def submit_deals(self, deals: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Submit multiple deals to Notion database"""
-        logger.info(f"Starting submission of {len(deals)} deals")
+        logger.info("Starting submission of %d deals", len(deals))
+        retry = self.retry_policy.for_batch(len(deals))
         results = []
         for deal in deals:
+            creating = False
             try:
-                logger.info(f"Processing deal for company: {deal.get('company_name', 'Unknown')}")
+                logger.debug("Processing deal for company: %s", deal.get('company_name', 'Unknown'))
                 
                 # Map Deal object fields to Notion properties
                 company_name = deal.get('partner', deal.get('company_name'))
-                company_id = self._get_or_create_company(company_name)
+                company_id = self._get_or_create_company(company_name, retry)
                 
                 # Handle multi-value fields
                 languages = [lang.strip() for lang in str(deal.get('language', '')).split('|')]
@@ -55,7 +51,7 @@ class UnstructuredDealParser:
                     funnels = [f.strip() for f in funnels.split(',')]
                 
                 base_code = f"{deal.get('geo')} {deal.get('language')}-{company_name}-{deal.get('source', deal.get('sources', ''))}"
-                unique_code = self._get_unique_funnel_code(base_code)
+                unique_code = self._get_unique_funnel_code(base_code, retry)
                 
                 properties = {
                     "GEO-Funnel Code": {
@@ -121,46 +117,58 @@ class UnstructuredDealParser:
                 properties = {k: v for k, v in properties.items() 
                             if (v.get("number") is not None or k != "number")}
                 
-                logger.info("Creating new page in Notion...")
-                logger.debug(f"Properties for Notion: {properties}")
+                log_payload(logger, "Properties for Notion: %s", properties)
 
                 # Add before creating new page
                 if not self._validate_properties(properties):
                     raise ValueError("Invalid properties for Notion submission")
 
                 # Create the new page in Individual OFFERS | Kitchen database
-                new_page = self.client.pages.create(
-                    parent={"database_id": self.database_id},
-                    properties=properties
-                )
-                logger.info(f"Successfully created Notion page for {deal['company_name']}")
+                # A failed create may still have written the page, so from here on
+                # only failures that provably wrote nothing are handed back for a retry
+                creating = True
+                with timed("notion_page_create"):
+                    new_page = retry.call(
+                        "pages.create", self.client.pages.create, idempotent=False,
+                        parent={"database_id": self.database_id},
+                        properties=properties
+                    )
+                logger.info("Created Notion page for %s", company_name)
                 results.append({"success": True, "deal": deal, "parsed_page": new_page})
                 
             except Exception as e:
+                retryable = classify(e, idempotent=not creating)[0]
+                error = str(e)
+                if creating and not retryable:
+                    error += " (the offer may still have been created in Notion; check before resubmitting)"
                 error_details = traceback.format_exc()
-                logger.error(f"Error submitting deal to Notion: {str(e)}")
-                logger.error(f"Deal data: {json.dumps(deal, indent=2)}")
-                logger.error(f"Traceback: {error_details}")
+                logger.error("Error submitting deal to Notion: %s\nDeal data: %s\nTraceback: %s",
+                             e, deal, error_details)
                 results.append({
                     "success": False, 
                     "deal": deal, 
-                    "error": str(e),
+                    "error": error,
+                    "retryable": retryable,
                     "details": error_details
                 })
             
-        logger.info(f"Completed submission. Success: {sum(1 for r in results if r['success'])}, Failed: {sum(1 for r in results if not r['success'])}")
+        succeeded = sum(1 for r in results if r['success'])
+        logger.info("Completed submission. Success: %d, Failed: %d", succeeded, len(results) - succeeded)
         return results
 
-    def _get_or_create_company(self, company_name: str) -> str:
+    @instrument("company_lookup")
+    def _get_or_create_company(self, company_name: str, retry: RetryPolicy = None) -> str:
         """Search for existing company or create new one"""
         try:
             if not company_name:
                 raise ValueError("Company name cannot be empty")
             
-            logger.info(f"Searching for company: {company_name}")
+            logger.debug("Searching for company: %s", company_name)
             
             # Search for existing company
-            search_results = self.client.databases.query(
+            retry = retry or self.retry_policy
+            search_results = retry.call(
+                "databases.query", self.client.databases.query,
                 database_id=self.kitchen_database_id,
                 filter={
                     "property": "title",
@@ -172,12 +180,13 @@ class UnstructuredDealParser:
 
             if search_results.get("results"):
                 company_id = search_results["results"][0]["id"]
-                logger.info(f"Found existing company: {company_name} (ID: {company_id})")
+                logger.debug("Found existing company: %s (ID: %s)", company_name, company_id)
                 return company_id
             
             # Create new company
-            logger.info(f"Creating new company: {company_name}")
-            new_company = self.client.pages.create(
+            logger.info("Creating new company: %s", company_name)
+            new_company = retry.call(
+                "pages.create", self.client.pages.create, idempotent=False,
                 parent={"database_id": self.kitchen_database_id},
                 properties={
                     "title": {
@@ -187,7 +196,7 @@ class UnstructuredDealParser:
             )
             
             company_id = new_company["id"]
-            logger.info(f"Created new company: {company_name} (ID: {company_id})")
+            logger.info("Created new company: %s (ID: %s)", company_name, company_id)
             return company_id
             
         except Exception as e:
@@ -206,13 +215,16 @@ class UnstructuredDealParser:
             
         return True
 
-    def _get_unique_funnel_code(self, base_code: str) -> str:
+    @instrument("funnel_code_lookup")
+    def _get_unique_funnel_code(self, base_code: str, retry: RetryPolicy = None) -> str:
         """Get a unique GEO-Funnel Code by appending -01, -02 etc if needed"""
         try:
-            logger.info(f"Checking for existing GEO-Funnel Code: {base_code}")
+            logger.debug("Checking for existing GEO-Funnel Code: %s", base_code)
             
             # Search for existing codes with same base
-            search_results = self.client.databases.query(
+            retry = retry or self.retry_policy
+            search_results = retry.call(
+                "databases.query", self.client.databases.query,
                 database_id=self.database_id,
                 filter={
                     "property": "GEO-Funnel Code",
@@ -240,11 +252,12 @@ class UnstructuredDealParser:
             while True:
                 new_code = f"{base_code}-{counter:02d}"
                 if new_code not in existing_codes:
-                    logger.info(f"Generated unique code: {new_code}")
+                    logger.debug("Generated unique code: %s", new_code)
                     return new_code
                 counter += 1
             
         except Exception as e:
+            # Falling back to base_code could create a duplicate, so fail the deal instead
             logger.error(f"Error generating unique funnel code: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
-            return base_code  # Fallback to original code
+            raise
@@ -0,0 +1,102 @@
+"""Pre-dispatch filter for raw webhook payloads.
+
+Runs on the request body before any ``Update`` object is built, so a
+backlog that Telegram replays after downtime costs one JSON parse per
+update instead of a full ``Update.de_json`` and handler dispatch.
+Only these survive:
+
+- callback queries and commands
+- other text messages no older than ``max_age`` seconds, the same
+  cut-off the deal handlers apply
+
+Everything else is answered 200 straight away: stale messages, edits,
+channel posts, membership changes and non-text messages, plus any
+update_id already seen (Telegram re-delivers updates it thinks failed).
+An update whose processing fails must be passed to ``forget`` so that
+Telegram's redelivery of it is not dropped as a duplicate.
+
+Uses orjson when it is installed (pip install orjson), else the stdlib json.
+
+Usage:
+    verdict, data = update_filter.check(await request.body())
+    if verdict == ACCEPT:
+        try:
+            await application.process_update(Update.de_json(data, bot))
+        except Exception:
+            update_filter.forget(data['update_id'])
+            raise
+"""
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+
+from bot.metrics import WEBHOOK_UPDATES
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+logger = logging.getLogger(__name__)
+
+ACCEPT = 'accept'
+STALE = 'stale'
+DUPLICATE = 'duplicate'
+IGNORED = 'ignored'
+INVALID = 'invalid'
+
+
+class UpdateFilter:
+    def __init__(self, max_age: float = 30.0, window: int = 4096, clock: Callable[[], float] = time.time):
+        self.max_age = max_age
+        self.clock = clock
+        self._recent: Deque[int] = deque(maxlen=window)
+        self._seen: Set[int] = set()
+
+    def _remember(self, update_id: int) -> bool:
+        """False if update_id was already seen within the window"""
+        if update_id in self._seen:
+            return False
+        if len(self._recent) == self._recent.maxlen:
+            self._seen.discard(self._recent[0])
+        self._recent.append(update_id)
+        self._seen.add(update_id)
+        return True
+
+    def forget(self, update_id: int) -> None:
+        """Let a redelivery of update_id through again, e.g. after processing it failed"""
+        if update_id in self._seen:
+            self._seen.discard(update_id)
+            self._recent.remove(update_id)
+
+    def _classify(self, data: Dict[str, Any]) -> str:
+        if 'callback_query' in data:
+            return ACCEPT
+        message = data.get('message')
+        if not isinstance(message, dict) or 'text' not in message:
+            return IGNORED
+        # Commands were never age-checked; only deal messages go stale
+        if message['text'].startswith('/'):
+            return ACCEPT
+        if self.max_age and self.clock() - message.get('date', 0) > self.max_age:
+            return STALE
+        return ACCEPT
+
+    def check(self, body: bytes) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """(verdict, parsed payload); only ACCEPT payloads need an Update"""
+        try:
+            data = loads(body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or not isinstance(data.get('update_id'), int):
+            verdict = INVALID
+        elif not self._remember(data['update_id']):
+            verdict = DUPLICATE
+        else:
+            verdict = self._classify(data)
+        WEBHOOK_UPDATES.inc(outcome=verdict)
+        if verdict != ACCEPT:
+            logger.debug("Dropped %s webhook update %s", verdict,
+                         data.get('update_id') if isinstance(data, dict) else None)
+        return verdict, data
@@ -1,20 +1,23 @@
 import logging
 from pathlib import Path
 import os
+from typing import Optional
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler, ConversationHandler
 from bot.router import DealRouter
 from bot.structured_deal_bot import SimpleDealBot
 from bot.unstructured_deal_bot import ComplexDealBot
-from dotenv import load_dotenv
+from bot.metrics import telegram_request
+from bot import tracing
+from bot.logging_config import setup_logging
+from bot.settings import get_settings
+from bot.outbox import get_outbox
+from bot.mirror import get_mirror
+from bot.session_store import get_session_store
 
-load_dotenv()
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.DEBUG
-)
+setup_logging()
 logger = logging.getLogger(__name__)
+tracing.configure(get_settings().trace_export)
 
 class MainBot:
     def __init__(self):
@@ -24,13 +27,22 @@ class MainBot:
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Central message handler that routes to appropriate bot"""
+        user = update.effective_user
+        with tracing.start_trace(
+            "telegram.update",
+            **{"telegram.update_id": update.update_id, "telegram.user_id": user.id if user else 0}
+        ):
+            await self._dispatch(update, context)
+
+    async def _dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Route one update to the simple or complex flow"""
         try:
             # Route the message
             flow_type, text = await self.router.route_message(update, context)
             
             # Handle callback queries
             if update.callback_query:
-                logger.debug(f"Handling callback query: {update.callback_query.data}")
+                logger.debug("Handling callback query: %s", update.callback_query.data)
                 # Always route callbacks to complex bot for better handling
                 await self.complex_bot.handle_callback(update, context)
                 return
@@ -57,15 +69,48 @@ class MainBot:
                     "Please try again or contact support if the issue persists."
                 )
 
+    async def start_outbox(self, application: Application) -> None:
+        """Start draining queued Notion submissions, notifying users as batches settle"""
+        handler = self.complex_bot.message_handler
+        get_outbox().start(notify=lambda batch: handler.notify_submission(application.bot, batch))
+
+    async def stop_outbox(self, application: Application, timeout: float = 0.0) -> None:
+        await get_outbox().stop(timeout)
+
+    async def start_background(self, application: Application) -> None:
+        """Restore saved review sessions, start the outbox drainer and, when Notion
+        is configured, the offer mirror sync"""
+        self.complex_bot.message_handler.restore_sessions(get_session_store().take())
+        await self.start_outbox(application)
+        settings = get_settings()
+        if settings.mirror_sync_interval and not settings.missing(
+                "notion_token", "offers_database_id", "advertisers_database_id"):
+            get_mirror().start()
+
+    async def stop_background(self, application: Application, timeout: Optional[float] = None) -> None:
+        """Let the outbox finish its current batch, stop the mirror and save open review sessions"""
+        await self.stop_outbox(application, get_settings().drain_timeout if timeout is None else timeout)
+        await get_mirror().stop()
+        get_session_store().save(self.complex_bot.message_handler.export_sessions())
+
     def run(self):
         """Start the bot."""
         # Create application and add handlers
-        application = Application.builder().token(os.getenv("TELEGRAM_BOT_TOKEN")).build()
+        application = (
+            Application.builder()
+            .token(get_settings().telegram_bot_token)
+            .request(telegram_request())
+            .post_init(self.start_background)
+            .post_shutdown(self.stop_background)
+            .build()
+        )
 
         # Add handlers
         application.add_handler(CommandHandler("start", self.simple_bot.start))
         application.add_handler(CommandHandler("help", self.simple_bot.help_command))
         application.add_handler(CommandHandler("prompt", self.simple_bot.prompt))
+        application.add_handler(CommandHandler("offers", self.simple_bot.offers))
+        application.add_handler(CommandHandler("history", self.simple_bot.history))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
         
         # Set up conversation handler for the complex bot
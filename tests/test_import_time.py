@@ -0,0 +1,23 @@
+"""Cold-start budget for the webhook entry point (see benchmarks/bench_import.py)."""
+import statistics
+
+import pytest
+
+from benchmarks.bench_import import IMPORT_BUDGET_MS, eager_modules, import_ms, import_once
+
+MODULE = "api.telegram"
+RUNS = 3
+
+
+@pytest.fixture(scope="module")
+def runs():
+    return [import_once(MODULE) for _ in range(RUNS)]
+
+
+def test_deferred_modules_load_on_first_use(runs):
+    assert eager_modules(runs[-1]) == []
+
+
+def test_import_time_within_budget(runs):
+    median_ms = statistics.median(import_ms(rows, MODULE) for rows in runs)
+    assert median_ms <= IMPORT_BUDGET_MS, f"import {MODULE} took {median_ms:.1f}ms (budget {IMPORT_BUDGET_MS}ms)"